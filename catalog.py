@@ -0,0 +1,87 @@
+"""Command line interface to index and search the Hyades runs in ./data
+
+Example:
+    List every run with LiF as the material of interest and more than 500 zones::
+
+        $ python catalog.py query --moi LiF --min-zones 500
+
+"""
+import argparse
+from tools.catalog import Catalog
+
+
+description = '''Command line interface to index and search the Hyades runs in ./data
+
+The catalog is a small SQLite database, ./data/pyhy_catalog.sqlite by default,
+describing every run: its layers and materials, material of interest, tstop,
+postdt, mesh, zone and dump counts, file sizes, modification time, and whether
+it is an optimization iteration. Updating the catalog only re-reads runs whose
+files changed, and searching it never opens a .cdf.
+
+Examples:
+    Index new and changed runs and list everything in the catalog:
+        $ python catalog.py update
+        $ python catalog.py query
+    List every run with LiF as the material of interest and more than 500 zones:
+        $ python catalog.py query --moi LiF --min-zones 500
+    List the runs containing a Diamond layer that are not optimization iterations:
+        $ python catalog.py query --material Diamond --no-optimization
+    Any SQL condition on the columns of the catalog can be added with --where:
+        $ python catalog.py query --where "num_dumps > 100 AND postdt < 0.1"
+'''
+epilog = '''
+                      ___      _  _
+                     | _ \\_  _| || |_  _
+                     |  _/ || | __ | || |
+                     |_|  \\_, |_||_|\\_, |
+                          |__/      |__/
+               Developed by the Wicks Lab at JHU
+'''
+parser = argparse.ArgumentParser(prog='catalog.py',
+                                 formatter_class=argparse.RawDescriptionHelpFormatter,
+                                 description=description,
+                                 epilog=epilog
+                                 )
+parser.add_argument('-r', '--root', type=str, default='./data',
+                    help='Directory searched for runs. (default: %(default)s)')
+parser.add_argument('--db', type=str, default=None,
+                    help='Path to the SQLite catalog. (default: pyhy_catalog.sqlite inside --root)')
+subparsers = parser.add_subparsers(dest='command', required=True)
+update_parser = subparsers.add_parser('update', help='Index new and changed runs and drop deleted ones')
+query_parser = subparsers.add_parser('query', help='List the runs matching every given condition')
+query_parser.add_argument('-n', '--name', type=str, help='Run name, with %% as a wildcard, such as FeSi%%')
+query_parser.add_argument('-m', '--material', type=str, help='Only runs with a layer of this material')
+query_parser.add_argument('--moi', type=str, help='Only runs with this material of interest')
+query_parser.add_argument('--shock-moi', type=str, help='Only runs with this shock material of interest')
+query_parser.add_argument('--min-zones', type=int, help='Only runs with more than this many zones')
+query_parser.add_argument('--max-zones', type=int, help='Only runs with fewer than this many zones')
+query_parser.add_argument('--min-tstop', type=float, help='Only runs stopping at or after this many nanoseconds')
+query_parser.add_argument('--max-tstop', type=float, help='Only runs stopping at or before this many nanoseconds')
+query_parser.add_argument('--optimization', action='store_true', default=None,
+                          help='Only optimization iterations')
+query_parser.add_argument('--no-optimization', dest='optimization', action='store_false',
+                          help='Exclude optimization iterations')
+query_parser.add_argument('--where', type=str, help='Extra SQL condition on the columns of the catalog')
+query_parser.add_argument('--no-update', action='store_true',
+                          help='Search the catalog as it is, without indexing new and changed runs first')
+args = parser.parse_args()
+
+with Catalog(args.root, args.db) as catalog:
+    if args.command == 'update':
+        indexed, removed = catalog.update(verbose=True)
+        print(f'Indexed {len(indexed)} and removed {len(removed)} runs. {len(catalog)} runs in {catalog.db_name}')
+    elif args.command == 'query':
+        if not args.no_update:
+            catalog.update()
+        rows = catalog.query(name=args.name, material=args.material, moi=args.moi, shock_moi=args.shock_moi,
+                             min_zones=args.min_zones, max_zones=args.max_zones, min_tstop=args.min_tstop,
+                             max_tstop=args.max_tstop, optimization=args.optimization, where=args.where)
+        columns = ('run_name', 'materials', 'moi', 'num_zones', 'num_dumps', 'tstop', 'dir_name')
+        table = [('Run', 'Materials', 'MOI', 'Zones', 'Dumps', 'tstop (ns)', 'Directory')]
+        for row in rows:
+            table.append(tuple('' if row[c] is None else f'{row[c]:g}' if isinstance(row[c], float) else str(row[c])
+                               for c in columns))
+        widths = [max(len(line[i]) for line in table) for i in range(len(columns))]
+        for line in table:
+            print('  '.join(value.ljust(width) for value, width in zip(line, widths)).rstrip())
+        print(f'{len(rows)} matching runs')
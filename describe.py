@@ -0,0 +1,53 @@
+"""Command line interface to list what a Hyades run contains without loading any of its variables
+
+Example:
+    List the variables, dumps, and grid of a run::
+
+        $ python describe.py diamond_decay
+
+"""
+import json
+import argparse
+from tools.describe import describe, format_description
+
+
+description = '''Command line interface to list what a Hyades run contains without loading any of its variables
+
+Only the header of the .cdf and its dump times are read, so describing a run
+takes milliseconds even for multi-GB files. For every variable the dimensions,
+shape, dtype, size, units, conversion from the Hyades cgs units, and long name
+are listed, along with the number of dumps, time range, and Mesh and Zone counts.
+
+Examples:
+    Describe a run in ./data, or a run anywhere by the path to its .inf or .cdf:
+        $ python describe.py diamond_decay
+        $ python describe.py ../runs/FeSi_s77742/FeSi_s77742.cdf
+    Describe several runs as JSON, for use in other scripts:
+        $ python describe.py diamond_decay FeSi_s77742 --json
+'''
+epilog = '''
+                      ___      _  _
+                     | _ \\_  _| || |_  _
+                     |  _/ || | __ | || |
+                     |_|  \\_, |_||_|\\_, |
+                          |__/      |__/
+               Developed by the Wicks Lab at JHU
+'''
+parser = argparse.ArgumentParser(prog='describe.py',
+                                 formatter_class=argparse.RawDescriptionHelpFormatter,
+                                 description=description,
+                                 epilog=epilog
+                                 )
+parser.add_argument('runs', type=str, nargs='+',
+                    help='Name of a run in ./data, or the path to the .inf or .cdf of a run')
+parser.add_argument('--json', action='store_true',
+                    help='Print the descriptions as JSON instead of tables')
+parser.add_argument('--no-derived', action='store_true',
+                    help='Only list the variables saved by Hyades, not the derived variables such as Rho0')
+args = parser.parse_args()
+
+descriptions = [describe(run, derived=not args.no_derived) for run in args.runs]
+if args.json:
+    print(json.dumps(descriptions if len(descriptions) > 1 else descriptions[0], indent=1))
+else:
+    print('\n\n'.join(format_description(description) for description in descriptions))
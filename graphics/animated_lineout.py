@@ -2,6 +2,7 @@
 import matplotlib.animation as animation
 import matplotlib.pyplot as plt
 from tools.hyades_reader import HyadesOutput
+from tools.layer_analysis import trajectories
 from graphics.static_graphics import add_layers
 from graphics.static_graphics import show_ambient_density
 plt.style.use('ggplot')
@@ -44,20 +45,13 @@ def lineout_animation(inf_name, var, coordinate_system='Lagrangian', show_layers
         if coordinate_system == 'lagrangian':
             pass  # Do not update x data in Lagrangian Coordinates
         else:
-            line.set_xdata(hyades.x[i, :])  # Update x data in Eulerian Coordinates
+            line.set_xdata(hyades.eulerian_x[i, :])  # Update x data in Eulerian Coordinates
             if show_layers:  # Update layer interfaces in Eulerian coordinates
-                for j, layer in enumerate(list(hyades.layers.keys())):
-                    mesh_start = hyades.layers[layer]['Mesh Start'] - 1  # Subtract 1 for Python 0-indexing
-                    mesh_stop = hyades.layers[layer]['Mesh Stop'] - 1
-                    if hyades.data_dimensions[1] == 'NumZones':  # Subtract an addition 1 for Zone to Mesh conversion
-                        mesh_stop -= 1
-                    eulerian_x_start = hyades.x[i, mesh_start]
-                    eulerian_x_stop = hyades.x[i, mesh_stop]
-                    text_x = eulerian_x_start + ((eulerian_x_stop - eulerian_x_start) / 2)
-                    layer_labels[j].set_x(text_x)
-                    # print(layer, eulerian_x_start, text_x)
-                    if j > 0:
-                        layer_lines[j-1].set_xdata(eulerian_x_start)
+                boundaries = layer_boundaries[i]
+                for layer_label, x in zip(layer_labels, (boundaries[:-1] + boundaries[1:]) / 2):
+                    layer_label.set_x(x)
+                for layer_line, x in zip(layer_lines, boundaries[1:-1]):
+                    layer_line.set_xdata([x, x])
         txt.set_text(f'Time: {hyades.time[i]:.2f} ns')
         return line,
 
@@ -65,8 +59,12 @@ def lineout_animation(inf_name, var, coordinate_system='Lagrangian', show_layers
 
     fig, ax = plt.subplots()
     # Add Line
-    line, = ax.plot(hyades.x[0, :], hyades.output[0, :], lw=2)
-    txt = ax.text(hyades.x.max() * 0.02, hyades.output.max() * 0.94, 'Time: 0.00 ns', ha='left', fontsize='large')
+    line, = ax.plot(hyades.lagrangian_x, hyades.output[0, :], lw=2)
+    if coordinate_system == 'lagrangian':  # Only read the Eulerian positions if they are plotted
+        x_max = hyades.lagrangian_x.max()
+    else:
+        x_max = hyades.eulerian_x.max()
+    txt = ax.text(x_max * 0.02, hyades.output.max() * 0.94, 'Time: 0.00 ns', ha='left', fontsize='large')
     # Format title, axis
     ax.set_title(f'Animated Lineout of {hyades.run_name} {var}')
     if coordinate_system == 'lagrangian':
@@ -76,7 +74,7 @@ def lineout_animation(inf_name, var, coordinate_system='Lagrangian', show_layers
     ax.set(xlabel=x_label, ylabel=f'{hyades.long_name} ({hyades.units})',
            ylim=(hyades.output.min(), hyades.output.max() * 1.05))
     if coordinate_system == 'eulerian':
-        ax.set_xlim(ax.get_xlim()[0], hyades.x.max())
+        ax.set_xlim(ax.get_xlim()[0], x_max)
     ax.grid(b=True, which='major', axis='both', lw=1)
     ax.grid(b=True, which='minor', axis='both', lw=0.5, alpha=0.5)
     ax.minorticks_on()
@@ -88,22 +86,13 @@ def lineout_animation(inf_name, var, coordinate_system='Lagrangian', show_layers
         if coordinate_system == 'lagrangian':
             ax = add_layers(hyades, ax, coordinate_system=coordinate_system)
         elif coordinate_system == 'eulerian':
-            layer_lines = []
-            layer_labels = []
-            for layer in hyades.layers:
-                mesh_start = hyades.layers[layer]['Mesh Start'] - 1  # Subtract 1 for Python 0-indexing
-                mesh_stop = hyades.layers[layer]['Mesh Stop'] - 1
-                if hyades.data_dimensions[1] == 'NumZones':  # Subtract an addition 1 for Zone to Mesh conversion
-                    mesh_stop -= 1
-                eulerian_x_start = hyades.x[0, mesh_start]
-                eulerian_x_stop = hyades.x[0, mesh_stop]
-                if layer != 'layer1':  # Do not draw a line for the first layer, which is the left-hand free surface
-                    layer_line = ax.axvline(x=eulerian_x_start, color='black', linestyle='solid')
-                    layer_lines.append(layer_line)
-                text_x = eulerian_x_start + ((eulerian_x_stop - eulerian_x_start) / 2)
-                layer_label = ax.text(text_x, hyades.output.max() * 0.8, hyades.layers[layer]['Name'],
-                                      ha='center')
-                layer_labels.append(layer_label)
+            # Eulerian positions of the free surfaces and interfaces at every time, read once for the whole animation
+            layer_boundaries = trajectories(hyades)['position']
+            boundaries = layer_boundaries[0]
+            # Do not draw lines for the free surfaces, only the interfaces between layers
+            layer_lines = [ax.axvline(x=x, color='black', linestyle='solid') for x in boundaries[1:-1]]
+            layer_labels = [ax.text(x, hyades.output.max() * 0.8, name, ha='center')
+                            for x, name in zip((boundaries[:-1] + boundaries[1:]) / 2, hyades.layer_table['name'])]
 
     if var == 'Rho':
         ax = show_ambient_density(hyades, ax)
@@ -196,7 +196,7 @@ def update_output(var, list_of_contents, list_of_names, list_of_dates):
         try:
             print(hyades_path)
             hyades = HyadesOutput(hyades_path, var)
-            data = {'X': hyades.x[0, :].tolist(),
+            data = {'X': hyades.lagrangian_x.tolist(),
                     'time': hyades.time.tolist(),
                     'output': hyades.output.tolist(),
                     'var': var,
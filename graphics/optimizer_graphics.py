@@ -4,7 +4,8 @@ import json
 import configparser
 import numpy as np
 import matplotlib.pyplot as plt
-from tools.hyades_reader import HyadesOutput
+from tools.hyades_reader import HyadesOutput, HyadesRun
+from tools.layer_analysis import block_stats
 plt.style.use('ggplot')
 
 
@@ -202,26 +203,28 @@ def best_histogram(run_name):
         jd = json.load(f)
     best_run = run_name + '_' + jd['best']['number']
     hyades_name = os.path.join('./data', run_name, best_run)
-    hyades = HyadesOutput(hyades_name, 'Pres')
-    x_start = hyades.layers[hyades.moi]['Mesh Start']
-    x_stop = hyades.layers[hyades.moi]['Mesh Stop'] - 1
-    if hyades.xray_probe:
-        t_start = np.argmin(abs(hyades.time - hyades.xray_probe[0]))
-        t_stop = np.argmin(abs(hyades.time - hyades.xray_probe[1]))
-        pressure_slice = hyades.output[t_start:t_stop, x_start:x_stop]
+    hyades_run = HyadesRun(hyades_name)
+    x_start = hyades_run.layers[hyades_run.moi]['Mesh Start']
+    x_stop = hyades_run.layers[hyades_run.moi]['Mesh Stop'] - 1
+    if hyades_run.xray_probe:
+        closest_times, (t_start, t_stop) = hyades_run.time_index.nearest(hyades_run.xray_probe)
+        time_range = slice(t_start, t_stop)
     else:
-        pressure_slice = hyades.output[:, x_start:x_stop]
+        time_range = None
+    # Only read the pressure in the material of interest during the X-Ray probe, once for the histogram and stats
+    hyades = HyadesOutput(hyades_run, 'Pres', time_range=time_range, x_range=slice(x_start, x_stop))
+    pressure_slice = hyades.output
+    stats = block_stats(pressure_slice, stats=['mean', 'min', 'max', 'p25', 'p75'])
+    mean, p25, p75 = stats['mean'], stats['p25'], stats['p75']
 
     fig, ax = plt.subplots(figsize=(7, 5))
     # Plot histogram
-    bins = np.linspace(pressure_slice.min(), pressure_slice.max(), num=20, endpoint=True)
+    bins = np.linspace(stats['min'], stats['max'], num=20, endpoint=True)
     ax.hist(pressure_slice.reshape((-1,)), bins=bins,
             ec='white')
     # Add average as vertical line
-    ax.axvline(np.mean(pressure_slice), color='black', label=f'Mean: {np.mean(pressure_slice):.2f} GPa')
+    ax.axvline(mean, color='black', label=f'Mean: {mean:.2f} GPa')
     # Shade in the middle 50th percentile
-    p25 = np.percentile(pressure_slice, 25)
-    p75 = np.percentile(pressure_slice, 75)
     x = (p25, p25, p75, p75)
     y = (ax.get_ylim()[0], ax.get_ylim()[1], ax.get_ylim()[1], ax.get_ylim()[0])
     ax.fill(x, y,
@@ -7,11 +7,13 @@ from matplotlib.backend_tools import ToolBase
 import datetime
 import numpy as np
 import pandas as pd
-from scipy.io import netcdf
 import sys
 sys.path.append('../')
-from tools.hyades_reader import ShockVelocity, HyadesOutput
+from tools.hyades_reader import ShockVelocity, HyadesOutput, HyadesRun
 from tools.excel_writer import write_excel
+from tools.regrid import to_eulerian_grid
+from tools.layer_analysis import trajectories
+from tools.wave_fronts import wave_fronts
 plt.style.use('ggplot')
 warnings.simplefilter("ignore")
 plt.rcParams['toolbar'] = 'toolmanager'
@@ -106,8 +108,9 @@ def xt_diagram(filename, var, coordinate_system='Lagrangian', show_layers=True,
     """Plot a colored XT diagram for a Hyades variable
 
     Args:
-        filename (string): Name of the .cdf
-        var (string): Abbreviated name of variable of interest - one of Pres, Rho, Rho0, U, Te, Ti, Tr, R, Acc
+        filename (string or HyadesRun): Name of the .cdf or an existing run
+        var (string): Abbreviated name of variable of interest - one of Pres, Rho, U, Te, Ti, Tr, R, Acc,
+                      or a derived variable such as Rho0, Uzone, Mass, Cs, Pmax
         coordinate_system (string):
         show_layers (bool, optional): Toggle to show layer interfaces and names
         show_shock_front (bool, optional): Toggle to show the position of the shock front
@@ -118,39 +121,34 @@ def xt_diagram(filename, var, coordinate_system='Lagrangian', show_layers=True,
     coordinate_system = coordinate_system.lower()
     if not (coordinate_system == 'lagrangian' or coordinate_system == 'eulerian'):
         raise ValueError(f'Unrecognized coordinate system: {coordinate_system!r}. Options are Lagrangian or Eulerian')
-    if var == 'Rho0':
-        hyades = HyadesOutput(filename, 'Rho')
-    else:
-        hyades = HyadesOutput(filename, var)
+    hyades = HyadesOutput(filename, var)  # Derived variables, such as Rho0, are computed by the HyadesRun
 
     fig, ax = plt.subplots()
 
+    colorbar_label = f"{hyades.long_name} ({hyades.units})"
     if coordinate_system == 'lagrangian':
-        if var == 'Rho0':
-            z = hyades.output / hyades.output[0, :]
-            colorbar_label = r'Compressive Factor $\rho / \rho_0$'
-        else:
-            z = hyades.output
-            colorbar_label = f"{hyades.long_name} ({hyades.units})"
-        pcm = ax.pcolormesh(hyades.x[0, :], hyades.time, z, cmap='viridis')
-        ax.set_xlim(hyades.x[0, :].min(), hyades.x[0, :].max())
+        pcm = ax.pcolormesh(hyades.lagrangian_x, hyades.time, hyades.output, cmap='viridis')
+        ax.set_xlim(hyades.lagrangian_x.min(), hyades.lagrangian_x.max())
         x_label = 'Lagrangian Position (um)'
     else:
-        if var == 'Rho0':
-            z = hyades.output / hyades.output[0, :]
-            colorbar_label = r'Compressive Factor $\rho / \rho_0$'
-        else:
-            z = hyades.output
-            colorbar_label = f"{hyades.long_name} ({hyades.units})"
-        pcm = ax.pcolormesh(hyades.x, hyades.time, z, cmap='viridis')
+        # Resampling onto a fixed Eulerian grid draws far faster than a pcolormesh of the moving mesh
+        # imshow needs evenly spaced rows, so uneven dumps are interpolated onto evenly spaced times
+        evenly_spaced = np.allclose(np.diff(hyades.time), np.diff(hyades.time).mean())
+        x_grid, time_grid, image = to_eulerian_grid(hyades.run, hyades.var,
+                                                    time_grid=None if evenly_spaced else len(hyades.time))
+        dx = (x_grid[-1] - x_grid[0]) / max(len(x_grid) - 1, 1)
+        dt = (time_grid[-1] - time_grid[0]) / max(len(time_grid) - 1, 1)
+        extent = (x_grid[0] - dx / 2, x_grid[-1] + dx / 2, time_grid[0] - dt / 2, time_grid[-1] + dt / 2)
+        pcm = ax.imshow(image, origin='lower', aspect='auto', interpolation='nearest', cmap='viridis', extent=extent,
+                        zorder=1)  # above the grid, like a pcolormesh
         ax.set_facecolor('tab:gray')
-        ax.set_xlim(hyades.x.min(), hyades.x.max())
+        ax.set_xlim(x_grid.min(), x_grid.max())
         x_label = 'Eulerian Position (um)'
     # During laser ablation the early material is ejected to the left at high speed making the scale whack
     # if var == 'U':
-    #     pcm = ax.pcolormesh(hyades.x, hyades.time, hyades.output, vmin=0, cmap='viridis')
+    #     pcm = ax.pcolormesh(hyades.eulerian_x, hyades.time, hyades.output, vmin=0, cmap='viridis')
     # else:
-    #     pcm = ax.pcolormesh(hyades.x, hyades.time, hyades.output, cmap='viridis')
+    #     pcm = ax.pcolormesh(hyades.eulerian_x, hyades.time, hyades.output, cmap='viridis')
     fig.colorbar(pcm, label=colorbar_label)
     ax.set_title(f'{hyades.run_name} XT Diagram')
     ax.set(xlabel=x_label, ylabel='Time (ns)')
@@ -167,9 +165,15 @@ def xt_diagram(filename, var, coordinate_system='Lagrangian', show_layers=True,
         ax = add_layers(hyades, ax, coordinate_system=coordinate_system, color='white')
 
     if show_shock_front:
-        shock = ShockVelocity(filename, 'Cubic')
-        x_shock = hyades.x[shock.shock_index]
-        y_shock = hyades.time[10:]
+        # The same front ShockVelocity uses for the Shock Velocity and the shock MOI times, at the center of its Zone
+        front = ShockVelocity(hyades.run, 'Cubic').find_shock_front(hyades.run)
+        rows, shock_index = front['rows'], front['shock_index']
+        if coordinate_system == 'lagrangian':
+            x_shock = np.asarray(hyades.run.read_coordinates('Pres', slice(0, 1))[0])[shock_index]
+        else:
+            zone_x = hyades.run.read_coordinates('Pres', slice(int(rows.min()), int(rows.max()) + 1))
+            x_shock = np.asarray(zone_x)[rows - rows.min(), shock_index]
+        y_shock = front['time']
         ax.plot(x_shock, y_shock,
                 label='Shock Front', color='white',
                 linestyle='dotted', lw=2)
@@ -181,14 +185,14 @@ def xt_diagram(filename, var, coordinate_system='Lagrangian', show_layers=True,
         nonlocal coordinate_system
         y_array = hyades.time
         if coordinate_system == 'lagrangian':
-            if ((x > hyades.x[0, :].min()) & (x <= hyades.x[0, :].max()) &
+            if ((x > hyades.lagrangian_x.min()) & (x <= hyades.lagrangian_x.max()) &
                     (y > y_array.min()) & (y <= y_array.max())):
                 return f'Position {x:1.2f} µm, Time {y:1.2f} ns'
             else:
                 return f'x={x:1.2f}, y={y:1.2f}'
         else:
             closest_time, row = hyades.get_closest_time(y)
-            if ((hyades.x[row, :].min() < x) and (x < hyades.x[row, :].max()) &
+            if ((hyades.eulerian_x[row, :].min() < x) and (x < hyades.eulerian_x[row, :].max()) &
                     (y_array.min() < y) and (y < y_array.max())):
                 return f'Position {x:1.2f} µm, Time {y:1.2f} ns'
             else:
@@ -239,8 +243,8 @@ def visualize_target(filename):
         ax.add_patch(matplotlib.patches.Rectangle((x, y), width, height,
                                                   facecolor=c,
                                                   edgecolor=None))
-    upper_x = hyades.x[0, :].max() * 1.05
-    lower_x = hyades.x[0, :].max() * -0.05
+    upper_x = hyades.lagrangian_x.max() * 1.05
+    lower_x = hyades.lagrangian_x.max() * -0.05
     ax.set(xlabel='Lagrangian Position (µm)', xlim=(lower_x, upper_x), ylim=(-0.3, 1.3))
     ax.set_title(f'Target Visualization of {hyades.run_name}')
     plt.tick_params(axis='y', which='both', left=False, right=False, labelleft=False)
@@ -264,18 +268,15 @@ def eulerian_position(filename):
     """
     hyades = HyadesOutput(filename, 'R')
     times = [i for i in range(int(hyades.time.max()))]
+    closest_times, indices = hyades.time_index.nearest(times)
 
     # get region numbers from the cdf to color code each material in the eulerian plot
-    cdf_name = os.path.join(hyades.dir_name, hyades.run_name+'.cdf')
-    cdf = netcdf.netcdf_file(cdf_name, 'r')
-    region_numbers = cdf.variables['RegNums'].data.copy()
+    region_numbers = hyades.run.cdf.variables['RegNums'].data.copy()
     region_numbers = region_numbers[1:-1]  # region numbers has a zero padded on either end
-    cdf.close()
 
     colors = plt.cm.tab10(np.linspace(0, 1, num=10))
     fig, ax = plt.subplots()
-    for t in times:
-        i = np.argmin(abs(hyades.time - t))
+    for i in indices:
         mesh_coordinates = hyades.output[i, :]
         zone_coordinates = (mesh_coordinates[1:] + mesh_coordinates[:-1]) / 2
         for layer_num in np.unique(region_numbers):
@@ -310,39 +311,41 @@ def plot_shock_velocity(filename, mode, color=None):
 
     """
     save_dictionary = {}  # Dictionary to hold x, y data that can be written to .csv
+    run = HyadesRun(filename)
     if isinstance(mode, list):  # Plot multiple shock velocities
-        save_dictionary['Time (ns)'] = ShockVelocity(filename, 'Cubic').time
+        shock = ShockVelocity(run, mode[0])
+        Us = shock.compute(mode)  # Every mode shares one search for the shock front
+        save_dictionary['Time (ns)'] = shock.time
         fig, ax = plt.subplots()
         for m in mode:
-            shock = ShockVelocity(filename, m)
-            ax.plot(shock.time, shock.Us, label=m)
-            save_dictionary[f'{m} Us (km/s)'] = shock.Us
+            ax.plot(shock.time, Us[m], label=m)
+            save_dictionary[f'{m} Us (km/s)'] = Us[m]
         ax.legend()
         ax.set_title(f'Comparing Us of {os.path.basename(filename)}')
         comment = f'Comparing the {", ".join(mode)}-indexed Shock Velocities of {shock.run_name}'
     elif mode.lower() == 'all':  # Plot Shock Velocity using Left, Right, and Average Particle Velocity
-        save_dictionary['Time (ns)'] = ShockVelocity(filename, 'Cubic').time
+        shock = ShockVelocity(run, 'cubic')
+        Us = shock.compute(('left', 'right', 'average', 'cubic'))
+        save_dictionary['Time (ns)'] = shock.time
         fig, ax = plt.subplots()
-        for m in ('left', 'right', 'average', 'cubic'):
-            shock = ShockVelocity(filename, m)
-            ax.plot(shock.time, shock.Us, label=m)
-            save_dictionary[f'{m} Us (km/s)'] = shock.Us
-            ax.legend()
+        for m in Us:
+            ax.plot(shock.time, Us[m], label=m)
+            save_dictionary[f'{m} Us (km/s)'] = Us[m]
+        ax.legend()
         ax.set_title(f'Comparison of L, R, Avg, Cubic Us for {shock.run_name}')
         comment = ax.get_title()
     elif mode.lower() == 'difference':  # Plot the difference between the left and right indexed shock velocities
-        L_shock = ShockVelocity(filename, 'left')
-        R_shock = ShockVelocity(filename, 'right')
-        assert (L_shock.time == R_shock.time).all(), 'Left and Right shock timings do not agree'
+        shock = ShockVelocity(run, 'left')
+        Us = shock.compute(['left', 'right'])
         fig, ax = plt.subplots()
-        ax.plot(L_shock.time, L_shock.Us - R_shock.Us, label='Left - Right')
-        save_dictionary['Time (ns)'] = L_shock.time
-        save_dictionary['L - R Us (km/s)'] = L_shock.Us - R_shock.Us
+        ax.plot(shock.time, Us['left'] - Us['right'], label='Left - Right')
+        save_dictionary['Time (ns)'] = shock.time
+        save_dictionary['L - R Us (km/s)'] = Us['left'] - Us['right']
         ax.legend()
-        ax.set_title(f'Comparing L and R Us for {L_shock.run_name}')
-        comment = f'A comparison of the Left and Right indexed shock velocities of {L_shock.run_name}'
+        ax.set_title(f'Comparing L and R Us for {shock.run_name}')
+        comment = f'A comparison of the Left and Right indexed shock velocities of {shock.run_name}'
     else:
-        shock = ShockVelocity(filename, mode=mode)
+        shock = ShockVelocity(run, mode=mode)
         fig, ax = plt.subplots()
         if color:
             ax.plot(shock.time, shock.Us, color=color)
@@ -354,7 +357,7 @@ def plot_shock_velocity(filename, mode, color=None):
         comment = f'{mode}-indexed Shock Velocity of {shock.run_name}'
     ax.set(xlabel='Time (ns)', ylabel='Shock Velocity (km/s)')
 
-    run_name = ShockVelocity(filename, 'Cubic').run_name
+    run_name = run.run_name
     out_fname = os.path.join('data', run_name, f'{run_name}_Us.csv')
     fig.canvas.manager.toolmanager.add_tool('Save Data', SaveTools,
                                             data_dictionary=save_dictionary,
@@ -369,7 +372,8 @@ def debug_shock_velocity(filename, mode='Cubic'):
     """Plot the index and window used in the shock velocity calculations.
 
     This plot is not useful for interpreting Hyades simulations. It is a visual aid for debugging Shock Front
-    calculations done by the tools.hyades_reader.ShockVelocity
+    calculations done by the tools.hyades_reader.ShockVelocity. Every tracked wave front from tools.wave_fronts is
+    drawn underneath, so the leading shock picked by ShockVelocity can be checked against the other fronts.
 
     Args:
         filename (string): Name of the Hyades Run
@@ -379,18 +383,25 @@ def debug_shock_velocity(filename, mode='Cubic'):
         fig (matplotlib figure), ax (matplotlib axis)
 
     """
-    hyades = HyadesOutput(filename, 'Pres')
     shock = ShockVelocity(filename, mode)
-    fig, ax = xt_diagram(filename, 'Pres')
-    x0 = hyades.x[0, shock.window_start]
+    hyades = HyadesOutput(shock.run, 'Pres')
+    fig, ax = xt_diagram(shock.run, 'Pres')
+    colors = {'compression': 'tab:red', 'release': 'magenta'}
+    labeled = set()
+    for track in wave_fronts(shock.run).tracks():
+        kind = track['kind'][0]
+        ax.plot(track['x'], track['time'], color=colors[kind], lw=1,
+                label=f'{kind.capitalize()} Front' if kind not in labeled else None)
+        labeled.add(kind)
+    x0 = hyades.lagrangian_x[shock.window_start]
     y0 = shock.time
-    x1 = hyades.x[0, shock.window_stop]
+    x1 = hyades.lagrangian_x[shock.window_stop]
     y1 = shock.time
     ax.plot(x0, y0,
             color='white', ls='dotted', lw=2, label='Shock Window')
     ax.plot(x1, y1,
             color='white', ls='dotted', lw=2)
-    ax.scatter(hyades.x[0, shock.shock_index], shock.time,
+    ax.scatter(hyades.lagrangian_x[shock.shock_index], shock.time,
                color='red', marker='x', label='Shock Front')
     ax.legend()
 
@@ -426,21 +437,21 @@ def lineout(filename, var, times, coordinate_system='Lagrangian', show_layers: b
         var = var[0]
         hyades = HyadesOutput(filename, var)
         if coordinate_system == 'lagrangian':
-            save_dictionary['Lagrangian Position (um)'] = hyades.x[0, :]
+            save_dictionary['Lagrangian Position (um)'] = hyades.lagrangian_x
         fig, ax = plt.subplots()
-        for t, c in zip(times, colors):  # Plot a line for each time
-            closest_time, index = hyades.get_closest_time(t)
+        closest_times, indices = hyades.time_index.nearest(times)
+        for closest_time, index, c in zip(closest_times, indices, colors):  # Plot a line for each time
             label = f'{closest_time:.2f} ns'
             if coordinate_system == 'lagrangian':  # Lagrangian Position on x-axis
-                ax.plot(hyades.x[0, :], hyades.output[index, :],
+                ax.plot(hyades.lagrangian_x, hyades.output[index, :],
                         color=c, label=label)
                 x_label = 'Lagrangian Position (um)'
                 save_dictionary[f'{hyades.long_name} ({hyades.units}) at {label}'] = hyades.output[index, :]  # Save the y-data
             else:  # Eulerian Position on x-axis
-                ax.plot(hyades.x[index, :], hyades.output[index, :],
+                ax.plot(hyades.eulerian_x[index, :], hyades.output[index, :],
                         color=c, label=label)
                 x_label = 'Eulerian Position (um)'
-                save_dictionary['Eulerian Position (um) '+label] = hyades.x[index, :]
+                save_dictionary['Eulerian Position (um) '+label] = hyades.eulerian_x[index, :]
                 save_dictionary[label] = hyades.output[index, :]
 
         if show_layers:
@@ -455,20 +466,20 @@ def lineout(filename, var, times, coordinate_system='Lagrangian', show_layers: b
             #             right_boundary_index = hyades.layers[material]['Mesh Stop'] - 1  # Account for Python 0-index
             #             if hyades.data_dimensions[1] == 'NumZones':  # Account for mesh to zone conversion
             #                 right_boundary_index -= 1
-            #             layer_boundary = hyades.x[time_index, right_boundary_index]
-            #             if layer_boundary < hyades.x[time_index, :].max():
-            #                 boundary_marker_x = (hyades.x[time_index, right_boundary_index],
-            #                                      hyades.x[time_index, right_boundary_index])
+            #             layer_boundary = hyades.eulerian_x[time_index, right_boundary_index]
+            #             if layer_boundary < hyades.eulerian_x[time_index, :].max():
+            #                 boundary_marker_x = (hyades.eulerian_x[time_index, right_boundary_index],
+            #                                      hyades.eulerian_x[time_index, right_boundary_index])
             #                 marker_height = (hyades.output.max() - hyades.output.min()) * 0.03
             #                 boundary_marker_y = (hyades.output[time_index, right_boundary_index] - marker_height,
             #                                      hyades.output[time_index, right_boundary_index] + marker_height)
             #                 print(boundary_marker_x, boundary_marker_y)
             #                 ax.plot(boundary_marker_x, boundary_marker_y, color='green')
-            #                 ax.text(hyades.x[time_index, right_boundary_index],
+            #                 ax.text(hyades.eulerian_x[time_index, right_boundary_index],
             #                         hyades.output[time_index, right_boundary_index],
             #                         hyades.layers[material]['Name'] + ' ',
             #                         color='Green', ha='right')
-            #                 ax.text(hyades.x[time_index, right_boundary_index],
+            #                 ax.text(hyades.eulerian_x[time_index, right_boundary_index],
             #                         hyades.output[time_index, right_boundary_index],
             #                         ' LiF',
             #                         color='Green', ha='left')
@@ -492,20 +503,21 @@ def lineout(filename, var, times, coordinate_system='Lagrangian', show_layers: b
             comment = 'Eulerian Positions are in microns. '
 
         fig, ax_arr = plt.subplots(nrows=len(var), ncols=1, sharex=True)
+        run = HyadesRun(filename)  # All variables share one read of the .cdf and .inf
         for v, ax in zip(var, ax_arr):  # Each variable gets its own axis
-            hyades = HyadesOutput(filename, v)
+            hyades = HyadesOutput(run, v)
             if coordinate_system == 'lagrangian':
-                save_dictionary[f'{hyades.long_name} Position (um)'] = hyades.x[0, :]
+                save_dictionary[f'{hyades.long_name} Position (um)'] = hyades.lagrangian_x
                 # if eulerian coordinate system then the position needs to be saved at each time
             comment += f'{hyades.long_name} are in {hyades.units}. '
 
-            for t, c in zip(times, colors):  # Plot a line for each time
-                i = np.argmin(abs(hyades.time - t))
+            closest_times, indices = hyades.time_index.nearest(times)
+            for i, c in zip(indices, colors):  # Plot a line for each time
                 if coordinate_system == 'eulerian':
-                    save_dictionary[f'{hyades.long_name} Position (um) {hyades.time[i]:.2f} ns'] = hyades.x[i, :]
-                    x = hyades.x[i, :]
+                    save_dictionary[f'{hyades.long_name} Position (um) {hyades.time[i]:.2f} ns'] = hyades.eulerian_x[i, :]
+                    x = hyades.eulerian_x[i, :]
                 else:
-                    x = hyades.x[0, :]
+                    x = hyades.lagrangian_x
                 ax.plot(x, hyades.output[i, :],
                         color=c, label=f'{hyades.time[i]:.2f} ns')
 
@@ -549,7 +561,7 @@ def add_layers(hyades, ax, coordinate_system='Lagrangian', color='black'):
     y_max = ax.get_ylim()[1]
     if coordinate_system == 'lagrangian':
         x_min, x_max = ax.get_xlim()[0], ax.get_xlim()[1]
-        lagrangian_positions = hyades.x[0, :]
+        lagrangian_positions = hyades.lagrangian_x
         for material in hyades.layers:
             x_start = hyades.layers[material]['X Start']
             x_stop = hyades.layers[material]['X Stop']
@@ -563,14 +575,12 @@ def add_layers(hyades, ax, coordinate_system='Lagrangian', color='black'):
                     color=color, ha='center')
             ax.set_xlim(x_min, x_max)
     else:  # Eulerian Coordinate system
+        # Positions of the interfaces between layers at the times in hyades, skipping both free surfaces
+        interfaces = trajectories(hyades)['position'][hyades.time_slice, 1:-1]
+        if interfaces.shape[1] > 0:
+            ax.plot(interfaces, hyades.time,
+                    color=color, linestyle='solid', lw=1, alpha=0.7)
         for material in hyades.layers:
-            right_boundary_index = hyades.layers[material]['Mesh Stop'] - 1  # Account for Python 0-index
-            if hyades.data_dimensions[1] == 'NumZones':  # Account for Mesh to Zone conversion
-                right_boundary_index -= 1
-            eulerian_boundary = hyades.x[:, right_boundary_index]
-            if eulerian_boundary[0] < hyades.x[0, :].max():  # Ignores left-hand free surface
-                ax.plot(eulerian_boundary, hyades.time,
-                        color=color, linestyle='solid', lw=1, alpha=0.7)
             x_stop = hyades.layers[material]['X Stop']
             x_start = hyades.layers[material]['X Start']
             text_x = x_start + ((x_stop - x_start) / 2)
@@ -595,15 +605,12 @@ def show_ambient_density(hyades, ax):
         ax (matplotlib axis)
 
     """
-    cdf_name = os.path.join(hyades.dir_name, hyades.run_name + '.cdf')
-    cdf = netcdf.netcdf_file(cdf_name, 'r')
-    region_numbers = cdf.variables['RegNums'].data.copy()
+    region_numbers = hyades.run.cdf.variables['RegNums'].data.copy()
     region_numbers = region_numbers[1:-1]  # RegNums has a zero padded on either end
-    cdf.close()
     show_label = True
     for layer_num in np.unique(region_numbers):
         mask, = np.where(region_numbers == layer_num)
-        layer_coordinates = hyades.x[0, mask]
+        layer_coordinates = hyades.lagrangian_x[mask]
         layer_ambient_density = hyades.output[0, mask]  # Density at time zero for a single layer
         if show_label:  # Cheap way to only label the Ambient Density line once
             ax.plot(layer_coordinates, layer_ambient_density,
@@ -7,9 +7,127 @@ from graphics.static_graphics import add_layers
 plt.style.use('ggplot')
 
 
+class RectangleStatistics:
+    """Count, mean, standard deviation, and histogram of any rectangle of a 2D array without touching its values
+
+    Summed-area tables of the count, sum, and sum of squares are built once, so the statistics of a rectangle come
+    from the four corners of each table. Every value is also assigned to one of a fixed set of bins, and a summed-area
+    table of the counts in each bin gives the histogram of a rectangle in O(bins), regardless of its size. If that
+    table would need more than max_bytes, the histogram is counted from the precomputed bin of each value instead.
+
+    Attributes:
+        bins (numpy array): Edges of the fixed bins, covering every value
+        count (numpy array): Summed-area table of the number of values included
+        sum (numpy array): Summed-area table of the values
+        sum_squares (numpy array): Summed-area table of the squared values
+        bin_counts (numpy array): Summed-area table of the counts in each bin, or None if it would be too large
+
+    """
+    def __init__(self, values, bins, mask=None, max_bytes=2 ** 28):
+        """Build the summed-area tables of values
+
+        Args:
+            values (numpy array): 2D array of values
+            bins (numpy array): Evenly spaced bin edges covering every value
+            mask (numpy array, optional): Only include values where mask is True. Defaults to every finite value.
+            max_bytes (int, optional): Largest summed-area table of the bin counts to build
+
+        """
+        values = np.asarray(values, dtype=float)
+        included = np.isfinite(values) if mask is None else (mask & np.isfinite(values))
+        self.bins = np.asarray(bins, dtype=float)
+        num_bins = len(self.bins) - 1
+        values = np.where(included, values, 0)
+        self.count = summed_area_table(included.astype(np.int64))
+        self.sum = summed_area_table(values)
+        self.sum_squares = summed_area_table(values * values)
+        # Bin of every included value, with the last bin closed on the right as in np.histogram
+        step = self.bins[1] - self.bins[0]
+        bin_index = np.clip(np.floor((values - self.bins[0]) / step).astype(np.int64), 0, num_bins - 1)
+        self._bin_index = np.where(included, bin_index, num_bins)  # num_bins marks values that are not counted
+        nbytes = (values.shape[0] + 1) * (values.shape[1] + 1) * num_bins * np.dtype(np.int32).itemsize
+        if nbytes <= max_bytes:
+            self.bin_counts = np.zeros((values.shape[0] + 1, values.shape[1] + 1, num_bins), dtype=np.int32)
+            for i in range(num_bins):
+                self.bin_counts[1:, 1:, i] = (self._bin_index == i).cumsum(axis=0).cumsum(axis=1)
+        else:
+            self.bin_counts = None
+
+    @staticmethod
+    def _rectangle(table, rows, columns):
+        """Total of the rectangle table[rows, columns] of the array the summed-area table was built from"""
+        return (table[rows.stop, columns.stop] - table[rows.start, columns.stop]
+                - table[rows.stop, columns.start] + table[rows.start, columns.start])
+
+    def statistics(self, rows, columns):
+        """Count, mean, and standard deviation of the included values in a rectangle
+
+        Args:
+            rows (slice): Rows of the rectangle, with a step of 1
+            columns (slice): Columns of the rectangle, with a step of 1
+
+        Returns:
+            count (int), mean (float), std (float): mean and std are NaN if the rectangle has no included values
+
+        """
+        rows = slice(*rows.indices(self.count.shape[0] - 1)[:2])
+        columns = slice(*columns.indices(self.count.shape[1] - 1)[:2])
+        if (rows.stop <= rows.start) or (columns.stop <= columns.start):
+            return 0, np.nan, np.nan
+        count = int(self._rectangle(self.count, rows, columns))
+        if count == 0:
+            return 0, np.nan, np.nan
+        mean = self._rectangle(self.sum, rows, columns) / count
+        variance = self._rectangle(self.sum_squares, rows, columns) / count - mean ** 2
+        return count, mean, np.sqrt(max(variance, 0))
+
+    def histogram(self, rows, columns):
+        """Counts of the included values of a rectangle in each bin, see statistics for the arguments"""
+        rows = slice(*rows.indices(self.count.shape[0] - 1)[:2])
+        columns = slice(*columns.indices(self.count.shape[1] - 1)[:2])
+        num_bins = len(self.bins) - 1
+        if (rows.stop <= rows.start) or (columns.stop <= columns.start):
+            return np.zeros(num_bins, dtype=int)
+        if self.bin_counts is not None:
+            return self._rectangle(self.bin_counts, rows, columns)
+        return np.bincount(self._bin_index[rows, columns].ravel(), minlength=num_bins + 1)[:num_bins]
+
+    def percentile(self, counts, q):
+        """Percentile q of the values counted in a histogram, linearly interpolated within its bin
+
+        Args:
+            counts (numpy array): Histogram returned by histogram
+            q (float): Percentile between 0 and 100
+
+        Returns:
+            value (float): Accurate to within one bin width
+
+        """
+        cumulative = np.cumsum(counts)
+        target = cumulative[-1] * q / 100
+        i = min(int(np.searchsorted(cumulative, target, side='left')), len(counts) - 1)
+        below = cumulative[i] - counts[i]
+        fraction = (target - below) / counts[i] if counts[i] > 0 else 0
+        return self.bins[i] + fraction * (self.bins[i + 1] - self.bins[i])
+
+
+def summed_area_table(values):
+    """Summed-area table of a 2D array, with a row and column of zeros in front so any rectangle uses four corners"""
+    table = np.zeros((values.shape[0] + 1, values.shape[1] + 1), dtype=values.dtype)
+    np.cumsum(values, axis=0, out=table[1:, 1:])
+    np.cumsum(table[1:, 1:], axis=1, out=table[1:, 1:])
+    return table
+
+
 def xt_diagram_with_histogram(filename, variable, compression_threshold=1):
     """Plots an XT Diagram with the ability to select a rectangular region for histograms
 
+    Note:
+        The count, sum, and sum of squares of the variable, and its histogram on fixed bins, are tabulated when the
+        figure opens, along with which Zones are above the compression threshold. Selecting a region only looks up
+        the corners of those tables, so it never re-reads the .cdf and takes the same time for any size of region.
+        The middle 50% is found from the histogram, so it is accurate to within one bin.
+
     Args:
         filename (string): Name of the data to be plotted
         variable (string): Abbreviated name of variable of interest
@@ -19,70 +137,64 @@ def xt_diagram_with_histogram(filename, variable, compression_threshold=1):
         fig, axes
 
     """
-    def update_histogram(compression_threshold=compression_threshold):
-        """Updates histogram graphics, title, and statistics
-
-        Args:
-            compression_threshold (float): Toggleable minimum pressure to include in the histogram
-        """
+    def rectangle_statistics(thresholded):
+        """RectangleStatistics of the output, only including Zones above the compression threshold if thresholded"""
+        if thresholded not in tables:
+            mask = None
+            if thresholded:
+                if hyades.data_dimensions[1] == 'NumMeshs':
+                    # FIXME: figure out how to make this work with particle velocity
+                    error_message = 'Due to indexing issues, this feature does not work for variables with NumMeshs dimensions.' \
+                                    '\nThis means it does not work for Particle Velocity (U) but should work for Particle Velocity (UCM).' \
+                                    '\nThis feature works for Pres, Rho, and Te/Ti/Tr.'
+                    raise ValueError(error_message)
+                # The Pressure is read once and shares the HyadesRun of the plotted variable
+                pressure = hyades.output if hyades.var == 'Pres' else HyadesOutput(hyades.run, 'Pres').output
+                mask = np.asarray(pressure) >= compression_threshold
+            tables[thresholded] = RectangleStatistics(output, bins, mask=mask)
+        return tables[thresholded]
 
+    def update_histogram():
+        """Updates histogram graphics, title, and statistics"""
         nonlocal hyades
         nonlocal check_button
         checked = check_button.get_status()[0]
-        if checked:
-            pass  # If checked, use the default compression_threshold from the function definition
-        else:
-            compression_threshold = 0
+        # If checked, use the compression_threshold from the function definition
+        statistics = rectangle_statistics(thresholded=checked and (compression_threshold > 0))
         axes[1].cla()
         # Get the region selected on the xt diagram from the RectangleSelector
         x_min, x_max = min(rect.corners[0]), max(rect.corners[0])
         t_min, t_max = min(rect.corners[1]), max(rect.corners[1])
-        x_min_index = np.argmin(abs(hyades.x[0, :] - x_min))
-        x_max_index = np.argmin(abs(hyades.x[0, :] - x_max))
-        closest_t_min, t_min_index = hyades.get_closest_time(t_min)
-        closest_t_max, t_max_index = hyades.get_closest_time(t_max)
-
-        selected_output = hyades.output[t_min_index:t_max_index, x_min_index:x_max_index]
-        if compression_threshold > 0:  # ignores output below a compression_threshold pressure in GPa
-
-            if hyades.data_dimensions[1] == 'NumMeshs':
-                # FIXME: figure out how to make this work with particle velocity
-                error_message = 'Due to indexing issues, this feature does not work for variables with NumMeshs dimensions.' \
-                                '\nThis means it does not work for Particle Velocity (U) but should work for Particle Velocity (UCM).' \
-                                '\nThis feature works for Pres, Rho, and Te/Ti/Tr.'
-                raise ValueError(error_message)
-            hyades_pressure = HyadesOutput(filename, 'Pres')
-            selected_pressure = hyades_pressure.output[t_min_index:t_max_index, x_min_index:x_max_index]
-            mask = selected_pressure >= compression_threshold
-            selected_output = selected_output[mask]
-        # Add histogram with custom bin sizes depending on the variable
-        bin_sizes = {'Pres': 20, 'U': 0.25, 'UCM': 0.25, 'Rho': 0.25, 'Te': 250, 'Ti': 250, 'Tr': 250}
-        if variable in bin_sizes:
-            step = bin_sizes[variable]
-        else:
-            step = (selected_output.max() - selected_output.min()) / 30
-        try:
-            bins = np.arange(np.floor(selected_output.min()), np.ceil(selected_output.max()), step=step)
-        except ValueError:
+        x_min_index = np.argmin(abs(hyades.lagrangian_x - x_min))
+        x_max_index = np.argmin(abs(hyades.lagrangian_x - x_max))
+        (closest_t_min, closest_t_max), (t_min_index, t_max_index) = hyades.time_index.nearest([t_min, t_max])
+        rows, columns = slice(t_min_index, t_max_index), slice(x_min_index, x_max_index)
+
+        count, mean, std = statistics.statistics(rows, columns)
+        if count == 0:
             print('Try clicking and drag on the XT diagram to select a region for the histogram.')
-        else:
-            axes[1].hist(selected_output.flatten(), bins=bins,
-                         fc='tab:orange', ec=None)
-            # Add vertical line at average
-            axes[1].axvline(np.mean(selected_output), color='black', linestyle='solid',
-                            label=f'Mean: {np.mean(selected_output):.2f} {hyades.units}')
-            # Add shaded region indicating middle 50 % of histogram
-            p25 = np.percentile(selected_output, 25)
-            p75 = np.percentile(selected_output, 75)
-            x = (p25, p25, p75, p75)
-            y = (axes[1].get_ylim()[0], axes[1].get_ylim()[1], axes[1].get_ylim()[1], axes[1].get_ylim()[0])
-            axes[1].fill(x, y, label='Middle 50%', color='tab:gray', alpha=0.4)
-            # Format axis
-            title = f'Histogram over {x_min:.1f}-{x_max:.1f} um and {closest_t_min:.1f}-{closest_t_max:.1f} ns'
-            axes[1].set_title(title, fontsize='medium')
-            axes[1].set(xlabel=f'{hyades.long_name} ({hyades.units})', ylabel='Counts')
-            axes[1].legend(loc='upper left', fontsize='small')
-            fig.canvas.draw()
+            return
+        counts = statistics.histogram(rows, columns)
+        # Only show the bins between the smallest and largest values in the region
+        filled = np.flatnonzero(counts)
+        shown = slice(filled[0], filled[-1] + 1)
+        axes[1].hist(bins[:-1][shown], bins=bins[shown.start:shown.stop + 1], weights=counts[shown],
+                     fc='tab:orange', ec=None)
+        # Add vertical line at average
+        axes[1].axvline(mean, color='black', linestyle='solid',
+                        label=f'Mean: {mean:.2f} {hyades.units}')
+        # Add shaded region indicating middle 50 % of histogram
+        p25 = statistics.percentile(counts, 25)
+        p75 = statistics.percentile(counts, 75)
+        x = (p25, p25, p75, p75)
+        y = (axes[1].get_ylim()[0], axes[1].get_ylim()[1], axes[1].get_ylim()[1], axes[1].get_ylim()[0])
+        axes[1].fill(x, y, label='Middle 50%', color='tab:gray', alpha=0.4)
+        # Format axis
+        title = f'Histogram over {x_min:.1f}-{x_max:.1f} um and {closest_t_min:.1f}-{closest_t_max:.1f} ns'
+        axes[1].set_title(title, fontsize='medium')
+        axes[1].set(xlabel=f'{hyades.long_name} ({hyades.units})', ylabel='Counts')
+        axes[1].legend(loc='upper left', fontsize='small')
+        fig.canvas.draw()
 
     def on_region_selected(eclick, erelease):
         """Updates the histogram based on the region selected in the XT Diagram"""
@@ -96,11 +208,20 @@ def xt_diagram_with_histogram(filename, variable, compression_threshold=1):
         return label
 
     hyades = HyadesOutput(filename, variable)
+    output = np.asarray(hyades.output)
+    # Fixed bins covering every value, with custom bin sizes depending on the variable
+    bin_sizes = {'Pres': 20, 'U': 0.25, 'UCM': 0.25, 'Rho': 0.25, 'Te': 250, 'Ti': 250, 'Tr': 250}
+    low, high = np.floor(np.nanmin(output)), np.ceil(np.nanmax(output))
+    step = bin_sizes.get(variable, (high - low) / 30 or 1)
+    bins = np.arange(low, high + step, step)
+    if len(bins) < 2:
+        bins = np.array([low, low + step])
+    tables = {}  # RectangleStatistics with and without the compression threshold, built the first time each is used
     # Create figure with 2 axes
     fig, axes = plt.subplots(nrows=1, ncols=2, figsize=(10, 5))
     plt.subplots_adjust(left=None, right=None, top=None, bottom=None, wspace=0.15)
     # Add xt diagram and its colorbar to first axis
-    pcm = axes[0].pcolormesh(hyades.x[0, :], hyades.time, hyades.output)
+    pcm = axes[0].pcolormesh(hyades.lagrangian_x, hyades.time, hyades.output)
     axes[0] = add_layers(hyades, axes[0], color='white')
     cb = plt.colorbar(pcm, ax=[axes[0]], location='right', pad=0.015)  # Add colorbar and label it
     cb.set_label(f'{hyades.long_name} ({hyades.units})', rotation=-90, labelpad=14)
@@ -116,7 +237,8 @@ def xt_diagram_with_histogram(filename, variable, compression_threshold=1):
     axes[0].set_title(f'XT Diagram of {hyades.long_name}')
     axes[0].set(xlabel='Lagrangian Position (um)', ylabel='Time (ns)')
 
-    axes[1].hist(hyades.output.flatten(),  # bins=bins,
+    counts = rectangle_statistics(thresholded=False).histogram(slice(None), slice(None))
+    axes[1].hist(bins[:-1], bins=bins, weights=counts,
                  facecolor='tab:orange', edgecolor=None)
     axes[1].set_title(f'Histogram of {hyades.long_name}')
     axes[1].yaxis.tick_right()
@@ -1,13 +1,13 @@
 import os
-import re
 import json
-import copy
 import scipy
 import logging
 import numpy as np
 import pandas as pd
 from scipy import interpolate
-from tools.hyades_reader import HyadesOutput, ShockVelocity
+from tools.hyades_reader import HyadesRun, ShockVelocity
+from tools.layer_analysis import trajectories
+from tools.inf_file import InfFile
 from tools import hyades_runner
 
 
@@ -50,10 +50,7 @@ class HyadesOptimizer:
         self.exp_time = np.array(())
         
         inf_filename = os.path.join(self.path, f'{self.run_name}_setup.inf')
-        with open(inf_filename) as fh:
-            contents = fh.read()
-        pattern = '\[\w+!?\$?\]'
-        self.materials = re.findall(pattern, contents)
+        self.materials = InfFile.load(inf_filename).materials
 
     def read_experimental_data(self, exp_file_name, time_of_interest=None):
         """Load the experimental data into the class
@@ -131,9 +128,7 @@ class HyadesOptimizer:
         
         # Read Setup .inf file
         setup_inf = f'{self.run_name}_setup.inf'
-        with open(os.path.join(self.path, setup_inf)) as f:
-            contents = f.read()
-        new = copy.deepcopy(contents)
+        new = InfFile.load(os.path.join(self.path, setup_inf)).text
         
         assert 'TV_PRES' in new, f'Did not find "TV_PRES" in {new}'
         new = new.replace('TV_PRES', '\n'.join(pres_lines))
@@ -159,12 +154,12 @@ class HyadesOptimizer:
         """Calculates the sum of least squares residual between the most recent Hyades simulation and experiment"""
         hyades_file = f'{self.run_name}_{str(self.iter_count).zfill(3)}'
         hyades_path = os.path.join(self.path, hyades_file, hyades_file)
-        hyades_U = HyadesOutput(hyades_path, 'U')
-                         
+        hyades_run = HyadesRun(hyades_path)  # Particle Velocity and Shock Velocity share one read of the .cdf
+
         if self.material_of_interest is None:
-            self.material_of_interest = hyades_U.moi
-        if (self.shock_moi is None) and ('shock_moi' in vars(hyades_U)):
-            self.shock_moi = hyades_U.shock_moi
+            self.material_of_interest = hyades_run.moi
+        if self.shock_moi is None:
+            self.shock_moi = hyades_run.shock_moi
 
         if self.use_shock_velocity:
             '''All the old code that was written for an outdated version of the HyadesOutput class'''
@@ -185,7 +180,7 @@ class HyadesOptimizer:
             # interp_hyades = f_Us(interp_time)
             # self.residual = sum(np.square(self.exp_data - interp_hyades))
 
-            shock = ShockVelocity(hyades_path)
+            shock = ShockVelocity(hyades_run)
             if self.debug >= 1:
                 print(f'DEBUG: Hyades Shock Velocity\n'
                       f'Shock.time has {len(shock.time)} points from {shock.time.min()} to {shock.time.max()}\n'
@@ -216,7 +211,7 @@ class HyadesOptimizer:
             f_experiment = interpolate.interp1d(self.exp_time, self.exp_data)
 
             residual_time_start = self.exp_time.min()
-            residual_time_stop = min(self.exp_time.max(), shock.time_out_of_moi + self.delay)
+            residual_time_stop = min(self.exp_time.max(), shock.time_out_of_moi + self.delay, delayed_time.max())
             residual_time = np.linspace(residual_time_start, residual_time_stop, num=50)
 
             difference = f_experiment(residual_time) - f_hyades(residual_time)
@@ -224,10 +219,13 @@ class HyadesOptimizer:
 
         else:
             if self.material_of_interest is None:
-                self.material_of_interest = hyades_U.moi
-            idx = hyades_U.layers[self.material_of_interest]['Mesh Stop'] - 1
-            x = hyades_U.time - self.delay
-            y = hyades_U.output[:, idx]
+                self.material_of_interest = hyades_run.moi
+            # The rear surface of the material of interest is the boundary after it, and only its column is read
+            paths = trajectories(hyades_run)
+            rear_surface = hyades_run.layer_table.index(self.material_of_interest) + 1
+            hyades_time = paths['time']
+            x = hyades_time - self.delay
+            y = paths['velocity'][:, rear_surface]
             if any(np.isnan(y)):
                 raise ValueError(f'Found NaN in HyadesOuput from: {hyades_path}')
 
@@ -236,14 +234,14 @@ class HyadesOptimizer:
             hyades simulation time, which causes the interpolation function to crash. The if statements below
             check if the Hyades simulation covers all experimental time, and informs the user of any errors.
             '''
-            if self.exp_time.max() > hyades_U.time.max():
+            if self.exp_time.max() > hyades_time.max():
                 raise ValueError(f'Experimental time is longer than Hyades time.\n'
-                                 f'Hyades ends at {hyades_U.time.max()} ns, while Experimental time goes until '
+                                 f'Hyades ends at {hyades_time.max()} ns, while Experimental time goes until '
                                  f'{self.exp_time.max()} ns.\n'
                                  f'To fix, try extending Hyades simulation time past the end of experimental time.')
-            if self.exp_time.min() < hyades_U.time.min():
+            if self.exp_time.min() < hyades_time.min():
                 raise ValueError(f'Experimental time begins before Hyades time.\n'
-                                 f'Hyades begins at {hyades_U.time.min()} ns, while Experimental time begins at '
+                                 f'Hyades begins at {hyades_time.min()} ns, while Experimental time begins at '
                                  f'{self.exp_time.min()} ns.\n'
                                  f'To fix, try shifting all experimental times so they start at zero.')
 
@@ -271,10 +269,11 @@ class HyadesOptimizer:
             iteration_data['time velocity'] = list(shock.time)
             iteration_data['velocity'] = list(shock.Us)
         else:  # else, add particle velocity to iteration data
-            hyades = HyadesOutput(hyades_path, 'U')
-            i = hyades.layers[hyades.moi]['Mesh Stop'] - 1
-            iteration_data['time velocity'] = list(hyades.time)
-            iteration_data['velocity'] = list(hyades.output[:, i])
+            hyades_run = HyadesRun(hyades_path)
+            paths = trajectories(hyades_run)
+            rear_surface = hyades_run.layer_table.moi + 1
+            iteration_data['time velocity'] = list(paths['time'])
+            iteration_data['velocity'] = list(paths['velocity'][:, rear_surface])
 
         # Initialize json file if it doesn't exist, else load in json file
         if not os.path.exists(json_name):
@@ -12,6 +12,7 @@ import matplotlib.pyplot as plt
 from scipy import interpolate
 from optimizer.hyop_class import HyadesOptimizer
 from tools.hyades_reader import HyadesOutput
+from tools.layer_analysis import layer_stats
 
 
 def calculate_laser_pressure(hyop, laser_spot_diameter, debug=0):
@@ -123,12 +124,13 @@ def plot_xray_pressure(path, show_average=True):
 
     """
     hyades = HyadesOutput(path, 'Pres')
+    moi_name = hyades.layers[hyades.moi]['Name'] if hyades.moi else None
 
     if show_average:
-        # Plot pressure as t-X pcolormesh
+        # Plot pressure as t-X pcolormesh, with time along the x-axis and Lagrangian position along the y-axis
         fig, (ax1, ax2) = plt.subplots(figsize=(10, 8), nrows=2, ncols=1, sharex=True)
         cmap = plt.cm.inferno  # hot, plasma, inferno
-        im = ax1.pcolormesh(hyades.time, hyades.x, hyades.output, cmap=cmap)
+        im = ax1.pcolormesh(hyades.time, hyades.lagrangian_x, hyades.output.T, cmap=cmap)
         plt.subplots_adjust(hspace=0.1)
         # Colorbar
         cb = fig.colorbar(im, ax=(ax1, ax2), orientation="horizontal",
@@ -136,32 +138,33 @@ def plot_xray_pressure(path, show_average=True):
         cb.set_label('Pressure (GPa)', color='w')
         cbytick_hyades = plt.getp(cb.ax.axes, 'xticklabels')
         plt.setp(cbytick_hyades, color='w')
-        # Add vertical lines for material interfaces, horizontal lines for x-ray times
+        # Add horizontal lines for material interfaces, vertical lines for x-ray times
         for mat in hyades.layers:
             distance = hyades.layers[mat]['X Start']
             y = (hyades.layers[mat]['X Start'] + hyades.layers[mat]['X Stop']) / 2
-            ax1.axvline(distance, color='w', linestyle='dashed', linewidth=1)
-            ax1.text(0.99 * ax2.get_xlim()[1], y, mat, fontsize=12, color='w', ha='right')
-        for time in hyades.xray_probe:
-            ax1.axhline(time, color='w', linestyle='dashed', linewidth=1)
-        x = hyades.x.max() * 0.02
-        y = (hyades.xray_probe[1] + hyades.xray_probe[0]) / 2
-        ax1.text(x, y, 'X-Ray Window', color='w', ha='left')
-        # Plot mean and standard deviation
-        ix_dist = (hyades.layers[hyades.moi]['Mesh Start'],
-                   hyades.layers[hyades.moi]['Mesh Stop'])
-        mean = np.mean(hyades.output[ix_dist[0]:ix_dist[1], :], axis=0)
-        std_dev = np.std(hyades.output[ix_dist[0]:ix_dist[1], :], axis=0) 
+            ax1.axhline(distance, color='w', linestyle='dashed', linewidth=1)
+            ax1.text(0.99 * hyades.time.max(), y, hyades.layers[mat]['Name'], fontsize=12, color='w', ha='right')
+        if hyades.xray_probe:
+            for time in hyades.xray_probe:
+                ax1.axvline(time, color='w', linestyle='dashed', linewidth=1)
+            x = (hyades.xray_probe[1] + hyades.xray_probe[0]) / 2
+            y = hyades.lagrangian_x.max() * 0.02
+            ax1.text(x, y, 'X-Ray Window', color='w', ha='center')
+        # Plot mean and standard deviation of the material of interest at every time
+        stats = layer_stats(hyades, 'Pres', layers=[hyades.moi], stats=['mean', 'std'], per_time=True)
+        mean = stats['mean'][:, 0]
+        std_dev = stats['std'][:, 0]
         ax2.plot(hyades.time, mean, label='Average')
         ax2.fill_between(hyades.time, mean+std_dev, mean-std_dev, alpha=0.25, label='Std Dev')
-        for t in hyades.xray_probe_time:
-            ax2.axvline(t, color='k', linestyle='dashed', linewidth=1)
+        if hyades.xray_probe:
+            for t in hyades.xray_probe:
+                ax2.axvline(t, color='k', linestyle='dashed', linewidth=1)
 
         # Final figure formatting
         ax1.set_title(f'{os.path.basename(path)} Pressure History')
         sz = 12
         ax1.set_ylabel('Lagranian Position (um)', fontsize=sz)
-        ax2.set_title(f'Average Pressure in {hyades.moi}', fontsize=12)
+        ax2.set_title(f'Average Pressure in {moi_name}', fontsize=12)
         ax2.set_xlabel('Time (ns)', fontsize=sz)
         ax2.set_ylabel('Mean Pressure (GPa)', fontsize=sz)
         ax2.set_xlim(0, hyades.time.max())
@@ -173,22 +176,22 @@ def plot_xray_pressure(path, show_average=True):
         return fig, (ax1, ax2)
 
     else:
-        # Plot pressure as x-t pcolormesh
+        # Plot pressure as t-X pcolormesh, with time along the x-axis and Lagrangian position along the y-axis
         fig, ax1 = plt.subplots(figsize=(10, 8))
         cmap = plt.cm.viridis  # hot, plasma, inferno
-        im = ax1.pcolormesh(hyades.time, hyades.x, hyades.output, cmap=cmap)
+        im = ax1.pcolormesh(hyades.time, hyades.lagrangian_x, hyades.output.T, cmap=cmap)
 
         cb = fig.colorbar(im, ax=ax1)
         cb.set_label('Pressure (GPa)', color='w')
         cbytick_hyades = plt.getp(cb.ax.axes, 'xticklabels')
         plt.setp(cbytick_hyades, color='w')
 
-        # Add vertical dashed lines for material interfaces
+        # Add horizontal dashed lines for material interfaces
         for mat in hyades.layers:
             distance = hyades.layers[mat]['X Start']
             y = (hyades.layers[mat]['X Start'] + hyades.layers[mat]['X Stop']) / 2
-            ax1.axvline(distance, color='w', linestyle='dashed', linewidth=1)
-            ax1.text(0.99 * ax1.get_xlim()[1], y, mat, fontsize=12, color='w', ha='right')
+            ax1.axhline(distance, color='w', linestyle='dashed', linewidth=1)
+            ax1.text(0.99 * hyades.time.max(), y, hyades.layers[mat]['Name'], fontsize=12, color='w', ha='right')
         
         # Final figure formatting
         ax1.set_title(f'{os.path.basename(path)} Pressure History', fontsize=18)
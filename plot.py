@@ -88,7 +88,8 @@ parser = argparse.ArgumentParser(prog='plot.py',
 parser.add_argument('filename', type=str,
                     help='Name of the Hyades run to be plotted. Assumed to be in pyhy/data '
                          'and does not require file extension.')
-parser.add_argument('-xt', choices=['Pres', 'Rho', 'Rho0', 'Sd1', 'Te',  'Ti', 'Tr', 'U', 'UCM'], nargs='+',
+parser.add_argument('-xt', choices=['Pres', 'Rho', 'Rho0', 'Sd1', 'Te',  'Ti', 'Tr', 'U', 'UCM',
+                                   'Uzone', 'Mass', 'Cs', 'Pmax'], nargs='+',
                     help='Plot each variable on an XT diagram.'
                          '\nMultiple selections are allowed and each will be plotted on their own figure.')
 parser.add_argument('-xth', '--xt_histogram', nargs='+',
@@ -178,10 +179,10 @@ if args.lineout:
         if is_float(v):  # Times are floats
             times.append(float(v))
         else:  # Variables are string abbreviations of Hyades variables
-            if v not in ('Pres', 'Rho', 'Rho0', 'U', 'Te', 'Ti', 'Tr'):
+            if v not in ('Pres', 'Rho', 'Rho0', 'U', 'Te', 'Ti', 'Tr', 'Uzone', 'Mass', 'Cs', 'Pmax'):
                 error_string = 'Variable of interest required for lineout plots.\n' \
                                'Example: --lineout Pres 1 2 3\n' \
-                               'Options for variable are {Pres, Rho, Rho0, U, Te, Ti, Tr}'
+                               'Options for variable are {Pres, Rho, Rho0, U, Te, Ti, Tr, Uzone, Mass, Cs, Pmax}'
                 raise ValueError(error_string)
             variables.append(v)
     fig, ax = static_graphics.lineout(abs_path, variables, times, coordinate_system=coordinate_system)
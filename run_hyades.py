@@ -20,6 +20,11 @@ to a folder named after the .inf.
 Example:
     The following line would run all .inf files in the directory ./data/inf
         $ python run_hyades.py
+
+    The following line would also convert the output of each simulation to a
+    snapshot .cdf in ./data/snapshots every 60 seconds while it runs, which can
+    be opened with view_hyades_GUI.py before the simulation finishes
+        $ python run_hyades.py --snapshot 60 --scratch ./data/snapshots
 '''
 epilog = '''
                       ___      _  _      
@@ -39,17 +44,21 @@ parser.add_argument('-in', '--inf_dir', type=str, default='./data/inf/',
                     help='Name of the directory containing the .inf files. (default: %(default)s)')
 parser.add_argument('-out', '--out_dir', type=str, default='./data/',
                     help='Folder where data will end up. (default: %(default)s)')
+parser.add_argument('-s', '--snapshot', type=float, default=None,
+                    help='Seconds between snapshot .cdf files of each running simulation. (default: no snapshots)')
+parser.add_argument('--scratch', type=str, default=None,
+                    help='Folder for the snapshot .cdf files. (default: pyhy_snapshots in the temporary directory)')
 parser.add_argument('-r', '--run', action='store_true', default=False,
                     help='Toggle to disable inf filename preview and run Hyades without confirmation. (default: False)')
 args = parser.parse_args()
 
 if args.run:  # Input request to run Hyades without confirmation
-    batch_run_hyades(args.inf_dir, args.out_dir)
+    batch_run_hyades(args.inf_dir, args.out_dir, snapshot_interval=args.snapshot, scratch_dir=args.scratch)
 else:  # Print all .inf names and ask for confirmation
     inf_files = [f for f in os.listdir(args.inf_dir) if f.endswith('.inf')]
     print(f'Found {len(inf_files)} .inf files in {args.inf_dir!r}: {", ".join(inf_files)}.')
     answer = input(f'Start all {len(inf_files)} Hyades simulations? [y/n]: ')
     if answer == 'y':
-        batch_run_hyades(args.inf_dir, args.out_dir)
+        batch_run_hyades(args.inf_dir, args.out_dir, snapshot_interval=args.snapshot, scratch_dir=args.scratch)
     else:
         print('Did not run any Hyades simulations.')
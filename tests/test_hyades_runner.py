@@ -0,0 +1,95 @@
+"""Snapshot mode of run_hyades, run against the stand-in hyades and PPF2NCDF scripts in tests/stand_ins
+
+Run from the top of the repository with::
+
+    $ python -m unittest discover tests
+
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+from tools import hyades_runner  # noqa: E402
+from tools.hyades_reader import HyadesOutput, HyadesRun  # noqa: E402
+
+STAND_IN_DIR = os.path.join(REPO_DIR, 'tests', 'stand_ins')
+INF = '''c Simulation of [Diamond] [LiF!$] [Window]
+geometry 1 1
+mesh 1 41 0.000000 0.004000 1.000
+mesh 41 101 0.004000 0.010000 1.000
+mesh 101 121 0.010000 0.012000 1.000
+region 1 40 1 3.51
+region 41 100 2 2.64
+region 101 120 3 1.0
+material 1 6 12.0 1.0
+EOS 90 1
+EOS 7271 2
+EOS 5000 3
+pparray r u pres
+parm tstop 4.00e-09
+parm postdt 1.00e-10
+'''
+
+
+class TestSnapshots(unittest.TestCase):
+
+    def setUp(self):
+        self.original_dir = os.getcwd()
+        self.original_path = os.environ['PATH']
+        self.dir_name = tempfile.mkdtemp()
+        os.environ['PATH'] = STAND_IN_DIR + os.pathsep + self.original_path
+        os.environ['STAND_IN_DUMPS'] = '40'
+        os.environ['STAND_IN_DUMP_SECONDS'] = '0.05'
+        os.chdir(self.dir_name)  # run_hyades looks for the output in the working directory, like batch_run_hyades
+        with open('snap.inf', 'w') as f:
+            f.write(INF)
+
+    def tearDown(self):
+        os.chdir(self.original_dir)
+        os.environ['PATH'] = self.original_path
+        os.environ.pop('STAND_IN_DUMPS', None)
+        os.environ.pop('STAND_IN_DUMP_SECONDS', None)
+        shutil.rmtree(self.dir_name, ignore_errors=True)
+
+    def test_snapshots_load_and_refresh(self):
+        scratch_dir = os.path.join(self.dir_name, 'scratch')
+        log = []
+        thread = threading.Thread(target=lambda: log.append(
+            hyades_runner.run_hyades('snap.inf', quiet=True, snapshot_interval=0.3, scratch_dir=scratch_dir)))
+        thread.start()
+
+        snapshot = os.path.join(scratch_dir, 'snap', 'snap')
+        while thread.is_alive() and not os.path.exists(snapshot + '.cdf'):
+            time.sleep(0.02)
+        self.assertTrue(os.path.exists(snapshot + '.cdf'), 'No snapshot was taken while the simulation ran')
+        pressure = HyadesOutput(snapshot, 'Pres')
+        velocity = HyadesOutput(pressure.run, 'U')
+        num_dumps = [len(pressure.time)]
+        while thread.is_alive():
+            time.sleep(0.1)
+            if pressure.refresh():
+                velocity.refresh()
+                num_dumps.append(len(pressure.time))
+                # The refreshed outputs hold the same data as a fresh read of the new snapshot
+                fresh = HyadesRun(snapshot)
+                np.testing.assert_array_equal(pressure.output, HyadesOutput(fresh, 'Pres').output)
+                np.testing.assert_array_equal(velocity.output, HyadesOutput(fresh, 'U').output)
+        thread.join()
+
+        self.assertGreaterEqual(len(num_dumps), 2, f'Only one snapshot was loaded: {num_dumps}')
+        self.assertEqual(num_dumps, sorted(num_dumps))
+        self.assertGreater(num_dumps[-1], num_dumps[0], 'refresh did not add the newer dumps')
+        self.assertIn('snapshots', log[0])
+        self.assertFalse(os.path.exists(os.path.join(scratch_dir, 'snap', '.staging')),
+                         'The staged copies of the output were left behind')
+
+
+if __name__ == '__main__':
+    unittest.main()
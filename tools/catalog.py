@@ -0,0 +1,288 @@
+"""SQLite catalog of every Hyades run under a data directory
+
+Finding runs by scanning directories and opening their files gets slow once ./data holds hundreds of runs and
+optimizations. The catalog records what is needed to find and filter runs in a small SQLite database, by default
+./data/pyhy_catalog.sqlite, with one row per run and one row per layer::
+
+    runs    path, run_name, dir_name, materials, moi, shock_moi, tstop, postdt, num_meshes, num_zones, num_dumps,
+            inf_size, cdf_size, store_size, mtime, is_optimization, optimization
+    layers  path, layer, name, eos, mesh_start, mesh_stop, x_start, x_stop, is_moi, is_shock_moi
+
+Catalog.update only stats the files of each run and re-reads the ones that changed since the last update, and even
+then only the .inf and the header of the .cdf are read. Queries never touch the .cdf.
+
+Example:
+    Find every run with LiF as the material of interest and more than 500 zones::
+
+        from tools.catalog import Catalog
+        catalog = Catalog()
+        catalog.update()
+        for row in catalog.query(moi='LiF', min_zones=500):
+            print(row['path'], row['num_zones'], row['tstop'])
+
+"""
+import os
+import time
+import sqlite3
+from tools.hyades_reader import HyadesRun
+from tools.describe import describe
+from tools.inf_file import InfFile
+from tools.pyhy_store import size_on_disk
+
+SCHEMA_VERSION = 1
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    path TEXT PRIMARY KEY,
+    run_name TEXT,
+    dir_name TEXT,
+    materials TEXT,
+    moi TEXT,
+    shock_moi TEXT,
+    tstop REAL,
+    postdt REAL,
+    num_meshes INTEGER,
+    num_zones INTEGER,
+    num_dumps INTEGER,
+    inf_size INTEGER,
+    cdf_size INTEGER,
+    store_size INTEGER,
+    mtime REAL,
+    is_optimization INTEGER,
+    optimization TEXT,
+    signature TEXT,
+    indexed REAL
+);
+CREATE TABLE IF NOT EXISTS layers (
+    path TEXT REFERENCES runs(path) ON DELETE CASCADE,
+    layer INTEGER,
+    name TEXT COLLATE NOCASE,
+    eos INTEGER,
+    mesh_start INTEGER,
+    mesh_stop INTEGER,
+    x_start REAL,
+    x_stop REAL,
+    is_moi INTEGER,
+    is_shock_moi INTEGER,
+    PRIMARY KEY (path, layer)
+);
+CREATE INDEX IF NOT EXISTS layers_name ON layers (name);
+'''
+
+
+def find_runs(root):
+    """Paths of every run under root, given as the path to the .inf without its extension
+
+    A run is a directory containing an .inf with the same name as the directory, such as
+    ./data/diamond_decay/diamond_decay.inf. Setup files of optimizations (*_setup.inf) are not runs.
+    """
+    runs = []
+    for dir_name, directories, files in os.walk(root):
+        directories[:] = sorted(d for d in directories if not d.startswith('.') and not d.endswith('.pyhy'))
+        run_name = os.path.basename(dir_name)
+        if run_name + '.inf' in files:
+            runs.append(os.path.join(dir_name, run_name))
+    return runs
+
+
+def signature(path):
+    """Sizes and modification times of the .inf, .cdf, and pyhy store of a run, which change whenever it is re-run"""
+    parts = []
+    for name in (path + '.inf', path + '.cdf', os.path.join(path + '.pyhy', 'index.json')):
+        try:
+            stat = os.stat(name)
+            parts.append(f'{stat.st_mtime_ns}:{stat.st_size}')
+        except OSError:
+            parts.append('-')
+    return ' '.join(parts)
+
+
+class Catalog:
+    """SQLite index of the Hyades runs under a data directory
+
+    Attributes:
+        root (string): Directory that is searched for runs
+        db_name (string): Path to the SQLite database
+
+    """
+    def __init__(self, root='./data', db_name=None):
+        """Open, or create, the catalog of a data directory
+
+        Args:
+            root (string, optional): Directory that is searched for runs
+            db_name (string, optional): Path to the SQLite database. Defaults to pyhy_catalog.sqlite inside root.
+
+        """
+        self.root = root
+        self.db_name = db_name or os.path.join(root, 'pyhy_catalog.sqlite')
+        self.connection = sqlite3.connect(self.db_name)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute('PRAGMA foreign_keys = ON')
+        if self.connection.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+            # Rebuilt from the runs on disk, so an old catalog can simply be dropped
+            self.connection.executescript('DROP TABLE IF EXISTS layers; DROP TABLE IF EXISTS runs;')
+            self.connection.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        self.connection.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM runs').fetchone()[0]
+
+    def close(self):
+        self.connection.close()
+
+    def update(self, verbose=False):
+        """Add new runs, re-index runs whose files changed, and remove runs that no longer exist
+
+        Args:
+            verbose (bool, optional): Toggle to print every run that is indexed or removed
+
+        Returns:
+            indexed (list), removed (list): Paths of the runs that were (re-)indexed and removed
+
+        """
+        known = dict(self.connection.execute('SELECT path, signature FROM runs').fetchall())
+        indexed = []
+        errors = []
+        found = set()
+        for path in find_runs(self.root):
+            path = os.path.abspath(path)
+            found.add(path)
+            run_signature = signature(path)
+            if known.get(path) == run_signature:
+                continue
+            try:
+                row, layers = self.read_run(path)
+            except Exception as e:
+                errors.append((path, e))
+                continue
+            row['signature'] = run_signature
+            with self.connection:
+                self.connection.execute('DELETE FROM runs WHERE path = ?', (path,))
+                self.connection.execute(f'INSERT INTO runs ({", ".join(row)}) VALUES ({", ".join("?" * len(row))})',
+                                        list(row.values()))
+                self.connection.executemany('INSERT INTO layers VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', layers)
+            indexed.append(path)
+            if verbose:
+                print(f'Indexed {path}')
+
+        root = os.path.abspath(self.root)
+        removed = [path for path in known if (path not in found) and (os.path.commonpath([root, path]) == root)]
+        with self.connection:
+            self.connection.executemany('DELETE FROM runs WHERE path = ?', [(path,) for path in removed])
+        if verbose:
+            for path in removed:
+                print(f'Removed {path}')
+            for path, e in errors:
+                print(f'Could not index {path}: {e}')
+        return indexed, removed
+
+    @staticmethod
+    def read_run(path):
+        """Row of the runs table and rows of the layers table describing a run, read from the .inf and .cdf header"""
+        inf = InfFile.load(path + '.inf')
+        parm = inf.parm
+        layers = inf.layers
+        dir_name = os.path.dirname(path)
+        parent = os.path.dirname(dir_name)
+        optimization = [f for f in os.listdir(parent) if f.endswith('_optimization.json')] if parent else []
+        cdf_name = path + '.cdf'
+        store_name = path + '.pyhy'
+
+        num_dumps = num_meshes = None
+        if os.path.isfile(cdf_name) or os.path.isdir(store_name):
+            with HyadesRun(path) as run:
+                description = describe(run, derived=False)
+            num_dumps = description['num_dumps']
+            num_meshes = description['num_meshes']
+        if num_meshes is None and layers:
+            num_meshes = max(layer['Mesh Stop'] for layer in layers.values())
+
+        files = [name for name in (path + '.inf', cdf_name, store_name) if os.path.exists(name)]
+        row = {'path': path,
+               'run_name': os.path.basename(path),
+               'dir_name': dir_name,
+               'materials': ' '.join(layer['Name'] for layer in layers.values()),
+               'moi': layers[inf.moi]['Name'] if inf.moi else None,
+               'shock_moi': layers[inf.shock_moi]['Name'] if inf.shock_moi else None,
+               'tstop': parm['tstop'] * 1e9 if isinstance(parm.get('tstop'), float) else None,  # seconds to ns
+               'postdt': parm['postdt'] * 1e9 if isinstance(parm.get('postdt'), float) else None,
+               'num_meshes': num_meshes,
+               'num_zones': num_meshes - 1 if num_meshes else None,
+               'num_dumps': num_dumps,
+               'inf_size': os.path.getsize(path + '.inf'),
+               'cdf_size': os.path.getsize(cdf_name) if os.path.isfile(cdf_name) else None,
+               'store_size': size_on_disk(store_name) if os.path.isdir(store_name) else None,
+               'mtime': max(os.path.getmtime(name) for name in files),
+               'is_optimization': int(bool(optimization)),
+               'optimization': optimization[0][:-len('_optimization.json')] if optimization else None,
+               'indexed': time.time()}
+        layer_rows = [(path, i + 1, layer['Name'], layer['EOS'], layer['Mesh Start'], layer['Mesh Stop'],
+                       layer['X Start'], layer['X Stop'], int(layer_id == inf.moi), int(layer_id == inf.shock_moi))
+                      for i, (layer_id, layer) in enumerate(layers.items())]
+        return row, layer_rows
+
+    def query(self, name=None, material=None, moi=None, shock_moi=None, min_zones=None, max_zones=None,
+              min_tstop=None, max_tstop=None, optimization=None, where=None):
+        """Runs matching every given condition, most recently modified first
+
+        Args:
+            name (string, optional): SQL LIKE pattern of the run name, such as 'FeSi%'
+            material (string, optional): Only runs with a layer of this material
+            moi (string, optional): Only runs with this material of interest
+            shock_moi (string, optional): Only runs with this shock material of interest
+            min_zones (int, optional): Only runs with more than min_zones zones
+            max_zones (int, optional): Only runs with fewer than max_zones zones
+            min_tstop (float, optional): Only runs stopping at or after min_tstop nanoseconds
+            max_tstop (float, optional): Only runs stopping at or before max_tstop nanoseconds
+            optimization (bool, optional): Only optimization iterations if True, or only other runs if False
+            where (string, optional): Extra SQL condition on the runs table, such as 'num_dumps > 100'
+
+        Returns:
+            rows (list): sqlite3.Row of each matching run, which can be indexed by column name
+
+        """
+        conditions = []
+        parameters = []
+        if name is not None:
+            conditions.append('run_name LIKE ?')
+            parameters.append(name)
+        if material is not None:
+            conditions.append('EXISTS (SELECT 1 FROM layers WHERE layers.path = runs.path AND layers.name = ?)')
+            parameters.append(material)
+        if moi is not None:
+            conditions.append('moi = ? COLLATE NOCASE')
+            parameters.append(moi)
+        if shock_moi is not None:
+            conditions.append('shock_moi = ? COLLATE NOCASE')
+            parameters.append(shock_moi)
+        if min_zones is not None:
+            conditions.append('num_zones > ?')
+            parameters.append(min_zones)
+        if max_zones is not None:
+            conditions.append('num_zones < ?')
+            parameters.append(max_zones)
+        if min_tstop is not None:
+            conditions.append('tstop >= ?')
+            parameters.append(min_tstop)
+        if max_tstop is not None:
+            conditions.append('tstop <= ?')
+            parameters.append(max_tstop)
+        if optimization is not None:
+            conditions.append('is_optimization = ?')
+            parameters.append(int(optimization))
+        if where:
+            conditions.append(f'({where})')
+        sql = 'SELECT * FROM runs'
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        return self.connection.execute(sql + ' ORDER BY mtime DESC', parameters).fetchall()
+
+    def layers(self, path):
+        """Rows of the layers table of a run, in order"""
+        return self.connection.execute('SELECT * FROM layers WHERE path = ? ORDER BY layer',
+                                       (os.path.abspath(path),)).fetchall()
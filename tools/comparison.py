@@ -0,0 +1,217 @@
+"""Compare Hyades runs with different dump times, stop times, or meshes on a shared Lagrangian and time grid
+
+Runs of a convergence study, or the same deck run with two versions of Hyades, rarely share their dump times or mesh,
+so their outputs cannot be subtracted directly. diff_runs resamples both runs onto one grid of Lagrangian positions
+and times, then returns the difference along with its L2 and Linf norms inside each layer. compare_runs does the same
+for one reference against many runs, resampling the reference only once.
+
+Example:
+    Check how much the pressure changes when the mesh is refined::
+
+        from tools.comparison import diff_runs, compare_runs
+        diff = diff_runs('./data/diamond_100', './data/diamond_200', 'Pres')
+        print(dict(zip(diff['layers'], diff['L2'])))
+        plt.pcolormesh(diff['x'], diff['time'], diff['difference'])
+
+        differences = compare_runs('./data/diamond_800', ['./data/diamond_100', './data/diamond_200'], 'Pres')
+        print([difference['Linf'].max() for difference in differences])
+
+"""
+import hashlib
+import concurrent.futures
+import numpy as np
+from tools.hyades_reader import HyadesRun, HyadesOutput
+
+MAX_BLOCK_SIZE = 2 ** 22  # number of grid points resampled at once, which bounds the memory used by the temporaries
+
+
+def common_grid(runs, var):
+    """Lagrangian positions and times covered by every run, at the coarsest spacing of any run
+
+    The times are evenly spaced over the interval every run reached, using the largest dump spacing among the runs.
+    The positions are evenly spaced over the Lagrangian positions of var that every run has, using the fewest
+    positions of any run.
+
+    Args:
+        runs (list): HyadesRuns to cover
+        var (string): Abbreviated name of the variable, which decides between the Mesh and Zone positions
+
+    Returns:
+        time_grid (numpy array), x_grid (numpy array)
+
+    """
+    var = var.capitalize()
+    times = [run.time for run in runs]
+    positions = [lagrangian_x(run, var) for run in runs]
+    start, stop = max(time[0] for time in times), min(time[-1] for time in times)
+    if stop < start:
+        raise ValueError(f'The runs do not overlap in time. The latest start is {start:.4f} ns and the earliest stop '
+                         f'is {stop:.4f} ns')
+    spacing = max(np.diff(time).max() if len(time) > 1 else 0 for time in times)
+    num_times = int(np.round((stop - start) / spacing)) + 1 if spacing > 0 else 1
+    x_start, x_stop = max(x[0] for x in positions), min(x[-1] for x in positions)
+    if x_stop < x_start:
+        raise ValueError(f'The runs do not overlap in space. The rightmost left edge is {x_start:.4f} um and the '
+                         f'leftmost right edge is {x_stop:.4f} um')
+    num_x = min(len(x) for x in positions)
+    return np.linspace(start, stop, num_times), np.linspace(x_start, x_stop, num_x)
+
+
+def lagrangian_x(run, var):
+    """Lagrangian positions, in microns, of the Mesh or Zone grid of var"""
+    return np.asarray(run.read_coordinates(var, slice(0, 1))[0])
+
+
+def resample(run, var, time_grid, x_grid):
+    """Linearly interpolate a variable onto Lagrangian positions and times in one vectorized pass
+
+    Each point of the grid is interpolated from the two dumps around its time and the two Mesh points or Zones around
+    its Lagrangian position. Points outside the run are held at its first or last dump and position. The result is
+    memoized on the run and in the process-wide variable_cache, keyed by the variable and grids.
+
+    Args:
+        run (HyadesRun): Run to resample
+        var (string): Abbreviated name of a 2D variable on the Mesh or Zone grid, such as Pres, Rho, or U
+        time_grid (numpy array): Times in nanoseconds
+        x_grid (numpy array): Increasing Lagrangian positions in microns
+
+    Returns:
+        values (numpy array): len(time_grid) rows and len(x_grid) columns
+
+    """
+    var = var.capitalize()
+    dimensions = run.dimensions(var)
+    if (len(dimensions) != 2) or (dimensions[1] not in ('NumMeshs', 'NumZones')):
+        raise ValueError(f'Only 2D variables on the Mesh or Zone grid can be compared. {var} has {dimensions}')
+    time_grid = np.asarray(time_grid, dtype=float)
+    x_grid = np.asarray(x_grid, dtype=float)
+    digest = hashlib.sha1(x_grid.tobytes() + time_grid.tobytes()).hexdigest()[:16]
+
+    def interpolate():
+        x = lagrangian_x(run, var)
+        # Columns on either side of each position and the weight of the right one, the same for every dump
+        right = np.clip(np.searchsorted(x, x_grid, side='right'), 1, max(len(x) - 1, 1))
+        left = right - 1
+        with np.errstate(invalid='ignore', divide='ignore'):
+            weight = np.clip(np.where(x[right] > x[left], (x_grid - x[left]) / (x[right] - x[left]), 0), 0, 1)
+        columns = slice(int(left.min()), int(right.max()) + 1)
+        left, right = left - columns.start, right - columns.start
+
+        values = np.empty((len(time_grid), len(x_grid)))
+        block_size = max(1, MAX_BLOCK_SIZE // max(1, len(x_grid)))
+        for start in range(0, len(time_grid), block_size):
+            stop = start + block_size
+            before, after, fraction = run.time_index.weights(time_grid[start:stop])
+            # Only the dumps and columns that are needed are read
+            dumps = np.unique(np.concatenate((before, after)))
+            rows = np.asarray(run.read(var, slice(int(dumps[0]), int(dumps[-1]) + 1), columns))
+            before, after = before - dumps[0], after - dumps[0]
+            fraction = fraction[:, None]
+            in_time = rows[before] * (1 - fraction) + rows[after] * fraction
+            values[start:stop] = in_time[:, left] * (1 - weight) + in_time[:, right] * weight
+        return values
+
+    return run._load(f'Lagrangian {var} {digest}', interpolate)
+
+
+def diff_runs(run_a, run_b, var, grid='common'):
+    """Resample two runs onto the same grid and measure their difference inside each layer
+
+    Norms are taken over every time and Lagrangian position of the grid inside a layer, using the layers of run_a.
+    L2 is the root mean square of the difference, so it does not grow with the size of the grid, and Linf is the
+    largest absolute difference.
+
+    Args:
+        run_a (string or HyadesRun): Reference run
+        run_b (string or HyadesRun): Run compared to the reference
+        var (string): Abbreviated name of a 2D variable on the Mesh or Zone grid, such as Pres, Rho, or U
+        grid (string or tuple, optional): 'common' for the grid covered by both runs at the coarsest spacing of either,
+                                          see common_grid, 'a' for the dump times and positions of run_a, or a tuple
+                                          of (time_grid, x_grid)
+
+    Returns:
+        difference (dict): With the keys
+            time (numpy array): Times of the grid in nanoseconds
+            x (numpy array): Lagrangian positions of the grid in microns
+            a (numpy array), b (numpy array): Each run resampled onto the grid, with one row per time
+            difference (numpy array): b - a
+            layers (list): Name of each layer of run_a
+            x_to_layer (numpy array): Index of the layer containing each position of the grid, -1 if none does
+            L2 (numpy array), Linf (numpy array): Norms of the difference in each layer, NaN for empty layers
+            long_name (string), units (string): Full name and SI units of var
+
+    """
+    var = var.capitalize()
+    run_a, run_b = as_run(run_a), as_run(run_b)
+    time_grid, x_grid = grid_of([run_a, run_b], var, grid)
+    a = resample(run_a, var, time_grid, x_grid)
+    b = resample(run_b, var, time_grid, x_grid)
+    return difference_of(run_a, var, time_grid, x_grid, a, b)
+
+
+def compare_runs(reference, runs, var, grid='common', max_workers=None):
+    """Compare one reference run against many runs, all on the same grid
+
+    The reference is resampled once, and the other runs are resampled in parallel threads.
+
+    Args:
+        reference (string or HyadesRun): Reference run
+        runs (list): Runs compared to the reference
+        var (string): Abbreviated name of a 2D variable on the Mesh or Zone grid, such as Pres, Rho, or U
+        grid (string or tuple, optional): 'common' for the grid covered by every run, 'a' for the dump times and
+                                          positions of the reference, or a tuple of (time_grid, x_grid)
+        max_workers (int, optional): Maximum number of runs resampled at once. Defaults to the ThreadPoolExecutor
+                                     default.
+
+    Returns:
+        differences (list): The dictionary returned by diff_runs for each run, in the same order as runs
+
+    """
+    var = var.capitalize()
+    reference = as_run(reference)
+    runs = [as_run(run) for run in runs]
+    time_grid, x_grid = grid_of([reference] + runs, var, grid)
+    a = resample(reference, var, time_grid, x_grid)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        resampled = list(executor.map(lambda run: resample(run, var, time_grid, x_grid), runs))
+    return [difference_of(reference, var, time_grid, x_grid, a, b) for b in resampled]
+
+
+def as_run(run):
+    if isinstance(run, HyadesOutput):
+        return run.run
+    if isinstance(run, HyadesRun):
+        return run
+    return HyadesRun(run)
+
+
+def grid_of(runs, var, grid):
+    """Times and Lagrangian positions of the grid option used by diff_runs and compare_runs"""
+    if isinstance(grid, str):
+        if grid == 'common':
+            return common_grid(runs, var)
+        elif grid == 'a':
+            return runs[0].time, lagrangian_x(runs[0], var)
+        raise ValueError(f"Unknown grid {grid!r}. Options are 'common', 'a', or a tuple of (time_grid, x_grid)")
+    time_grid, x_grid = grid
+    return np.asarray(time_grid, dtype=float), np.asarray(x_grid, dtype=float)
+
+
+def difference_of(reference, var, time_grid, x_grid, a, b):
+    """Difference b - a on the grid and its norms inside each layer of the reference"""
+    layer_table = reference.layer_table
+    # Every position from the start of a layer up to the start of the next belongs to that layer
+    x_to_layer = np.searchsorted(layer_table['x_start'], x_grid, side='right') - 1
+    x_to_layer[(x_grid < layer_table['x_start'][0]) | (x_grid > layer_table['x_stop'][-1])] = -1
+    difference = b - a
+    l2 = np.full(len(layer_table), np.nan)
+    linf = np.full(len(layer_table), np.nan)
+    for i in range(len(layer_table)):
+        layer_difference = difference[:, x_to_layer == i]
+        if layer_difference.size > 0:
+            l2[i] = np.sqrt(np.mean(layer_difference ** 2))
+            linf[i] = np.abs(layer_difference).max()
+    long_name, units, unit_conversion = reference.variable_info(var)
+    return {'time': time_grid, 'x': x_grid, 'a': a, 'b': b, 'difference': difference,
+            'layers': [str(name) for name in layer_table['name']], 'x_to_layer': x_to_layer, 'L2': l2, 'Linf': linf,
+            'long_name': long_name, 'units': units}
@@ -0,0 +1,130 @@
+"""Summarize what a Hyades run contains from the header of its .cdf, without loading any variable
+
+Deciding what to plot used to mean opening a run in view_hyades_GUI.py or loading a HyadesOutput and waiting for full
+arrays to be read. describe only parses the header of the .cdf, which scipy memory-maps, and the small DumpTimes
+array, so it takes milliseconds even for multi-GB files.
+
+Example:
+    List the variables of a run and their sizes::
+
+        from tools.describe import describe, format_description
+        description = describe('./data/diamond_decay')
+        print(description['num_dumps'], description['time_range'])
+        print(format_description(description))
+
+"""
+import os
+import numpy as np
+from tools.hyades_reader import HyadesRun, HyadesOutput, InvalidVariable, derived_variables, get_unit_conversion
+
+
+def describe(run, derived=True):
+    """Dump count, time range, grid sizes, and every variable of a run, read from the header of its .cdf
+
+    Args:
+        run (string, HyadesRun, or HyadesOutput): Name of the run, or an existing run or output of it
+        derived (bool, optional): Toggle to also list the derived variables, such as Rho0, whose inputs are in the run
+
+    Returns:
+        description (dict): With the keys
+            run_name (string), data_name (string): Name of the run and path to its .cdf or pyhy store index
+            file_size (int): Size of the .cdf or pyhy store index in bytes
+            num_dumps (int), num_meshes (int), num_zones (int): Number of dumps, Mesh points, and Zones
+            time_range (tuple): First and last dump times in nanoseconds
+            layers (list): Name of each layer in the .inf, empty if there is no .inf
+            variables (list): One dictionary per variable, sorted by name, with the keys name, long_name, dimensions,
+                              shape, dtype, nbytes, cgs_units, units, unit_conversion, and derived. units and
+                              unit_conversion are the SI units and the factor converting to them, both None if the
+                              variable has no known conversion.
+
+    """
+    if isinstance(run, HyadesOutput):
+        run = run.run
+    elif not isinstance(run, HyadesRun):
+        run = HyadesRun(run, mmap=True)
+    header = run.header
+    sizes = {}
+    for info in header.values():
+        sizes.update(zip(info['dimensions'], info['shape']))
+
+    variables = []
+    for name, info in header.items():
+        try:
+            long_name, units, unit_conversion = get_unit_conversion(name, info['long_name'], info['units'])
+        except InvalidVariable:
+            long_name, units, unit_conversion = info['long_name'], None, None
+        dtype = np.dtype(info['dtype']) if 'dtype' in info else None
+        variables.append({'name': name,
+                          'long_name': long_name,
+                          'dimensions': info['dimensions'],
+                          'shape': info['shape'],
+                          'dtype': dtype.str if dtype is not None else None,
+                          'nbytes': int(np.prod(info['shape'])) * dtype.itemsize if dtype is not None else None,
+                          'cgs_units': info['units'],
+                          'units': units,
+                          'unit_conversion': unit_conversion,
+                          'derived': False})
+    if derived:
+        for name, variable in derived_variables.items():
+            if (name in header) or (name not in run):
+                continue
+            shape = tuple(sizes.get(dimension) for dimension in variable.dimensions)
+            variables.append({'name': name,
+                              'long_name': variable.long_name,
+                              'dimensions': variable.dimensions,
+                              'shape': shape,
+                              'dtype': np.dtype(float).str,
+                              'nbytes': int(np.prod(shape)) * np.dtype(float).itemsize if None not in shape else None,
+                              'cgs_units': None,
+                              'units': variable.units,
+                              'unit_conversion': 1,
+                              'derived': True})
+    variables.sort(key=lambda variable: variable['name'].lower())
+
+    num_dumps = sizes.get('NumDumps', 0)
+    time = run.time if ('DumpTimes' in header) and (num_dumps > 0) else None
+    layers = [str(name) for name in run.layer_table['name']] if os.path.isfile(run.inf_name) else []
+    return {'run_name': run.run_name,
+            'data_name': run.data_name,
+            'file_size': os.path.getsize(run.data_name),
+            'num_dumps': num_dumps,
+            'num_meshes': sizes.get('NumMeshs'),
+            'num_zones': sizes.get('NumZones'),
+            'time_range': (float(time[0]), float(time[-1])) if time is not None else None,
+            'layers': layers,
+            'variables': variables}
+
+
+def format_description(description):
+    """Text table of a description from describe, as printed by describe.py"""
+    time_range = description['time_range']
+    lines = [f"{description['run_name']}  ({description['data_name']}, {format_bytes(description['file_size'])})",
+             f"{description['num_dumps']} dumps"
+             + (f" from {time_range[0]:.4g} to {time_range[1]:.4g} ns" if time_range is not None else '')
+             + f", {description['num_meshes']} Mesh points, {description['num_zones']} Zones",
+             f"Layers: {', '.join(description['layers']) or 'no .inf'}",
+             '']
+    table = [('Name', 'Long Name', 'Dimensions', 'Shape', 'Dtype', 'Size', 'Units', 'Conversion')]
+    for variable in description['variables']:
+        if variable['units'] is None:
+            units, conversion = f"{variable['cgs_units']} (cgs)" if variable['cgs_units'] else '-', '-'
+        elif variable['derived']:
+            units, conversion = variable['units'], 'derived'
+        else:
+            units, conversion = variable['units'], f"{variable['cgs_units']} x {variable['unit_conversion']:g}"
+        table.append((variable['name'], variable['long_name'] or '', ' x '.join(variable['dimensions']),
+                      ' x '.join(str(size) for size in variable['shape']), variable['dtype'] or '-',
+                      format_bytes(variable['nbytes']) if variable['nbytes'] is not None else '-',
+                      units, conversion))
+    widths = [max(len(row[i]) for row in table) for i in range(len(table[0]))]
+    lines += ['  '.join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip() for row in table]
+    return '\n'.join(lines)
+
+
+def format_bytes(num_bytes):
+    """Size in bytes as a short string, such as 1.5 MB"""
+    for unit in ('B', 'kB', 'MB', 'GB'):
+        if num_bytes < 1000:
+            return f'{num_bytes:.3g} {unit}'
+        num_bytes /= 1000
+    return f'{num_bytes:.3g} TB'
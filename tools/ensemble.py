@@ -0,0 +1,274 @@
+"""Stack the runs of a parameter sweep into one memory-mapped (run, time, x) array per variable
+
+Runs of a sweep usually share a mesh and dump times, so the same variable of every run fits into a single 3D array.
+An ensemble is a directory holding one .npy per variable with the runs along the first axis, plus a table describing
+each run::
+
+    data/sweep.ensemble/
+        index.json      variables, shapes, units, and whether the runs were resampled in time
+        runs.csv        one row per run, in the same order as the first axis of every array
+        time.npy        times of the ensemble in nanoseconds
+        Pres.npy        Pres of every run with shape (runs, time, x)
+        Pres_x.npy      Lagrangian coordinates of Pres in microns
+
+The arrays are opened with np.load(mmap_mode='r'), so statistics over the whole sweep are a single NumPy reduction
+that only pages in what it touches, instead of opening hundreds of .cdf files.
+
+Example:
+    Build an ensemble of every run in a sweep and compute the mean and spread of the pressure::
+
+        from tools.ensemble import Ensemble
+        paths = [os.path.join('./data/sweep', d) for d in sorted(os.listdir('./data/sweep'))]
+        ensemble = Ensemble.build(paths, ['Pres', 'U'], './data/sweep.ensemble')
+        pressure = ensemble['Pres']  # shape (len(ensemble), len(ensemble.time), len(ensemble.x['Pres']))
+        mean, spread = pressure.mean(axis=0), pressure.std(axis=0)
+        print(ensemble.runs[['Run', 'Stop Time']])
+
+    Runs with different dump times can still be stacked by resampling them onto a shared time grid::
+
+        ensemble = Ensemble.build(paths, 'Pres', './data/sweep.ensemble', time='common')
+
+"""
+import os
+import json
+import shutil
+import numpy as np
+import pandas as pd
+from tools.hyades_reader import load_runs, TimeIndex
+
+FORMAT_VERSION = 1
+
+
+class Ensemble:
+    """Read-only access to an ensemble directory written by Ensemble.build
+
+    Attributes:
+        dir_name (string): Path to the ensemble directory
+        variables (list): Abbreviated names of the stacked variables
+        time (numpy array): Times shared by every run in nanoseconds
+        x (dict): Lagrangian coordinates in microns of each variable
+        long_name (dict): Full name of each variable according to Hyades
+        units (dict): SI units of each variable
+        resampled (bool): Whether the runs were interpolated onto time instead of sharing their dump times
+        runs (pandas DataFrame): One row of run information per run, in the order of the first axis of every array
+
+    """
+    def __init__(self, dir_name):
+        """Open an existing ensemble. The arrays are not read until they are indexed.
+
+        Args:
+            dir_name (string): Path to the ensemble directory
+
+        """
+        self.dir_name = dir_name
+        with open(os.path.join(dir_name, 'index.json')) as f:
+            self._index = json.load(f)
+        self.variables = list(self._index['variables'])
+        self.time = np.load(os.path.join(dir_name, 'time.npy'))
+        self.x = {var: np.load(os.path.join(dir_name, info['x'])) for var, info in self._index['variables'].items()}
+        self.long_name = {var: info['long_name'] for var, info in self._index['variables'].items()}
+        self.units = {var: info['units'] for var, info in self._index['variables'].items()}
+        self.resampled = self._index['resampled']
+        self.runs = pd.read_csv(os.path.join(dir_name, 'runs.csv'))
+        self._arrays = {}
+
+    def __len__(self):
+        return len(self.runs)
+
+    def __contains__(self, var):
+        return var.capitalize() in self._index['variables']
+
+    def __getitem__(self, var):
+        """Read-only memory-mapped array of var with shape (runs, time, x)"""
+        var = var.capitalize()
+        if var not in self:
+            raise KeyError(f'{var!r} is not in the ensemble. Options are {self.variables}')
+        if var not in self._arrays:
+            self._arrays[var] = np.load(os.path.join(self.dir_name, self._index['variables'][var]['file']),
+                                        mmap_mode='r')
+        return self._arrays[var]
+
+    def __repr__(self):
+        return f'Ensemble({self.dir_name!r}, {len(self)} runs, {len(self.time)} times, {self.variables})'
+
+    @classmethod
+    def build(cls, paths, variables, dir_name, time=None, max_workers=None):
+        """Stack variables of many runs into a new ensemble directory
+
+        Every run must have the same Lagrangian mesh for each variable. By default they must also share their dump
+        times. With time='common' the runs are linearly interpolated onto evenly spaced times covering the interval
+        every run reached, using the coarsest dump spacing among the runs. time may also be an array of times.
+
+        Runs are loaded in parallel with load_runs and written into the arrays one at a time, so building an ensemble
+        needs memory for one run rather than the whole sweep. The ensemble is written to a temporary directory and
+        only moved into place once it is complete. An existing ensemble at dir_name is renamed aside, replaced by the
+        new one, and then deleted. Anything at dir_name other than an ensemble is never replaced.
+
+        Args:
+            paths (list): Names of the runs, anything accepted by HyadesOutput
+            variables (string or list): Abbreviated names of the 2D variables to stack, such as Pres, U, or Rho
+            dir_name (string): Path to the new ensemble directory, such as ./data/sweep.ensemble
+            time (string or array, optional): None to require identical dump times, 'common' to resample onto a
+                                              shared time grid, or the times to resample onto in nanoseconds
+            max_workers (int, optional): Maximum number of runs loaded at once, see load_runs
+
+        Returns:
+            ensemble (Ensemble)
+
+        Raises:
+            FileExistsError: If dir_name exists and is not an ensemble
+
+        """
+        if isinstance(variables, str):
+            variables = [variables]
+        variables = [var.capitalize() for var in variables]  # keys match HyadesOutput.var
+        if len(paths) == 0:
+            raise ValueError('Cannot build an ensemble without any runs')
+        if os.path.exists(dir_name):
+            check_replaceable(dir_name)  # checked before loading any runs so a wrong dir_name fails quickly
+        outputs, errors = load_runs(paths, variables, max_workers=max_workers, mmap=True)
+        temporary_name = f'{dir_name.rstrip(os.sep)}.{os.getpid()}.tmp'
+        try:
+            if errors:
+                failures = '\n'.join(f'    {path}{" " + var if var else ""}: {error}' for path, var, error in errors)
+                raise Exception(f'Could not load {len(errors)} run(s) and variable(s) for the ensemble:\n{failures}')
+
+            for var in variables:
+                reference = outputs[0][var]
+                if np.ndim(reference.output) != 2:
+                    raise ValueError(f'Only 2D variables can be stacked. '
+                                     f'{var} has dimensions {reference.data_dimensions}')
+                for path, run_outputs in zip(paths[1:], outputs[1:]):
+                    x = run_outputs[var].lagrangian_x
+                    if (x.shape != reference.lagrangian_x.shape) or not np.allclose(x, reference.lagrangian_x):
+                        raise EnsembleMismatch(f'{path} does not have the same mesh for {var} as {paths[0]}')
+
+            times = [run_outputs[variables[0]].time for run_outputs in outputs]
+            if time is None:
+                for path, run_time in zip(paths[1:], times[1:]):
+                    if (run_time.shape != times[0].shape) or not np.allclose(run_time, times[0]):
+                        raise EnsembleMismatch(f'{path} does not have the same dump times as {paths[0]}. '
+                                               f"Use time='common' to resample the runs onto a shared time grid.")
+                ensemble_time = times[0]
+            else:
+                start = max(run_time[0] for run_time in times)
+                stop = min(run_time[-1] for run_time in times)
+                if stop < start:
+                    raise EnsembleMismatch(f'The runs do not overlap in time. The latest start is {start:.4f} ns '
+                                           f'and the earliest stop is {stop:.4f} ns')
+                if isinstance(time, str):
+                    if time != 'common':
+                        raise ValueError(f"Unknown time {time!r}. Options are None, 'common', or an array of times")
+                    spacing = max(np.diff(run_time).max() if len(run_time) > 1 else 0 for run_time in times)
+                    num_times = int(np.round((stop - start) / spacing)) + 1 if spacing > 0 else 1
+                    ensemble_time = np.linspace(start, stop, num_times)
+                else:
+                    ensemble_time = np.asarray(time, dtype=float)
+                    if (ensemble_time.min() < start) or (ensemble_time.max() > stop):
+                        raise ValueError(f'time must lie between {start:.4f} and {stop:.4f} ns, '
+                                         f'which every run reached')
+            resampled = time is not None
+
+            shutil.rmtree(temporary_name, ignore_errors=True)
+            os.makedirs(temporary_name)
+            index = {'format': 'pyhy ensemble', 'version': FORMAT_VERSION, 'resampled': resampled, 'variables': {}}
+            np.save(os.path.join(temporary_name, 'time.npy'), ensemble_time)
+            for var in variables:
+                reference = outputs[0][var]
+                shape = (len(paths), len(ensemble_time), len(reference.lagrangian_x))
+                file_name = var.replace(' ', '_') + '.npy'
+                x_name = var.replace(' ', '_') + '_x.npy'
+                array = np.lib.format.open_memmap(os.path.join(temporary_name, file_name), mode='w+',
+                                                  dtype=reference.output.dtype, shape=shape)
+                for i, run_outputs in enumerate(outputs):
+                    hyades = run_outputs[var]
+                    if resampled:
+                        array[i] = TimeIndex(hyades.time).interp(ensemble_time, hyades.output)
+                    else:
+                        array[i] = hyades.output[:]
+                array.flush()
+                del array
+                np.save(os.path.join(temporary_name, x_name), reference.lagrangian_x)
+                index['variables'][var] = {'file': file_name, 'x': x_name, 'shape': list(shape),
+                                           'dimensions': ['Runs'] + list(reference.data_dimensions),
+                                           'long_name': reference.long_name, 'units': reference.units}
+            run_table(outputs, variables[0], times).to_csv(os.path.join(temporary_name, 'runs.csv'), index=False)
+            with open(os.path.join(temporary_name, 'index.json'), 'w') as f:
+                json.dump(index, f, indent=1)
+
+            if not os.path.exists(dir_name):
+                os.replace(temporary_name, dir_name)
+                return cls(dir_name)
+            # Swap in the new ensemble by renaming the old one aside first, and put the old one back if the swap fails
+            check_replaceable(dir_name)
+            old_name = f'{dir_name.rstrip(os.sep)}.{os.getpid()}.old'
+            shutil.rmtree(old_name, ignore_errors=True)
+            os.replace(dir_name, old_name)
+            try:
+                os.replace(temporary_name, dir_name)
+            except OSError:
+                os.replace(old_name, dir_name)
+                raise
+            shutil.rmtree(old_name, ignore_errors=True)
+            return cls(dir_name)
+        finally:
+            # Close the memory-mapped runs and drop their outputs so every .cdf is unmapped, and remove a partly
+            # written ensemble if a run did not match or a write failed. After a successful build it is already gone.
+            for run_outputs in outputs:
+                for hyades in run_outputs.values():
+                    hyades.run.close()
+            outputs.clear()
+            shutil.rmtree(temporary_name, ignore_errors=True)
+
+
+def check_replaceable(dir_name):
+    """Raise FileExistsError unless dir_name is an ensemble directory that Ensemble.build may replace"""
+    index_name = os.path.join(dir_name, 'index.json')
+    try:
+        with open(index_name) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        index = None
+    if not (isinstance(index, dict) and index.get('format') == 'pyhy ensemble'):
+        raise FileExistsError(f'{dir_name} already exists and is not an ensemble, so it will not be replaced. '
+                              f'Choose a new dir_name or remove it first.')
+
+
+def run_table(outputs, var, times):
+    """One row of information per run describing what distinguishes the runs of a sweep
+
+    Args:
+        outputs (list): Dictionary of {var: HyadesOutput} of each run, as returned by load_runs
+        var (string): Any variable loaded from every run
+        times (list): Dump times of each run in nanoseconds
+
+    Returns:
+        runs (pandas DataFrame)
+
+    """
+    rows = []
+    for run_outputs, run_time in zip(outputs, times):
+        hyades = run_outputs[var]
+        run = hyades.run
+        row = {'Run': run.run_name,
+               'Path': os.path.abspath(run.dir_name),
+               'Dumps': len(run_time),
+               'Start Time': run_time[0],
+               'Stop Time': run_time[-1],
+               'MOI': hyades.layers[hyades.moi]['Name'] if hyades.moi else '',
+               'Shock MOI': hyades.layers[hyades.shock_moi]['Name'] if hyades.shock_moi else '',
+               'Materials': ' '.join(layer['Name'] for layer in hyades.layers.values())}
+        for layer_id, layer in hyades.layers.items():
+            row[f'{layer_id} Thickness'] = layer['X Stop'] - layer['X Start']
+        for key in hyades.tv:
+            if key.endswith('-v') and hyades.tv[key]:
+                row[f'{key[:-2]} Max'] = max(hyades.tv[key])
+        for name, value in run.inf.parm.items():
+            row[f'parm {name}'] = value
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+class EnsembleMismatch(Exception):
+    """Raised when runs cannot be stacked because their meshes or dump times differ"""
+    pass
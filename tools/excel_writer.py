@@ -34,9 +34,9 @@ def format_for_excel(hyades, label, coordinate_system='Lagrangian'):
 
     """
     if coordinate_system.lower() == 'lagrangian':
-        top = hyades.x[0, :].reshape((1, len(hyades.x[0, :])))
+        top = hyades.lagrangian_x.reshape((1, len(hyades.lagrangian_x)))
     elif coordinate_system.lower() == 'eulerian':
-        top = np.array([range(len(hyades.x[0, :]))])
+        top = np.array([range(len(hyades.lagrangian_x))])
     else:
         raise Exception(f'Unrecognized coordinate system {coordinate_system}. Options are Lagrangian or Eulerian.')
     right_matrix = np.concatenate((top, hyades.output), axis=0)
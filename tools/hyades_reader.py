@@ -1,9 +1,1199 @@
 import os
-import re
+import sys
+import json
+import threading
+import collections
+import concurrent.futures
+import copy
 import numpy as np
 import matplotlib.pyplot as plt
 from scipy.io import netcdf
-from scipy.interpolate import CubicSpline
+from tools.pyhy_store import PyhyStore
+from tools.inf_file import InfFile
+
+
+def get_unit_conversion(var, long_name, units):
+    """Get the conversion from the Hyades default cgs units to SI units for a variable
+
+    All conversions change the Hyades default cgs units to SI units.
+    Most conversions taken from https://en.wikipedia.org/wiki/Centimetre%E2%80%93gram%E2%80%93second_system_of_units
+    unit_conversions that are commented out have not been confirmed
+
+    Args:
+        var (string): Abbreviated name of variable of interest
+        long_name (string): Full name of var according to Hyades
+        units (string): cgs units of var according to Hyades
+
+    Returns:
+        long_name (string), units (string), unit_conversion (float)
+
+    """
+    if 'Acc' == var:
+        long_name = 'Mesh Acceleration'
+        units = 'km/s^2'
+        unit_conversion = 1e-5
+    elif 'Akappa' == var:
+        unit_conversion = 1  # 0.1
+    elif 'Conde' == var:
+        unit_conversion = 1  # 8.62e-13
+    elif 'Condi' == var:
+        unit_conversion = 1  # 8.62e-13
+    elif 'Eelc' == var:
+        units = 'Joules'
+        unit_conversion = 1e-7
+    elif 'Eion' == var:
+        units = 'Joules'
+        unit_conversion = 1e-7
+    elif 'Ekappa' == var:
+        unit_conversion = 1  # 0.1
+    elif 'Pres' == var:
+        long_name = 'Pressure'
+        units = 'GPa'
+        unit_conversion = 1e-10
+    elif 'Qrad' == var:
+        units = 'Watts/m^2'
+        unit_conversion = 1e-3
+    elif 'Qradgl' == var:
+        unit_conversion = 1  # 8.62e-11
+    elif 'Qradgr' == var:
+        unit_conversion = 1  # 8.62e-11
+    elif 'R' == var:
+        long_name = 'Eulerian Position'
+        units = 'µm'
+        unit_conversion = 1e4
+    elif 'RCM' == var:
+        long_name = 'Eulerian Zone Position'
+        units = 'µm'
+        unit_conversion = 1e4
+    elif 'Rho' == var:
+        long_name = 'Density'
+        units = 'g/cc'
+        unit_conversion = 1
+    elif 'Sd1' == var:
+        units = 'GPa'
+        unit_conversion = 1e-10
+    elif var in ('Seelc', 'Seion', 'Serad'):
+        units = 'Joules'
+        unit_conversion = 1e-7
+    elif var in ('Te', 'Ti', 'Tr'):
+        units = '° K'
+        unit_conversion = 11604 * 1000
+    elif 'U' == var:
+        long_name = 'Particle Velocity'
+        units = 'km/s'
+        unit_conversion = 1e-5
+    elif 'Ucm' == var:
+        long_name = 'Zone Particle Velocity'
+        units = 'km/s'
+        unit_conversion = 1e-5
+    elif 'Ubin' == var:
+        units = 'Joules/(K * m^3)'
+        unit_conversion = 8.62e-9
+    else:
+        raise InvalidVariable(f'HyadesOutput does not recognize variable: {var}')
+
+    return long_name, units, unit_conversion
+
+
+class DerivedVariable:
+    """A quantity computed from the variables Hyades saved to the .cdf, such as compression or peak pressure
+
+    Derived variables are requested from a HyadesRun or HyadesOutput by name like any variable in the .cdf, for example
+    HyadesOutput(filename, 'Rho0'). They are computed once, vectorized over the whole simulation, in SI units, and
+    cached alongside the raw variables, so requesting one again does not recompute it or reload its inputs.
+    Use register_derived_variable to add new ones.
+
+    Attributes:
+        name (string): Abbreviated name of the variable. Must be unchanged by str.capitalize, like Hyades names.
+        inputs (tuple): Names of the raw or derived variables needed to compute this one
+        dimensions (tuple): Names of the netcdf dimensions of the result, such as ('NumDumps', 'NumZones')
+        long_name (string): Full name of the variable
+        units (string): SI units of the variable
+        function (function): Computes the variable from a HyadesRun, using run[input] for each input
+
+    """
+    def __init__(self, name, inputs, dimensions, long_name, units, function):
+        if name != name.capitalize():
+            raise ValueError(f'Derived variable names must be unchanged by capitalize(), {name!r} is not')
+        self.name = name
+        self.inputs = tuple(inputs)
+        self.dimensions = tuple(dimensions)
+        self.long_name = long_name
+        self.units = units
+        self.function = function
+
+    def __repr__(self):
+        return f'DerivedVariable({self.name!r}, inputs={self.inputs}, long_name={self.long_name!r})'
+
+
+derived_variables = {}
+
+
+def register_derived_variable(name, inputs, dimensions=('NumDumps', 'NumZones'), long_name=None, units=''):
+    """Decorator that adds a function computing a variable from a HyadesRun to derived_variables
+
+    Example:
+        Register the zone width so it can be plotted with HyadesOutput(filename, 'Width')::
+
+            @register_derived_variable('Width', inputs=('R',), long_name='Zone Width', units='µm')
+            def zone_width(run):
+                return np.diff(run['R'], axis=1)
+
+    Args:
+        name (string): Abbreviated name of the variable
+        inputs (tuple): Names of the raw or derived variables needed to compute this one
+        dimensions (tuple, optional): Names of the netcdf dimensions of the result. Defaults to Zone variables.
+        long_name (string, optional): Full name of the variable. Defaults to name.
+        units (string, optional): SI units of the variable
+
+    """
+    def register(function):
+        derived_variables[name] = DerivedVariable(name, inputs, dimensions, long_name or name, units, function)
+        return function
+    return register
+
+
+@register_derived_variable('Rho0', inputs=('Rho',), long_name='Compressive Factor', units=r'$\rho / \rho_0$')
+def compression(run):
+    """Density divided by the ambient density of each zone"""
+    density = np.asarray(run['Rho'])
+    return density / density[0, :]
+
+
+@register_derived_variable('Uzone', inputs=('U',), long_name='Zone Particle Velocity', units='km/s')
+def zone_particle_velocity(run):
+    """Particle Velocity moved from the Mesh to the Zones by averaging the Mesh points on either side of each Zone
+
+    Zone coordinates are the average of the neighboring Mesh coordinates, so this is the linear interpolation of the
+    Particle Velocity at each Zone.
+    """
+    velocity = np.asarray(run['U'])
+    return (velocity[:, 1:] + velocity[:, :-1]) / 2
+
+
+@register_derived_variable('Mass', inputs=('Rho', 'R'), long_name='Zone Areal Mass', units='g/cm^2')
+def zone_mass(run):
+    """Mass per unit area of each Zone, density times Zone width, assuming planar geometry
+
+    Hyades is Lagrangian, so the mass of every Zone should stay constant over the simulation.
+    """
+    width = np.diff(np.asarray(run['R']), axis=1) * 1e-4  # convert microns to centimeters
+    return np.asarray(run['Rho']) * width
+
+
+@register_derived_variable('Cs', inputs=('Pres', 'Rho'), long_name='Lagrangian Sound Speed', units='km/s')
+def lagrangian_sound_speed(run):
+    """Estimate of the Lagrangian sound speed, (rho / rho_0) * sqrt(dP / drho), along the history of each Zone
+
+    dP / drho is the ratio of the time derivatives of Pressure and Density in each Zone, which assumes each Zone
+    follows an isentrope. Zones that are not being compressed (drho <= 0) are NaN. With Pressure in GPa and
+    Density in g/cc, sqrt(dP / drho) is in km/s.
+    """
+    pressure = np.asarray(run['Pres'])
+    density = np.asarray(run['Rho'])
+    if len(density) < 2:
+        return np.full(density.shape, np.nan)
+    dP = np.gradient(pressure, axis=0)
+    drho = np.gradient(density, axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        bulk_sound_speed = np.where(drho > 0, np.sqrt(np.abs(dP / drho)), np.nan)
+    return density / density[0, :] * bulk_sound_speed
+
+
+@register_derived_variable('Pmax', inputs=('Pres',), long_name='Peak Pressure', units='GPa')
+def peak_pressure(run):
+    """Highest Pressure each Zone has experienced up to each time. The last row is the peak over the simulation."""
+    return np.maximum.accumulate(np.asarray(run['Pres']), axis=0)
+
+
+class MappedArray:
+    """Read-only view of a memory-mapped .cdf variable that converts units only on the slices that are accessed
+
+    Indexing a MappedArray reads just the pages of the .cdf under the requested slice and returns them in SI units.
+    Variables without a unit conversion are returned as read-only views directly on the file with no copy at all.
+    NumPy functions, such as np.mean(output), and arithmetic with NumPy arrays convert the entire array.
+
+    Attributes:
+        data (numpy array): Memory-mapped view of the variable in Hyades cgs units
+        scale (float): Unit conversion applied to every slice
+        zone_centered (bool): If True, the columns are the average of neighboring columns in data,
+                              which converts Mesh coordinates to Zone coordinates
+
+    """
+    def __init__(self, data, scale=1, zone_centered=False):
+        self.data = data
+        self.scale = scale
+        self.zone_centered = zone_centered
+
+    @property
+    def shape(self):
+        if self.zone_centered:
+            return self.data.shape[:-1] + (self.data.shape[-1] - 1,)
+        return self.data.shape
+
+    @property
+    def ndim(self):
+        return self.data.ndim
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape))
+
+    @property
+    def dtype(self):
+        if (self.scale == 1) and (not self.zone_centered):
+            return self.data.dtype
+        return np.dtype(float)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        if not self.zone_centered:
+            if self.scale == 1:
+                return self.data[key]
+            return np.multiply(self.data[key], self.scale)
+        # Zone coordinates need both neighboring Mesh columns, so split the key into its row and column parts
+        if not isinstance(key, tuple):
+            key = (key,)
+        if (len(key) > self.ndim) or any(k is Ellipsis or k is None for k in key):
+            raise IndexError(f'MappedArray only supports basic indexing, not {key!r}')
+        row_key = key[:-1] if len(key) == self.ndim else key
+        column_key = key[-1] if len(key) == self.ndim else slice(None)
+        rows = self.data[row_key]
+        if isinstance(column_key, (int, np.integer)):
+            i = range(self.shape[-1])[column_key]  # Raises an IndexError for out of bounds columns
+            return (rows[..., i] + rows[..., i + 1]) * (self.scale / 2)
+        zones = (rows[..., 1:] + rows[..., :-1]) * (self.scale / 2)
+        return zones[..., column_key]
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self[(slice(None),) * self.ndim], dtype=dtype)
+
+    def min(self, *args, **kwargs):
+        return np.asarray(self).min(*args, **kwargs)
+
+    def max(self, *args, **kwargs):
+        return np.asarray(self).max(*args, **kwargs)
+
+    def mean(self, *args, **kwargs):
+        return np.asarray(self).mean(*args, **kwargs)
+
+
+class TimeIndex:
+    """Vectorized lookups of requested times in the sorted dump times of a Hyades simulation
+
+    np.argmin(abs(time - t)) scans every dump for each requested time. TimeIndex uses a binary search instead, so
+    mapping M requested times onto N dumps takes O(M log N) and needs no Python loop over the requested times.
+
+    Example:
+        Find the dumps closest to several times and interpolate the pressure between dumps::
+
+            hyades = HyadesOutput('./data/diamond_decay', 'Pres')
+            closest_times, indices = hyades.time_index.nearest([1, 2.5, 4])
+            lineouts = hyades.time_index.interp([1, 2.5, 4], hyades.output)  # one row per requested time
+
+    Attributes:
+        time (numpy array): Sorted times of the simulation in nanoseconds
+
+    """
+    def __init__(self, time):
+        self.time = np.asarray(time)
+
+    def __len__(self):
+        return len(self.time)
+
+    def nearest(self, times):
+        """Get the closest dump time and its index for each requested time
+
+        Ties between two dumps go to the earlier dump, the same as np.argmin(abs(time - t)).
+
+        Args:
+            times (float or array): Requested time(s) in nanoseconds
+
+        Returns:
+            closest_times (float or numpy array), indices (int or numpy array)
+
+        """
+        requested = np.asarray(times, dtype=float)
+        right = np.clip(np.searchsorted(self.time, requested, side='left'), 0, len(self.time) - 1)
+        left = np.clip(right - 1, 0, len(self.time) - 1)
+        # The first of any repeated dump times, which is the one argmin would pick
+        left = np.searchsorted(self.time, self.time[left], side='left')
+        use_left = abs(requested - self.time[left]) <= abs(self.time[right] - requested)
+        indices = np.where(use_left, left, right)
+        if requested.ndim == 0:
+            return self.time[indices], int(indices)
+        return self.time[indices], indices
+
+    def weights(self, times):
+        """Indices of the dumps on either side of each requested time and the linear weight of the later dump
+
+        Times outside the simulation are held at the first or last dump.
+
+        Args:
+            times (float or array): Requested time(s) in nanoseconds
+
+        Returns:
+            before (numpy array), after (numpy array), fraction (numpy array)
+
+        """
+        requested = np.clip(np.asarray(times, dtype=float), self.time[0], self.time[-1])
+        after = np.clip(np.searchsorted(self.time, requested, side='right'), 1, len(self.time) - 1)
+        before = after - 1
+        span = self.time[after] - self.time[before]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            fraction = np.where(span > 0, (requested - self.time[before]) / span, 0.0)
+        return before, after, fraction
+
+    def interp(self, times, values):
+        """Linearly interpolate rows of values, such as HyadesOutput.output, at arbitrary times in one call
+
+        Args:
+            times (float or array): Requested time(s) in nanoseconds
+            values (numpy array): Array with one row per dump, for example a HyadesOutput.output or x
+
+        Returns:
+            rows (numpy array): One interpolated row of values per requested time
+
+        """
+        if len(self.time) == 1:
+            rows = np.asarray(values)[np.zeros(np.shape(times), dtype=int)]
+            return rows
+        before, after, fraction = self.weights(times)
+        fraction = fraction.reshape(fraction.shape + (1,) * (np.ndim(values) - 1))
+        return np.asarray(values[before]) * (1 - fraction) + np.asarray(values[after]) * fraction
+
+
+class LayerTable:
+    """Layers of a Hyades simulation as a NumPy structured array, with a map from every Mesh and Zone to its layer
+
+    The layers dictionary is convenient to read but has to be walked layer by layer. LayerTable holds the same
+    information as columns, and mesh_to_layer and zone_to_layer give the layer index of every Mesh point and Zone,
+    so masks, lookups, and per-layer reductions are single array operations.
+
+    Layers are numbered from 0 in the order of the .inf. Mesh Start and Mesh Stop are 1-indexed and inclusive in the
+    .inf, so the Mesh point on an interface is shared by two layers. mesh_to_layer assigns it to the layer on the
+    right, the same as the Zone right of it, and the last Mesh point to the last layer. Any Mesh point or Zone not in a
+    layer is -1.
+
+    Example:
+        Find the layer of a Zone and average the pressure over each layer at every time in one call::
+
+            hyades = HyadesOutput('./data/diamond_decay', 'Pres')
+            table = hyades.run.layer_table
+            name = table['name'][table.zone_to_layer[250]]
+            layer_means = table.mean(hyades.output, zone_centered=True)  # one column per layer
+
+    Attributes:
+        keys (list): Layer keys of the layers dictionary, such as 'layer1', in order
+        table (numpy structured array): One record per layer with the fields name, eos, mesh_start, mesh_stop,
+                                        x_start, x_stop, moi, and shock_moi. x_start and x_stop are in microns.
+        num_meshes (int): Number of Mesh points in the simulation
+        mesh_to_layer (numpy array): Layer index of each Mesh point
+        zone_to_layer (numpy array): Layer index of each Zone
+
+    """
+    fields = [('name', 'U64'), ('eos', int), ('mesh_start', int), ('mesh_stop', int),
+              ('x_start', float), ('x_stop', float), ('moi', bool), ('shock_moi', bool)]
+
+    def __init__(self, layers, moi=None, shock_moi=None, num_meshes=None):
+        """Build the table and the Mesh and Zone maps from a layers dictionary
+
+        Args:
+            layers (dict): Layers of the simulation, as in HyadesRun.layers
+            moi (string, optional): Key of the material of interest
+            shock_moi (string, optional): Key of the shock material of interest
+            num_meshes (int, optional): Number of Mesh points. Defaults to the last Mesh Stop of the layers.
+
+        """
+        self.keys = list(layers)
+        self.table = np.array([(layer['Name'], layer['EOS'], layer['Mesh Start'], layer['Mesh Stop'],
+                                layer['X Start'], layer['X Stop'], key == moi, key == shock_moi)
+                               for key, layer in layers.items()], dtype=self.fields)
+        if num_meshes is None:
+            num_meshes = int(self.table['mesh_stop'].max()) if len(self.table) > 0 else 0
+        self.num_meshes = num_meshes
+
+        self.mesh_to_layer = np.full(num_meshes, -1)
+        self.zone_to_layer = np.full(max(num_meshes - 1, 0), -1)
+        for i, (start, stop) in enumerate(zip(self.table['mesh_start'], self.table['mesh_stop'])):
+            self.mesh_to_layer[start - 1:stop] = i  # the next layer overwrites the shared Mesh point on its left
+            self.zone_to_layer[start - 1:stop - 1] = i
+
+    def __len__(self):
+        return len(self.table)
+
+    def __getitem__(self, key):
+        """A column of the table by field name, or the record of a layer by its key or index"""
+        if isinstance(key, str) and key in self.keys:
+            return self.table[self.keys.index(key)]
+        return self.table[key]
+
+    def index(self, key):
+        """Index of a layer from its key, such as 'layer2', or None if key is None"""
+        return None if key is None else self.keys.index(key)
+
+    @property
+    def moi(self):
+        """Index of the material of interest, or None if there is not one"""
+        indices = np.flatnonzero(self.table['moi'])
+        return int(indices[0]) if len(indices) > 0 else None
+
+    @property
+    def shock_moi(self):
+        """Index of the shock material of interest, or None if there is not one"""
+        indices = np.flatnonzero(self.table['shock_moi'])
+        return int(indices[0]) if len(indices) > 0 else None
+
+    def grid_to_layer(self, zone_centered=False):
+        """zone_to_layer if zone_centered, otherwise mesh_to_layer"""
+        return self.zone_to_layer if zone_centered else self.mesh_to_layer
+
+    def bounds(self, zone_centered=False):
+        """0-indexed first and last Mesh point, or Zone if zone_centered, of every layer
+
+        Returns:
+            first (numpy array), last (numpy array): One index per layer, both inside the layer
+
+        """
+        first = self.table['mesh_start'] - 1
+        last = self.table['mesh_stop'] - (2 if zone_centered else 1)
+        return first, last
+
+    def slice(self, layer, zone_centered=False):
+        """Slice of the Mesh points, or Zones if zone_centered, assigned to a layer by mesh_to_layer or zone_to_layer
+
+        Args:
+            layer (int or string): Layer index or key, such as 1 or 'layer2'
+            zone_centered (bool, optional): Whether to slice the Zone grid instead of the Mesh grid
+
+        Returns:
+            layer_slice (slice)
+
+        """
+        i = self.index(layer) if isinstance(layer, str) else layer
+        start, stop = self._extent(zone_centered)
+        return slice(int(start[i]), int(stop[i]))
+
+    def mask(self, layers, zone_centered=False):
+        """Boolean mask of the Mesh points, or Zones if zone_centered, in any of the given layers
+
+        Args:
+            layers (int, string, or list): Layer indices or keys, such as 1 or 'layer2'
+            zone_centered (bool, optional): Whether to mask the Zone grid instead of the Mesh grid
+
+        Returns:
+            mask (numpy array)
+
+        """
+        if isinstance(layers, (int, np.integer, str)):
+            layers = [layers]
+        indices = [self.index(layer) if isinstance(layer, str) else layer for layer in layers]
+        return np.isin(self.grid_to_layer(zone_centered), indices)
+
+    def reduce(self, values, ufunc=np.add, zone_centered=False):
+        """Reduce the last axis of values over each layer with a single ufunc.reduceat
+
+        Each Mesh point or Zone is counted in the layer given by mesh_to_layer or zone_to_layer. Layers without any
+        Mesh points or Zones on the grid are NaN.
+
+        Args:
+            values (numpy array): Variable with the Mesh or Zone grid along its last axis
+            ufunc (numpy ufunc, optional): Reduction such as np.add, np.maximum, or np.minimum
+            zone_centered (bool, optional): Whether values are on the Zone grid instead of the Mesh grid
+
+        Returns:
+            reduced (numpy array): values with its last axis replaced by one entry per layer
+
+        """
+        values = np.asarray(values)
+        start, stop = self._extent(zone_centered)
+        filled = stop > start
+        if not filled.any():
+            return np.full(values.shape[:-1] + (len(self),), np.nan)
+        # Alternating starts and stops, so every other result is the reduction over one layer, skipping any gaps
+        indices = np.column_stack((start[filled], stop[filled])).ravel()
+        if indices[-1] >= values.shape[-1]:
+            indices = indices[:-1]
+        reduced = ufunc.reduceat(values, indices, axis=-1)[..., ::2]
+        if filled.all():
+            return reduced
+        output = np.full(values.shape[:-1] + (len(self),), np.nan)
+        output[..., filled] = reduced
+        return output
+
+    def mean(self, values, zone_centered=False):
+        """Average of the last axis of values over each layer, see reduce"""
+        start, stop = self._extent(zone_centered)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.reduce(values, np.add, zone_centered) / (stop - start)
+
+    def _extent(self, zone_centered=False):
+        """Start and stop indices of the slice of the Mesh or Zone grid assigned to each layer"""
+        grid_to_layer = self.grid_to_layer(zone_centered)
+        size = np.bincount(grid_to_layer[grid_to_layer >= 0], minlength=len(self))
+        start = np.array([np.argmax(grid_to_layer == i) for i in range(len(self))], dtype=int)
+        return start, start + size
+
+
+class VariableCache:
+    """Process-wide least-recently-used cache of loaded Hyades variables with a memory budget
+
+    Entries are keyed by (absolute path of the .cdf, variable name, .cdf modification time, .cdf size), so editing or
+    re-running a simulation automatically misses the stale entries, which are then evicted as the cache fills up.
+    When adding an entry pushes the cache over max_bytes, the least recently used entries are evicted.
+
+    Note:
+        Cached arrays are shared by every HyadesRun and HyadesOutput of the same simulation, so they are read-only.
+        Use output.copy() to get an array that can be modified.
+
+    Example:
+        Adjust the memory budget, check the cache performance, and drop a run that is being re-simulated::
+
+            from tools.hyades_reader import variable_cache
+            variable_cache.max_bytes = 8 * 1024 ** 3  # 8 GB
+            print(variable_cache.hits, variable_cache.misses)
+            variable_cache.invalidate('./data/diamond_decay')
+
+    Attributes:
+        max_bytes (int): Memory budget of the cache in bytes. Entries larger than max_bytes are never cached.
+        nbytes (int): Memory currently used by the cached entries in bytes
+        hits (int): Number of lookups that found their entry
+        misses (int): Number of lookups that had to load their entry
+
+    """
+    def __init__(self, max_bytes=2 * 1024 ** 3):
+        self._max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __repr__(self):
+        return f'VariableCache({len(self)} entries, {self.nbytes / 1e6:.1f} of {self.max_bytes / 1e6:.1f} MB, ' \
+               f'{self.hits} hits, {self.misses} misses)'
+
+    @property
+    def max_bytes(self):
+        return self._max_bytes
+
+    @max_bytes.setter
+    def max_bytes(self, max_bytes):
+        with self._lock:
+            self._max_bytes = max_bytes
+            self._evict()
+
+    @staticmethod
+    def key(cdf_name, name):
+        """Cache key of a variable that changes whenever the .cdf is rewritten"""
+        stat = os.stat(cdf_name)
+        return os.path.abspath(cdf_name), name, stat.st_mtime_ns, stat.st_size
+
+    def get(self, key):
+        """Get a cached entry and mark it as recently used, or None if the entry is not cached"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        """Add an entry, evicting the least recently used entries until the cache is within its memory budget"""
+        nbytes = self.sizeof(value)
+        if nbytes > self.max_bytes:
+            return
+        if isinstance(value, np.ndarray):
+            value.flags.writeable = False  # Shared by every view of this run, so nobody may modify it in place
+        with self._lock:
+            if key in self._entries:
+                self.nbytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, nbytes)
+            self.nbytes += nbytes
+            self._evict()
+
+    def invalidate(self, run):
+        """Remove every cached entry of a run
+
+        Args:
+            run (HyadesRun, HyadesOutput, or string): The run, or the name of the run, to remove from the cache
+        """
+        if not isinstance(run, (HyadesRun, HyadesOutput)):
+            run = HyadesRun(run)
+        path = os.path.abspath(run.data_name if isinstance(run, HyadesRun) else run.run.data_name)
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == path]:
+                self.nbytes -= self._entries.pop(key)[1]
+
+    def clear(self):
+        """Remove every entry and reset the hit and miss counters"""
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def _evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes. Caller must hold the lock"""
+        while self.nbytes > self._max_bytes and self._entries:
+            key, (value, nbytes) = self._entries.popitem(last=False)
+            self.nbytes -= nbytes
+
+    @staticmethod
+    def sizeof(value):
+        """Approximate memory used by a cache entry in bytes"""
+        if isinstance(value, np.ndarray):
+            return value.nbytes
+        elif isinstance(value, dict):
+            return sum(VariableCache.sizeof(k) + VariableCache.sizeof(v) for k, v in value.items())
+        elif isinstance(value, (list, tuple)):
+            return sum(VariableCache.sizeof(v) for v in value)
+        return sys.getsizeof(value)
+
+
+variable_cache = VariableCache()
+
+
+class HyadesRun:
+    """Shares one open .cdf and one parsed .inf between every variable of a Hyades simulation
+
+    Variables are read from the .cdf and converted to SI units the first time they are requested, then memoized on
+    the HyadesRun, so analysis that needs several variables of the same simulation only parses the files once.
+    HyadesOutput is a view of a single variable of a HyadesRun.
+
+    Loaded variables are also kept in the process-wide variable_cache, so a new HyadesRun or HyadesOutput of a run
+    that was recently loaded does not read the .cdf again unless the .cdf has changed on disk.
+
+    With mmap=True nothing is copied out of the .cdf. Variables and coordinates are MappedArrays over a memory map of
+    the file that stays open for the lifetime of the run, so opening a run is nearly free and only the slices that
+    are actually indexed are paged in from disk and converted to SI units.
+
+    With sidecar=True the header and every variable read from the .cdf are also saved, already converted to SI units,
+    as .npy files in a .pyhy_cache directory next to the run. Later HyadesRuns with sidecar=True serve them with
+    np.load(mmap_mode='r') instead of parsing the .cdf, even in a new Python session. The .pyhy_cache is rebuilt
+    automatically if the modification time or size of the .cdf changes.
+
+    If the .cdf has been archived into a pyhy store (see tools/pyhy_store.py) and deleted, variables are read from the
+    store instead, and with mmap=True only the blocks of dumps that are indexed are decompressed.
+
+    Example:
+        Load the pressure and particle velocity of a run with a single pass over the files::
+
+            run = HyadesRun('./data/diamond_decay')
+            pressure = run['Pres']  # read and converted on the first access
+            velocity = run['U']
+            pressure = run['Pres']  # memoized, does not touch the .cdf
+
+        Look at a single lineout of a very large run without loading the rest of it::
+
+            run = HyadesRun('./data/diamond_decay', mmap=True)
+            lineout = run['Pres'][100, :]  # only reads the 101st dump from disk
+
+        Re-open a run for plotting without parsing the .cdf after the first time::
+
+            run = HyadesRun('./data/diamond_decay', sidecar=True)
+            pressure = run['Pres']  # writes ./data/diamond_decay/.pyhy_cache/diamond_decay/Pres.npy the first time
+
+    Attributes:
+        filename (string): Name used to initialize
+        dir_name (string): Name of containing directory
+        run_name (string): Name of the Hyades run with no file extension or directories
+        cdf_name (string): Path to the .cdf
+        inf_name (string): Path to the .inf
+        store_name (string): Path to the pyhy store of the run, which is only used if the .cdf does not exist
+        data_name (string): Path to the file the variables are read from, either the .cdf or the index of the store
+        mmap (bool): Whether variables are memory-mapped views instead of arrays in memory
+        sidecar (bool): Whether variables are served from and saved to the .npy files in sidecar_dir
+        sidecar_dir (string): Path to the .pyhy_cache directory of this run
+        time (numpy array): Times of the simulation in nanoseconds
+        time_index (TimeIndex): Fast lookups of requested times in time
+        mesh_x (numpy array): Eulerian Mesh coordinates in microns with len(time) rows and NumMeshs columns
+        zone_x (numpy array): Eulerian Zone coordinates in microns with len(time) rows and NumZones columns
+        layers (dict): Dictionary of the layers and their properties specified by the mesh line in the .inf
+        moi (string): Material of interest if one is selected, otherwise None
+        shock_moi (string): Shock material of interest if one is selected, otherwise None
+        layer_table (LayerTable): The layers as a structured array, with the layer of every Mesh point and Zone
+        tv (dict): Dictionary of all drives in the inf. May include each of Pressure, Temperature, Laser drives.
+        xray_probe (tuple): Tuple of (xray_start_time, xray_stop_time) if specified, otherwise None
+
+    """
+    def __init__(self, filename, mmap=False, sidecar=False):
+        """Locates the .cdf and .inf of a Hyades simulation. Neither file is read until its data is requested.
+
+        Args:
+            filename (string): Name of the .inf or .cdf (does not require file extension)
+            mmap (bool, optional): Toggle to return read-only memory-mapped views instead of loading variables
+            sidecar (bool, optional): Toggle to serve variables from a .npy cache next to the run, creating it if needed
+
+        """
+        self.filename = filename
+        if os.path.isdir(filename):
+            self.dir_name = filename
+        elif os.path.isdir(os.path.join('.', 'data', filename)):
+            self.dir_name = os.path.join('.', 'data', filename)
+        else:
+            self.dir_name = os.path.dirname(filename)
+        self.run_name = os.path.splitext(os.path.basename(filename))[0]
+
+        self.cdf_name = os.path.join(self.dir_name, self.run_name + '.cdf')
+        self.inf_name = os.path.join(self.dir_name, self.run_name + '.inf')
+        self.store_name = os.path.join(self.dir_name, self.run_name + '.pyhy')
+        if self.run_name + '.cdf' in os.listdir(self.dir_name or '.'):
+            self.data_name = self.cdf_name
+        elif os.path.isfile(os.path.join(self.store_name, 'index.json')):
+            self.data_name = os.path.join(self.store_name, 'index.json')
+        else:
+            raise Exception(f"Could not find {self.run_name+'.cdf'} or {self.run_name+'.pyhy'} in {self.dir_name}")
+
+        self.mmap = mmap
+        self.sidecar = sidecar
+        # Several runs may share a directory, so each gets its own folder inside the .pyhy_cache
+        self.sidecar_dir = os.path.join(self.dir_name, '.pyhy_cache', self.run_name)
+        self._cdf = None
+        self._memory_map = None
+        self._variables = {}
+        self._inf = None
+        self._data_stat = self._stat()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __getitem__(self, var):
+        """Variable specified by var converted to SI units. Loaded on first access and memoized afterwards."""
+        if var in derived_variables:
+            return self._load(var, lambda: derived_variables[var].function(self))
+        if var not in self._variables:
+            long_name, units, unit_conversion = self.variable_info(var)
+            if self.mmap and not self.sidecar:
+                self._variables[var] = MappedArray(self.map_variable(var), unit_conversion)
+            else:
+                self._load(var, lambda: self.cdf.variables[var].data * unit_conversion)
+        return self._variables[var]
+
+    def __contains__(self, var):
+        if var in derived_variables:
+            return all(v in self for v in derived_variables[var].inputs)
+        return var in self.header
+
+    def _load(self, name, loader):
+        """Memoize the result of loader() on this run and in the process-wide variable_cache
+
+        Args:
+            name (string or tuple): Name of the entry, unique within this run
+            loader (function): Function without arguments that computes the entry on a cache miss
+
+        Returns:
+            The cached or newly loaded entry
+        """
+        if name not in self._variables and self.sidecar:
+            self._variables[name] = self._load_sidecar(name, loader)
+        if name not in self._variables:
+            key = variable_cache.key(self.data_name, name)
+            value = variable_cache.get(key)
+            if value is None:
+                value = loader()
+                variable_cache.put(key, value)
+            self._variables[name] = value
+        return self._variables[name]
+
+    def _load_sidecar(self, name, loader):
+        """Load an entry from the .pyhy_cache, or compute it with loader() and save it there for later runs
+
+        Arrays are saved as one .npy per entry and loaded as read-only memory maps. The header is saved in meta.json
+        along with the modification time and size of the .cdf, which are checked before anything is served.
+        If the .pyhy_cache cannot be written, for example in a read-only data directory, the entry is still returned.
+
+        Args:
+            name (string): Name of the entry, unique within this run
+            loader (function): Function without arguments that computes the entry on a cache miss
+
+        Returns:
+            The cached or newly loaded entry
+        """
+        meta = self._sidecar_meta()
+        if name == 'header':
+            # Headers saved before the dtype was recorded are read again
+            if (meta.get('header') is None) or any('dtype' not in info for info in meta['header'].values()):
+                meta['header'] = loader()
+                self._write_sidecar_meta(meta)
+            return {var: {**info, 'dimensions': tuple(info['dimensions']), 'shape': tuple(info['shape'])}
+                    for var, info in meta['header'].items()}
+
+        npy_name = os.path.join(self.sidecar_dir, name.replace(' ', '_') + '.npy')
+        if name in meta['arrays'] and os.path.isfile(npy_name):
+            try:
+                return np.load(npy_name, mmap_mode='r')
+            except OSError:  # removed by another reader that found the .pyhy_cache out of date, so load it again
+                pass
+        value = np.asarray(loader())
+        try:
+            temporary_name = f'{npy_name}.{os.getpid()}.{threading.get_ident()}.tmp.npy'
+            np.save(temporary_name, value)
+            os.replace(temporary_name, npy_name)  # readers never see a partially written .npy
+            meta = self._sidecar_meta()
+            meta['arrays'] = sorted(set(meta['arrays']) | {name})
+            self._write_sidecar_meta(meta)
+            return np.load(npy_name, mmap_mode='r')
+        except OSError:
+            return value
+
+    def _sidecar_meta(self):
+        """Contents of meta.json in the .pyhy_cache, cleared and restarted if it does not match the .cdf on disk"""
+        stat = os.stat(self.data_name)
+        fresh = {'cdf': os.path.relpath(self.data_name, self.dir_name), 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size,
+                 'header': None, 'arrays': []}
+        try:
+            with open(os.path.join(self.sidecar_dir, 'meta.json')) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            meta = None
+        if meta is None or any(meta.get(key) != fresh[key] for key in ('cdf', 'mtime_ns', 'size')):
+            self.clear_sidecar()
+            return fresh
+        return meta
+
+    def _write_sidecar_meta(self, meta):
+        try:
+            os.makedirs(self.sidecar_dir, exist_ok=True)
+            temporary_name = os.path.join(self.sidecar_dir, f'meta.json.{os.getpid()}.{threading.get_ident()}.tmp')
+            with open(temporary_name, 'w') as f:
+                json.dump(meta, f, indent=1)
+            os.replace(temporary_name, os.path.join(self.sidecar_dir, 'meta.json'))
+        except OSError:
+            pass
+
+    def clear_sidecar(self):
+        """Delete the .npy files and meta.json in the .pyhy_cache of this run"""
+        if not os.path.isdir(self.sidecar_dir):
+            return
+        for name in os.listdir(self.sidecar_dir):
+            if name.endswith('.npy') or name.startswith('meta.json'):
+                try:
+                    os.remove(os.path.join(self.sidecar_dir, name))
+                except OSError:
+                    pass
+
+    def _stat(self):
+        """Modification time and size of the file the variables are read from"""
+        stat = os.stat(self.data_name)
+        return stat.st_mtime_ns, stat.st_size
+
+    def refresh(self):
+        """Pick up dumps added to the .cdf since it was read, such as a snapshot being written by monitor_hyades
+
+        Nothing happens if the .cdf has not changed on disk. Otherwise the .cdf is reopened, and every loaded variable
+        with one row per dump is extended by reading only the new dumps, as long as the loaded dump times and last
+        loaded dump are unchanged on disk. A run redone in the same folder, or a last dump rewritten by the next
+        PPF2NCDF pass, fails that check and the variable is reloaded in full the next time it is used. Everything else
+        memoized on the run, such as coordinates derived from R or a LayerTable, is dropped and rebuilt the next time
+        it is used. Memory-mapped and sidecar runs only drop what is memoized, since reopening them is already cheap.
+
+        Returns:
+            changed (bool): Whether the .cdf had changed
+
+        """
+        data_stat = self._stat()
+        if data_stat == self._data_stat:
+            return False
+        self._data_stat = data_stat
+        self.close()
+        self._memory_map = None
+        loaded, self._variables = self._variables, {}
+        if self.mmap or self.sidecar or self.data_name != self.cdf_name:
+            return True
+
+        header = self.header
+        old_time = loaded.get('DumpTimes')
+        if not isinstance(old_time, np.ndarray):
+            return True  # without the old dump times the loaded dumps cannot be checked, so reload everything
+        time = self.time
+        for var, value in loaded.items():
+            info = header.get(var)
+            if (var == 'DumpTimes') or (info is None) or (info['dimensions'][0] != 'NumDumps'):
+                continue
+            if not isinstance(value, np.ndarray) or (value.shape[1:] != info['shape'][1:]):
+                continue
+            num_loaded = value.shape[0]
+            if (num_loaded == 0) or (num_loaded > len(old_time)) or (num_loaded > info['shape'][0]):
+                continue
+            # Only extend if the loaded dumps are unchanged, otherwise the variable is reloaded in full
+            if not np.array_equal(time[:num_loaded], old_time[:num_loaded]):
+                continue
+            long_name, units, unit_conversion = self.variable_info(var)
+            if not np.array_equal(self.cdf.variables[var][num_loaded - 1] * unit_conversion, value[-1]):
+                continue
+            new_rows = self.cdf.variables[var][num_loaded:] * unit_conversion
+            self._load(var, lambda: np.concatenate((value, new_rows)))
+        return True
+
+    @property
+    def header(self):
+        """Dictionary of the dimensions, shape, long name, and cgs units of every variable in the .cdf"""
+        def read_header():
+            return {name: {'dimensions': variable.dimensions,
+                           'shape': variable.shape,
+                           'dtype': np.dtype('>' + variable.typecode()).str,  # the .cdf is always big-endian
+                           'long_name': variable.long_name.decode('utf-8'),
+                           'units': variable.units.decode('utf-8')}
+                    for name, variable in self.cdf.variables.items()}
+        return self._load('header', read_header)
+
+    @property
+    def cdf(self):
+        """The open netcdf file, or the PyhyStore if the run was archived. Opened on first use and kept until close()"""
+        if self._cdf is None:
+            if self.data_name == self.cdf_name:
+                self._cdf = netcdf.netcdf_file(self.cdf_name, 'r', mmap=True if self.mmap else None)
+            else:
+                self._cdf = PyhyStore(self.store_name)
+        return self._cdf
+
+    def close(self):
+        """Close the .cdf. Memoized variables stay available and the .cdf is reopened if it is needed again
+
+        Note:
+            Memory-mapped variables keep their own map of the .cdf, so they remain valid after close().
+        """
+        if self._cdf is not None:
+            self._cdf.close()
+            self._cdf = None
+
+    def map_variable(self, var):
+        """Read-only view of a variable directly on the .cdf, in the Hyades cgs units, without copying any data
+
+        The view is built on a memory map of the .cdf owned by this run rather than the one inside the netcdf reader,
+        so the view stays valid after the netcdf reader is closed.
+
+        Args:
+            var (string): Abbreviated name of variable of interest
+
+        Returns:
+            data (numpy array): Read-only array backed by the file on disk
+
+        Note:
+            A pyhy store cannot be memory-mapped, so its StoreVariable is returned instead. Indexing it decompresses
+            only the blocks of dumps that are needed.
+
+        """
+        if self.data_name != self.cdf_name:
+            return self.cdf.variables[var]
+        if self._memory_map is None:
+            self._memory_map = np.memmap(self.cdf_name, dtype=np.uint8, mode='r')
+        data = self.cdf.variables[var].data
+        root = data
+        while isinstance(root.base, np.ndarray):  # Walk back to the array spanning the entire file
+            root = root.base
+        offset = data.__array_interface__['data'][0] - root.__array_interface__['data'][0]
+        return np.ndarray(data.shape, dtype=data.dtype, buffer=self._memory_map, offset=offset, strides=data.strides)
+
+    @property
+    def time(self):
+        return self._load('DumpTimes', lambda: self.cdf.variables['DumpTimes'].data * 1e9)  # convert seconds to ns
+
+    @property
+    def time_index(self):
+        """TimeIndex of every dump in the simulation"""
+        if 'TimeIndex' not in self._variables:
+            self._variables['TimeIndex'] = TimeIndex(self.time)
+        return self._variables['TimeIndex']
+
+    @property
+    def mesh_x(self):
+        return self['R']  # R is the mesh coordinates, converted from cm to um
+
+    @property
+    def zone_x(self):
+        if 'Zone R' not in self._variables:
+            if self.mmap and not self.sidecar:
+                self._variables['Zone R'] = MappedArray(self.map_variable('R'), 1e4, zone_centered=True)
+            else:
+                x = self.mesh_x
+                self._load('Zone R', lambda: (x[:, 1:] + x[:, :-1]) / 2)
+        return self._variables['Zone R']
+
+    def coordinates(self, var):
+        """Eulerian coordinates, in microns, of the Mesh or Zone grid used by var"""
+        dimensions = self.dimensions(var)
+        if dimensions[1] == 'NumMeshs':
+            return self.mesh_x
+        elif dimensions[1] == 'NumZones':
+            return self.zone_x
+        else:
+            raise Exception(f'Unexpected size of {var!r} data array: {dimensions}')
+
+    def read(self, var, time_slice=slice(None), x_slice=slice(None)):
+        """Read a block of a variable converted to SI units without loading the rest of the variable
+
+        Only the rows and columns inside the slices are read from the .cdf and unit converted. If the whole variable
+        is already loaded, the block is a view of the loaded array instead.
+
+        Args:
+            var (string): Abbreviated name of variable of interest
+            time_slice (slice, optional): Indices of the dumps to read, see HyadesRun.time_slice
+            x_slice (slice, optional): Indices along the Mesh or Zone grid of var to read, see HyadesRun.x_slice
+
+        Returns:
+            output (numpy array): Block of var with one row per dump in time_slice and one column per index in x_slice
+
+        """
+        if (time_slice == slice(None)) and (x_slice == slice(None)):
+            return self[var]
+        loaded = (var in self._variables) or (variable_cache.key(self.data_name, var) in variable_cache)
+        if self.mmap or self.sidecar or loaded or (var in derived_variables):
+            return self[var][time_slice, x_slice]
+        long_name, units, unit_conversion = self.variable_info(var)
+        return self.cdf.variables[var][time_slice, x_slice] * unit_conversion
+
+    def read_coordinates(self, var, time_slice=slice(None), x_slice=slice(None)):
+        """Read the Eulerian coordinates, in microns, matching a block of var read with the same slices
+
+        Args:
+            var (string): Abbreviated name of variable of interest
+            time_slice (slice, optional): Indices of the dumps to read, see HyadesRun.time_slice
+            x_slice (slice, optional): Indices along the Mesh or Zone grid of var to read, see HyadesRun.x_slice
+
+        Returns:
+            x (numpy array): Coordinates with the same shape as read(var, time_slice, x_slice)
+
+        """
+        dimensions = self.dimensions(var)
+        if dimensions[1] == 'NumMeshs':
+            return self.read('R', time_slice, x_slice)
+        elif dimensions[1] != 'NumZones':
+            raise Exception(f'Unexpected size of {var!r} data array: {dimensions}')
+        if (time_slice == slice(None)) and (x_slice == slice(None)):
+            return self.zone_x
+        if self.mmap or self.sidecar or ('Zone R' in self._variables):
+            return self.zone_x[time_slice, x_slice]
+        # Each Zone coordinate is the average of the Mesh coordinates on either side, so read one extra Mesh column
+        zone_indices = np.arange(self.header['R']['shape'][1] - 1)[x_slice]  # There is one less Zone than Mesh
+        if len(zone_indices) == 0:
+            return self.read('R', time_slice, slice(0, 0))
+        start, stop = zone_indices.min(), zone_indices.max() + 2
+        mesh_x = self.read('R', time_slice, slice(start, stop))
+        zone_x = (mesh_x[:, 1:] + mesh_x[:, :-1]) / 2
+        if x_slice.step in (None, 1):
+            return zone_x
+        return zone_x[:, zone_indices - start]
+
+    def time_slice(self, time_range=None, time_stride=1):
+        """Slice of the dump indices between two times, including both end points
+
+        Args:
+            time_range (tuple or slice, optional): (start_time, stop_time) in nanoseconds, or a slice of dump
+                                                   indices. Defaults to all times.
+            time_stride (int, optional): Only keep every time_stride-th dump
+
+        Returns:
+            time_slice (slice)
+
+        """
+        step = time_stride if time_stride != 1 else None
+        if time_range is None:
+            return slice(None, None, step)
+        if isinstance(time_range, slice):
+            return slice(time_range.start, time_range.stop, step or time_range.step)
+        start = np.searchsorted(self.time, time_range[0], side='left')
+        stop = np.searchsorted(self.time, time_range[1], side='right')
+        return slice(int(start), int(stop), step)
+
+    def x_slice(self, var, x_range=None):
+        """Slice of the Mesh or Zone indices of var between two Lagrangian positions, including both end points
+
+        Args:
+            var (string): Abbreviated name of variable of interest, which determines the Mesh or Zone grid
+            x_range (tuple or slice, optional): (start, stop) Lagrangian positions in microns, or a slice of
+                                                indices along the Mesh or Zone grid of var. Defaults to all indices.
+
+        Returns:
+            x_slice (slice)
+
+        """
+        if x_range is None:
+            return slice(None)
+        if isinstance(x_range, slice):
+            return x_range
+        lagrangian_x = self.read_coordinates(var, slice(0, 1))[0]  # Only reads the positions at the first dump
+        start = np.searchsorted(lagrangian_x, x_range[0], side='left')
+        stop = np.searchsorted(lagrangian_x, x_range[1], side='right')
+        return slice(int(start), int(stop))
+
+    def variable_info(self, var):
+        """Get the full name, SI units, conversion factor, and dimensions of a variable without loading its data
+
+        Args:
+            var (string): Abbreviated name of variable of interest
+
+        Returns:
+            long_name (string), units (string), unit_conversion (float)
+
+        """
+        if var in derived_variables:
+            return derived_variables[var].long_name, derived_variables[var].units, 1
+        long_name = self.header[var]['long_name']
+        units = self.header[var]['units']
+        return get_unit_conversion(var, long_name, units)
+
+    def dimensions(self, var):
+        """Names of the netcdf dimensions of var, such as ('NumDumps', 'NumZones')"""
+        if var in derived_variables:
+            return derived_variables[var].dimensions
+        return self.header[var]['dimensions']
+
+    @property
+    def inf(self):
+        """The parsed .inf of the run, shared with every other reader of the same .inf"""
+        if self.run_name + '.inf' not in os.listdir(self.dir_name or '.'):
+            raise Exception(f"Could not find {self.run_name + '.inf.'} in {self.dir_name}")
+        return InfFile.load(self.inf_name)
+
+    def _read_inf(self):
+        """Keep a copy of the layers, drives, and X-Ray probe times from the .inf that this run can modify"""
+        if self._inf is None:
+            inf = self.inf
+            self._inf = copy.deepcopy({'layers': inf.layers, 'moi': inf.moi, 'shock_moi': inf.shock_moi,
+                                       'tv': inf.tv, 'xray_probe': inf.xray_probe})
+        return self._inf
+
+    @property
+    def layers(self):
+        return self._read_inf()['layers']
+
+    @property
+    def moi(self):
+        return self._read_inf()['moi']
+
+    @property
+    def shock_moi(self):
+        return self._read_inf()['shock_moi']
+
+    @property
+    def layer_table(self):
+        """LayerTable of the layers, built the first time it is used"""
+        if 'LayerTable' not in self._variables:
+            num_meshes = self.header['R']['shape'][1] if 'R' in self.header else None
+            self._variables['LayerTable'] = LayerTable(self.layers, self.moi, self.shock_moi, num_meshes)
+        return self._variables['LayerTable']
+
+    @property
+    def tv(self):
+        return self._read_inf()['tv']
+
+    @property
+    def xray_probe(self):
+        return self._read_inf()['xray_probe']
 
 
 class HyadesOutput:
@@ -22,77 +1212,141 @@ class HyadesOutput:
         Other variables, such as Pressure, Density, and Temperature, place Lagrangian coordinates in Zones.
         Zone coordinates are computed as the average of their left and right Mesh points.
 
+        HyadesOutput is a view of one variable of a HyadesRun. Pass the same HyadesRun to several HyadesOutputs
+        to read the .cdf and .inf only once for all of them.
+        With mmap=True, eulerian_x and output are read-only MappedArrays that only read the slices that are indexed.
+
+        lagrangian_x only needs the positions at the first dump, so it is all that is read for Lagrangian plots.
+        The 2D eulerian_x is only read from the .cdf the first time it is used. x is kept as another name for
+        eulerian_x, so x[0, :] still works, but it reads every dump. If the .cdf has changed on disk since output was
+        read, such as a snapshot rewritten by monitor_hyades, the HyadesOutput is refreshed before eulerian_x is read
+        so the two always match.
+
+        time_range, x_range, and time_stride restrict the HyadesOutput to a window of the simulation, and only that
+        window is read from the .cdf. eulerian_x, time, and output all cover the same window, so eulerian_x[0, :] is
+        the position at the first time in the window, while lagrangian_x is always the position at the first dump of
+        the simulation. Layer Mesh indices still refer to the full simulation, and time_slice and x_slice record
+        where the window sits within it.
+
     Attributes:
         filename (string): Name used to initialize
         dir_name (string): Name of containing directory
         run_name (string): Name of the Hyades run with no file extension or directories
+        run (HyadesRun): The run this variable was loaded from
         var (string): Abbreviated name of the variable of interest used to init
-        x (numpy array): Lagrangian coordinates of the simulation in microns
+        lagrangian_x (numpy array): Lagrangian coordinates of the simulation in microns, one per column of output
+        eulerian_x (numpy array): Eulerian coordinates in microns with the same shape as output. Read on first use.
+        x (numpy array): Same as eulerian_x, kept for compatibility
         time (numpy array): Times of the simulation in nanoseconds
         output (numpy array): Variable specified by var. For most variables is a 2D array with len(time) rows and
-                              len(x) columns.
+                              len(lagrangian_x) columns.
         long_name (string): Full name of var according to Hyades
         units (string): SI units for the variable of interest
         layers (dict): Dictionary of the layers and their properties specified by the mesh line in the .inf
         moi (string): Material of interest if one is selected, otherwise None
         shock_moi (string): Shock material of interest if one is selected, otherwise None
+        layer_table (LayerTable): The layers as a structured array, with the layer of every Mesh point and Zone
         tv (dict): Dictionary of all drives in the inf. May include each of Pressure, Temperature, Laser drives.
         xray_probe (tuple): Tuple of (xray_start_time, xray_stop_time) if specified, otherwise None
+        time_slice (slice): Indices of the dumps in the simulation that were read
+        time_index (TimeIndex): Fast lookups of requested times in time, indexing the rows of output
+        x_slice (slice): Indices along the Mesh or Zone grid of the simulation that were read
 
     """
-    def __init__(self, filename, var):
+    def __init__(self, filename, var, mmap=False, time_range=None, x_range=None, time_stride=1, sidecar=False):
         """Gets and stores Hyades simulation info from the .inf and .cdf
 
         Args:
-            filename (string): Name of the .inf (does not require file extension)
+            filename (string or HyadesRun): Name of the .inf (does not require file extension) or an existing run
             var (string): Abbreviated name of variable of interest - one of Pres, Rho, U, Te, Ti, Tr, R
+            mmap (bool, optional): Toggle to memory-map the .cdf instead of loading the variable.
+                                   Ignored if filename is a HyadesRun, which already chose whether to use mmap.
+            time_range (tuple or slice, optional): Only read times between (start_time, stop_time) nanoseconds,
+                                                   or a slice of dump indices
+            x_range (tuple or slice, optional): Only read between (start, stop) Lagrangian positions in microns,
+                                                or a slice of indices along the Mesh or Zone grid of var
+            time_stride (int, optional): Only read every time_stride-th dump
+            sidecar (bool, optional): Toggle to use the .npy cache next to the run, see HyadesRun.
+                                      Ignored if filename is a HyadesRun.
 
         """
-        self.filename = filename
-        if os.path.isdir(filename):
-            self.dir_name = filename
-        elif os.path.isdir(os.path.join('.', 'data', filename)):
-            self.dir_name = os.path.join('.', 'data', filename)
+        if isinstance(filename, HyadesRun):
+            run = filename
         else:
-            self.dir_name = os.path.dirname(filename)
-
-        self.run_name = os.path.splitext(os.path.basename(filename))[0]
+            run = HyadesRun(filename, mmap=mmap, sidecar=sidecar)
+        self.run = run
+        self.filename = run.filename
+        self.dir_name = run.dir_name
+        self.run_name = run.run_name
         self.var = var.capitalize()
+        self._window = (time_range, x_range, time_stride)
+        self._data_stat = run._data_stat
 
         # Get variable information from cdf
-        if self.run_name + '.cdf' in os.listdir(self.dir_name):
-            cdf_name = os.path.join(self.dir_name, self.run_name+'.cdf')
-            x, time, output, long_name, units, data_dimensions = self.get_var_from_cdf(cdf_name, self.var)
-        else:
-            raise Exception(f"Could not find {self.run_name+'.cdf'} in {self.dir_name}")
-        self.x = x
-        self.time = time
-        self.output = output
-        self.long_name = long_name
-        self.units = units
-        self.data_dimensions = data_dimensions
+        self.time_slice = run.time_slice(time_range, time_stride)
+        self.x_slice = run.x_slice(self.var, x_range)
+        self.lagrangian_x = run.read_coordinates(self.var, slice(0, 1), self.x_slice)[0]  # Only reads the first dump
+        self._eulerian_x = None
+        self.time = run.time[self.time_slice]
+        self._time_index = None
+        self.output = run.read(self.var, self.time_slice, self.x_slice)
+        self.long_name, self.units, unit_conversion = run.variable_info(self.var)
+        self.data_dimensions = run.dimensions(self.var)
 
         # Get layer information from .inf
-        if self.run_name + '.inf' in os.listdir(self.dir_name):
-            inf_name = os.path.join(self.dir_name, self.run_name + '.inf')
-            layers, moi, shock_moi = self.get_layers(inf_name)
-            tv = self.get_tv(inf_name)
-            xray_probe = self.get_xray_time(inf_name)
-        else:
-            raise Exception(f"Could not find {self.run_name + '.inf.'} in {self.dir_name}")
-        self.layers = layers
-        self.moi = moi
-        self.shock_moi = shock_moi
-        self.tv = tv
-        self.xray_probe = xray_probe
+        self.layers = run.layers
+        self.moi = run.moi
+        self.shock_moi = run.shock_moi
+        self.tv = run.tv
+        self.xray_probe = run.xray_probe
+
+    def refresh(self):
+        """Reload the output if the .cdf has changed, only reading the dumps added since, see HyadesRun.refresh
+
+        Returns:
+            changed (bool): Whether the .cdf had changed
+
+        """
+        self.run.refresh()
+        if self._data_stat == self.run._data_stat:  # this output was already loaded from the current .cdf
+            return False
+        time_range, x_range, time_stride = self._window
+        self.__init__(self.run, self.var, time_range=time_range, x_range=x_range, time_stride=time_stride)
+        return True
+
+    @property
+    def eulerian_x(self):
+        if self._eulerian_x is None:
+            if self.run._stat() != self._data_stat:
+                # The .cdf changed since output was read, so refresh first to read both from the same .cdf
+                self.refresh()
+            self._eulerian_x = self.run.read_coordinates(self.var, self.time_slice, self.x_slice)
+        return self._eulerian_x
+
+    @property
+    def x(self):
+        return self.eulerian_x
+
+    @x.setter
+    def x(self, value):
+        self._eulerian_x = value
+
+    @property
+    def layer_table(self):
+        return self.run.layer_table
 
     @staticmethod
-    def get_var_from_cdf(filename, var):
+    def get_var_from_cdf(filename, var, mmap=False, sidecar=False):
         """Reads the time, Lagrangian position, and a single variable from a .cdf
 
+        Note:
+            With mmap=True, x and output are read-only MappedArrays that keep the .cdf mapped for as long as they exist.
+
         Args:
             filename (string): Name of the .inf
             var (string): Abbreviated name of variable of interest - one of Pres, Rho, U, Te, Ti, Tr, R
+            mmap (bool, optional): Toggle to memory-map the .cdf instead of copying the data
+            sidecar (bool, optional): Toggle to read from, and create, the .npy cache next to the run
 
         Returns:
             x (numpy array): Lagrangian coordinates of the simulation in microns
@@ -103,97 +1357,16 @@ class HyadesOutput:
             units (string): SI units for the variable of interest
 
         """
-        cdf = netcdf.netcdf_file(filename, 'r')
-        time = cdf.variables['DumpTimes'].data.copy() * 1e9  # convert seconds to nanoseconds
-        x = cdf.variables['R'].data.copy() * 1e4  # x is the mesh coordinates, convert cm to um
-        output = cdf.variables[var].data.copy()  # output may be a 1D, 2D, or 3D array depending on the variable
-        data_dimensions = cdf.variables[var].dimensions
         # FIXME: what does sd1 do with the pressure calculations. Ray thinks it needs to be subtracted
         # if var == 'Pres':
         #     sd1 = cdf.variables['Sd1'].data.copy() * 1e-10
         #     output = output - sd1
-
-        if cdf.variables[var].dimensions[1] == 'NumMeshs':
-            pass
-        elif cdf.variables[var].dimensions[1] == 'NumZones':
-            x = (x[:, 1:] + x[:, :-1]) / 2
-        else:
-            raise Exception(f'Unexpected size of {var!r} data array: {cdf.variables[var].dimensions}')
-
-        long_name = cdf.variables[var].long_name.decode('utf-8')
-        units = cdf.variables[var].units.decode('utf-8')
-
-        cdf.close()
-        '''
-        All conversions below change the Hyades default cgs units to SI units
-        Most conversions taken from https://en.wikipedia.org/wiki/Centimetre%E2%80%93gram%E2%80%93second_system_of_units
-        unit_conversions that are commented out have not been confirmed
-        '''
-        if 'Acc' == var:
-            long_name = 'Mesh Acceleration'
-            units = 'km/s^2'
-            unit_conversion = 1e-5
-        elif 'Akappa' == var:
-            unit_conversion = 1  # 0.1
-        elif 'Conde' == var:
-            unit_conversion = 1  # 8.62e-13
-        elif 'Condi' == var:
-            unit_conversion = 1  # 8.62e-13
-        elif 'Eelc' == var:
-            units = 'Joules'
-            unit_conversion = 1e-7
-        elif 'Eion' == var:
-            units = 'Joules'
-            unit_conversion = 1e-7
-        elif 'Ekappa' == var:
-            unit_conversion = 1  # 0.1
-        elif 'Pres' == var:
-            long_name = 'Pressure'
-            units = 'GPa'
-            unit_conversion = 1e-10
-        elif 'Qrad' == var:
-            units = 'Watts/m^2'
-            unit_conversion = 1e-3
-        elif 'Qradgl' == var:
-            unit_conversion = 1  # 8.62e-11
-        elif 'Qradgr' == var:
-            unit_conversion = 1  # 8.62e-11
-        elif 'R' == var:
-            long_name = 'Eulerian Position'
-            units = 'µm'
-            unit_conversion = 1e4
-        elif 'RCM' == var:
-            long_name = 'Eulerian Zone Position'
-            units = 'µm'
-            unit_conversion = 1e4
-        elif 'Rho' == var:
-            long_name = 'Density'
-            units = 'g/cc'
-            unit_conversion = 1
-        elif 'Sd1' == var:
-            units = 'GPa'
-            unit_conversion = 1e-10
-        elif var in ('Seelc', 'Seion', 'Serad'):
-            units = 'Joules'
-            unit_conversion = 1e-7
-        elif var in ('Te', 'Ti', 'Tr'):
-            units = '° K'
-            unit_conversion = 11604 * 1000
-        elif 'U' == var:
-            long_name = 'Particle Velocity'
-            units = 'km/s'
-            unit_conversion = 1e-5
-        elif 'Ucm' == var:
-            long_name = 'Zone Particle Velocity'
-            units = 'km/s'
-            unit_conversion = 1e-5
-        elif 'Ubin' == var:
-            units = 'Joules/(K * m^3)'
-            unit_conversion = 8.62e-9
-        else:
-            raise InvalidVariable(f'HyadesOutput does not recognize variable: {var}')
-
-        output *= unit_conversion
+        with HyadesRun(filename, mmap=mmap, sidecar=sidecar) as run:
+            x = run.coordinates(var)
+            time = run.time
+            output = run[var]  # output may be a 1D, 2D, or 3D array depending on the variable
+            long_name, units, unit_conversion = run.variable_info(var)
+            data_dimensions = run.dimensions(var)
 
         return x, time, output, long_name, units, data_dimensions
 
@@ -201,15 +1374,31 @@ class HyadesOutput:
         """Get the closest time and its index output by Hyades
 
         Args:
-            requested_time (float):
+            requested_time (float or array): Requested time(s) in nanoseconds
 
         Returns:
-            closest_time (float), index_of_closest_time (int)
+            closest_time (float), index_of_closest_time (int), or arrays of both if requested_time is an array
 
         """
-        index = np.argmin(abs(self.time - requested_time))
-        closest_time = self.time[index]
-        return closest_time, index
+        return self.time_index.nearest(requested_time)
+
+    @property
+    def time_index(self):
+        if self._time_index is None:
+            self._time_index = self.run.time_index if self.time_slice == slice(None) else TimeIndex(self.time)
+        return self._time_index
+
+    def interp(self, times):
+        """Linearly interpolate output at arbitrary times, see TimeIndex.interp
+
+        Args:
+            times (float or array): Requested time(s) in nanoseconds
+
+        Returns:
+            rows (numpy array): One interpolated row of output per requested time
+
+        """
+        return self.time_index.interp(times, self.output)
 
     @staticmethod
     def get_tv(filename):
@@ -222,38 +1411,7 @@ class HyadesOutput:
             tv (dict): All times, in nanoseconds, and values, SI units, for each source input
 
         """
-        if not filename.endswith('.inf'):
-            filename += '.inf'
-        with open(filename) as f:
-            lines = f.readlines()
-
-        # The format of the .inf files dictates a source line, then an optional sourcem line, then multiple tv lines
-        tv = {}
-        mode = None
-        sourcem = 1
-        unit_conversion = 1
-        for line in lines:
-            if line.startswith('source '):
-                mode = line.split()[1]
-                tv[f'{mode}-t'] = []
-                tv[f'{mode}-v'] = []
-                if mode.lower() == 'pres':
-                    unit_conversion = 1e-10
-                elif mode.lower() == 'te':
-                    unit_conversion = 11605 * 1000
-                elif mode.lower() == 'laser':  # unsure of laser units, they might depend on Hyades geometry
-                    unit_conversion = 1
-
-            if line.startswith('sourcem '):
-                sourcem = float(line.split()[1])
-
-            if line.startswith('tv '):
-                t = float(line.split()[1]) * 1e9  # convert seconds to nanoseconds
-                v = float(line.split()[2]) * sourcem * unit_conversion  # apply source mulitplier and convert to SI units
-                tv[f'{mode}-t'].append(t)
-                tv[f'{mode}-v'].append(v)
-
-        return tv
+        return InfFile.load(filename).tv
 
     @staticmethod
     def get_xray_time(filename):
@@ -266,17 +1424,7 @@ class HyadesOutput:
             xray_probe (tuple): (xray_start, xray_stop) times in nanoseconds if found, otherwise None
 
         """
-        with open(filename) as f:
-            lines = f.readlines()
-        xray_line = [line for line in lines if line.startswith('c xray_probe ')]
-        if xray_line:
-            xray_line = xray_line[0]
-            xray_start = float(xray_line.split()[2])
-            xray_stop = float(xray_line.split()[3])
-            xray_probe = tuple((xray_start, xray_stop))
-            return xray_probe
-        else:
-            return None
+        return InfFile.load(filename).xray_probe
 
     @staticmethod
     def get_layers(filename):
@@ -289,46 +1437,68 @@ class HyadesOutput:
             layers (dict): Name, EOS number, mesh properties, and initial positions of each layer
 
         """
-        inf_name = filename
-        if inf_name.endswith('.cdf'):
-            inf_name = inf_name[:-4]
-        if not inf_name.endswith('.inf'):
-            inf_name += '.inf'
-
-        with open(filename) as f:
-            lines = f.readlines()
-
-        eos_lines = [line for line in lines if line.startswith('EOS ')]
-        mesh_lines = [line for line in lines if line.startswith('mesh ')]
-
-        pattern = '\[\w+!?\$?\]'
-        result = re.findall(pattern, ''.join(lines))
-
-        assert(len(result) == len(eos_lines)), f'Unequal number of material and EOS lines.' \
-                                               f'\nMaterials: {result}\nEOS: {eos_lines}'
-        assert(len(result) == len(mesh_lines)), f'Unequal number of material and mesh lines' \
-                                                f'\nMaterials: {result}\nMesh Lines: {mesh_lines}'
-
-        layers = {}
-        material_of_interest = None
-        shock_material_of_interest = None
-        for i in range(len(result)):
-            k = f'layer{i+1}'
-            layers[k] = {}
-            bare_name = result[i][1:-1].replace('!', '').replace('$', '')
-            if '!' in result[i]:
-                material_of_interest = k
-            if '$' in result[i]:
-                shock_material_of_interest = k
-            layers[k]['Name'] = bare_name
-            layers[k]['EOS'] = int(eos_lines[i].split()[1])
-            mesh_words = mesh_lines[i].split()
-            layers[k]['Mesh Start'] = int(mesh_words[1])
-            layers[k]['Mesh Stop'] = int(mesh_words[2])
-            layers[k]['X Start'] = float(mesh_words[3]) * 1e4  # convert centimeters to microns
-            layers[k]['X Stop'] = float(mesh_words[4]) * 1e4  # convert centimeters to microns
-
-        return layers, material_of_interest, shock_material_of_interest
+        inf = InfFile.load(filename)
+        return copy.deepcopy(inf.layers), inf.moi, inf.shock_moi
+
+
+def load_runs(paths, variables, max_workers=None, mmap=False, sidecar=False, **kwargs):
+    """Load the same variables from many Hyades runs concurrently with a pool of threads
+
+    Each run is opened once in its own worker thread, and its variables are loaded as HyadesOutputs sharing that
+    HyadesRun, so runs are read in parallel while no .cdf is ever read by two threads at once. Reading the .cdf and
+    converting units happen inside NumPy and the operating system, which release the GIL, so loading a sweep scales
+    with the cores and disk bandwidth available. A run or variable that fails to load is reported in errors and does
+    not stop the rest of the batch.
+
+    Example:
+        Load the pressure and particle velocity of every run in a parameter sweep::
+
+            paths = [os.path.join('./data/sweep', d) for d in sorted(os.listdir('./data/sweep'))]
+            outputs, errors = load_runs(paths, ['Pres', 'U'], max_workers=8)
+            for path, run_outputs in zip(paths, outputs):
+                if 'Pres' in run_outputs:
+                    print(path, run_outputs['Pres'].output.max())
+            for path, var, error in errors:
+                print(f'Could not load {var} from {path}: {error}')
+
+    Args:
+        paths (list): Names of the runs, anything accepted by HyadesOutput
+        variables (string or list): Abbreviated name of one or more variables to load from every run
+        max_workers (int, optional): Maximum number of runs loaded at once. Defaults to the ThreadPoolExecutor default.
+        mmap (bool, optional): Toggle to memory-map the .cdf instead of loading the variables, see HyadesRun
+        sidecar (bool, optional): Toggle to use the .npy cache next to each run, see HyadesRun
+        **kwargs: time_range, x_range, and time_stride are passed on to every HyadesOutput
+
+    Returns:
+        outputs (list): One dictionary of {var: HyadesOutput} per run, in the same order as paths.
+                        Variables that failed to load are missing from the dictionary.
+        errors (list): (path, var, exception) of every variable that failed to load, in the same order as paths.
+                       var is None if the run itself could not be opened.
+
+    """
+    if isinstance(variables, str):
+        variables = [variables]
+
+    def load_run(path):
+        run_outputs = {}
+        run_errors = []
+        try:
+            run = path if isinstance(path, HyadesRun) else HyadesRun(path, mmap=mmap, sidecar=sidecar)
+        except Exception as e:
+            return run_outputs, [(path, None, e)]
+        for var in variables:
+            try:
+                run_outputs[var] = HyadesOutput(run, var, **kwargs)
+            except Exception as e:
+                run_errors.append((path, var, e))
+        run.close()  # Loaded variables stay available, and mmap views keep their own map of the .cdf
+        return run_outputs, run_errors
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(load_run, paths))
+    outputs = [run_outputs for run_outputs, run_errors in results]
+    errors = [error for run_outputs, run_errors in results for error in run_errors]
+    return outputs, errors
 
 
 class ShockVelocity:
@@ -342,6 +1512,7 @@ class ShockVelocity:
             filename (string): Name used when initialized
             dir_name (string): All the preceding directories in the filename
             run_name (string): Only the name of the .inf file (no extension)
+            run (HyadesRun): The run the Pressure, Density, and Particle Velocity were loaded from
             index_mode (string): Input indexing mode used on Particle Velocity
             time (numpy array): Shock time in nanoseconds
             Us (numpy array): Shock velocity, in kilometers per second, at corresponding time
@@ -349,29 +1520,38 @@ class ShockVelocity:
             window_start (list): Starting index of the window where shock front, one per time
             window_stop (list): Ending index of the window where the shock front, one per time
 
+    Other indexing modes of the same run can be computed with compute, which reuses the shock front already found.
+
     """
     def __init__(self, filename, mode='Cubic'):
         """Computes and stores the shock velocity profile
 
         Args:
-            filename (string): Name of the .inf
+            filename (string or HyadesRun): Name of the .inf or an existing run
             mode (string): Type of indexing used on particle velocity
 
         """
-        self.filename = filename
-        if os.path.isdir(filename):
-            self.dir_name = filename
+        if isinstance(filename, HyadesRun):
+            self.run = filename
         else:
-            self.dir_name = os.path.dirname(filename)
-        self.run_name = os.path.splitext(os.path.basename(filename))[0]
+            self.run = HyadesRun(filename)
+        self.filename = self.run.filename
+        if os.path.isdir(self.filename):
+            self.dir_name = self.filename
+        else:
+            self.dir_name = os.path.dirname(self.filename)
+        self.run_name = self.run.run_name
 
         self.index_mode = mode
 
-        self.shock_moi = HyadesOutput(os.path.join(self.dir_name, self.run_name), 'U').shock_moi
+        self.shock_moi = self.run.shock_moi
         self.time_into_moi = None
         self.time_out_of_moi = None
+        self._front = None
+        self._shock_velocities = {}
 
-        time, Us, window_start, window_stop, shock_index = self.calculate_shock_velocity(self.filename, self.index_mode)
+        time, Us, window_start, window_stop, shock_index = self.calculate_shock_velocity(self.run, self.index_mode)
+        self._shock_velocities[mode] = Us
         self.time = time
         self.Us = Us
         self.window_start = window_start
@@ -398,7 +1578,7 @@ class ShockVelocity:
             Shock and window indices can be used to plot the position of the shock front.
 
         Args:
-            filename (string): Name of .inf
+            filename (string or HyadesRun): Name of .inf or an existing run
             mode (string): Indexing method for Particle Velocity - one of Left, Right, Avg
 
         Returns:
@@ -408,98 +1588,256 @@ class ShockVelocity:
             WINDOW_STOP (list): Last index at time t where shock front was searched for
             SHOCK_INDEX (list): Index of shock front at time t
         """
-        hyades_pres = HyadesOutput(filename, 'Pres')
-        hyades_rho = HyadesOutput(filename, 'Rho')
-        hyades_Up = HyadesOutput(filename, 'U')
+        front = self.find_shock_front(filename)
+        shock_velocity = front['pressure'] / (front['density'] * self.particle_velocity(front, mode))
+        return (front['time'], shock_velocity,
+                list(front['window_start']), list(front['window_stop']), list(front['shock_index']))
+
+    def compute(self, modes):
+        """Shock Velocity for several Particle Velocity indexing modes in one pass
+
+        Every mode shares the same search for the shock front and the same Pressure, Density, and Particle Velocity,
+        so only the Particle Velocity indexing is repeated for each mode. UCM is only loaded if requested, and only
+        once. Results are memoized, so asking for the same mode again is free.
+
+        Example:
+            Compare the indexing modes of a run without repeating the shock front search::
+
+                shock = ShockVelocity('./data/diamond_decay', 'Cubic')
+                Us = shock.compute(['Left', 'Right', 'Average', 'Cubic'])
+                plt.plot(shock.time, Us['Left'] - Us['Right'])
+
+        Args:
+            modes (string or list): Indexing mode(s) for Particle Velocity - any of Left, Right, Average, Cubic, Ucm
+
+        Returns:
+            Us (dict): Shock velocity in kilometers per second for each mode, at the times in self.time
+
+        """
+        if isinstance(modes, str):
+            modes = [modes]
+        front = self.find_shock_front(self.run)
+        for mode in modes:
+            if mode not in self._shock_velocities:
+                Up = self.particle_velocity(front, mode)
+                self._shock_velocities[mode] = front['pressure'] / (front['density'] * Up)
+        return {mode: self._shock_velocities[mode] for mode in modes}
+
+    def find_shock_front(self, filename):
+        """Locate the shock front at every time step, which does not depend on the Particle Velocity indexing mode
+
+        See calculate_shock_velocity for the steps. Every time step is handled at once with array operations, and the
+        result for self.run is memoized so compute and calculate_shock_velocity only search for the front once.
+
+        Args:
+            filename (string or HyadesRun): Name of .inf or an existing run
+
+        Returns:
+            front (dict): The loaded HyadesOutputs of Pres and U, the time steps used (rows), and for each of them
+                          the time, window_start, window_stop, shock_index, and the pressure and initial density at
+                          the shock front
+
+        """
+        run = filename if isinstance(filename, HyadesRun) else HyadesRun(filename)
+        if (run is self.run) and (self._front is not None):
+            return self._front
+        hyades_pres = HyadesOutput(run, 'Pres')
+        hyades_rho = HyadesOutput(run, 'Rho')
+        hyades_Up = HyadesOutput(run, 'U')
 
         min_index = 8  # only look for a shock front after min_index time steps have occurred
         max_index = len(hyades_pres.time)
         min_pressure = 10  # GPa
         window_size = 10  # check for a shock window_size zones before the leading edge
 
-        pressure = []
-        density = []
-        particle_velocity = []
+        # Row i of these arrays is time step min_index + i
+        pressure = np.asarray(hyades_pres.output[min_index:max_index])
+        num_zones = pressure.shape[1]
+        # leading edge is the furthest-right zone index where the pressure is greater than min_pressure,
+        # which is the first True of each row of the mask read backwards
+        above = pressure > min_pressure
+        found = above.any(axis=1)
+        leading_edge = num_zones - 1 - np.argmax(above[:, ::-1], axis=1)
+        # If shock index is too close to the free surface, stop after that time step
+        at_free_surface = found & ((num_zones - leading_edge) <= 2)
+        num_steps = int(np.argmax(at_free_surface)) + 1 if at_free_surface.any() else len(pressure)
+
+        missing = np.flatnonzero(~found[:num_steps])
+        if missing.size > 0:
+            t = min_index + missing[0]
+            print(f'Time: {t, hyades_pres.time[t]}, Max Pressure: {hyades_pres.output[t, :].max()}')
+            fig, ax = plt.subplots()
+            ax.plot(hyades_pres.lagrangian_x, hyades_pres.output[t, :])
+            ax.set_title(f'Error Graph at {hyades_pres.time[t]:.2f} ns')
+            ax.set(xlabel='Lagrangian Distance (um)', ylabel='Pressure (GPa)')
+            plt.show()
+            raise Exception(f'At {hyades_pres.time[t]} ns could not find a pressure greater than {min_pressure} GPa,'
+                            f'which caused the shock velocity calculation to crash.')
+        steps = np.arange(num_steps)
+        leading_edge = leading_edge[:num_steps]
+        if (leading_edge == 0).any():
+            t = min_index + np.argmax(leading_edge == 0)
+            raise ValueError(f'At {hyades_pres.time[t]} ns the pressure is only above {min_pressure} GPa in the first '
+                             f'zone, which leaves no zones to search for the shock front.')
+
+        '''shock_index is where we consider the shock front to be. See function description for details.'''
+        window_start = np.maximum(leading_edge - window_size, 0)
+        window_stop = leading_edge
+        # The window_size zones left of each leading edge, padded with -inf where a window runs past the first zone
+        columns = leading_edge[:, None] + np.arange(-window_size, 0)
+        pressure_windows = np.where(columns >= 0, pressure[steps[:, None], np.maximum(columns, 0)], -np.inf)
+        shock_index = leading_edge - window_size + np.argmax(pressure_windows, axis=1)
+
+        '''The times the shock front used for the Shock Velocity enters and exits the shock material of interest.'''
+        if self.shock_moi and (self.time_into_moi is None):  # Only True if inf has a shock material of interest
+            # shock_index is a 0-indexed Zone, so compare it with the Zones of the layer rather than its Mesh points
+            moi_zones = run.layer_table.slice(run.layer_table.shock_moi, zone_centered=True)
+            entered = shock_index >= moi_zones.start
+            if entered.any():
+                first_step_in = int(np.argmax(entered))
+                self.time_into_moi = hyades_pres.time[min_index + first_step_in]
+                exited = shock_index[first_step_in:] >= moi_zones.stop
+                if exited.any():
+                    self.time_out_of_moi = hyades_pres.time[min_index + first_step_in + int(np.argmax(exited))]
+                elif at_free_surface.any():
+                    # If the shock reached the free surface before leaving the shock moi, use the last time step
+                    self.time_out_of_moi = hyades_pres.time[min_index + num_steps - 1]
+
+        front = {'run': run,
+                 'hyades_pres': hyades_pres,
+                 'hyades_Up': hyades_Up,
+                 'rows': min_index + steps,
+                 'time': hyades_pres.time[min_index:min_index + num_steps],
+                 'window_start': window_start,
+                 'window_stop': window_stop,
+                 'shock_index': shock_index,
+                 'pressure': pressure[steps, shock_index],
+                 'density': np.asarray(hyades_rho.output[0])[shock_index]}
+        if run is self.run:
+            self._front = front
+        return front
 
-        WINDOW_START = []
-        WINDOW_STOP = []
-        SHOCK_INDEX = []
+    @staticmethod
+    def particle_velocity(front, mode):
+        """Particle Velocity at the shock front found by find_shock_front, indexed with mode
 
-        for t in range(min_index, max_index):
+        Args:
+            front (dict): Shock front returned by find_shock_front
+            mode (string): Indexing method for Particle Velocity - one of Left, Right, Average, Cubic, Ucm
+
+        Returns:
+            Up (numpy array): Particle Velocity at the shock front at each time step, in kilometers per second
+
+        """
+        hyades_Up = front['hyades_Up']
+        rows = front['rows']
+        shock_index = front['shock_index']
+        if mode.lower() == 'ucm':
+            '''Attempt to load UCM, which is the Zone-indexed particle velocity output by Hyades'''
             try:
-                # leading edge is the furthest-right zone index where the pressure is greater than min_pressure
-                leading_edge = max(np.where(hyades_pres.output[t, :] > min_pressure)[0])
-            except ValueError:
-                print(f'Time: {t, hyades_pres.time[t]}, Max Pressure: {hyades_pres.output[t, :].max()}')
-                fig, ax = plt.subplots()
-                ax.plot(hyades_pres.x[0, :], hyades_pres.output[t, :])
-                ax.set_title(f'Error Graph at {hyades_pres.time[t]:.2f} ns')
-                ax.set(xlabel='Lagrangian Distance (um)', ylabel='Pressure (GPa)')
-                plt.show()
-                raise Exception(f'At {hyades_pres.time[t]} ns could not find a pressure greater than {min_pressure} GPa,'
-                                f'which caused the shock velocity calculation to crash.')
-
-            '''shock_index is where we consider the shock front to be. See function description for details.'''
-            window_start = leading_edge - window_size
-            if window_start < 0:
-                window_start = 0
-            window_stop = leading_edge
-            pressure_window = hyades_pres.output[t, window_start:window_stop]
-            shock_index = window_start + np.argmax(pressure_window)  # Shock index is the
-
-            WINDOW_START.append(window_start)
-            WINDOW_STOP.append(window_stop)
-            SHOCK_INDEX.append(shock_index)
-
-            pressure.append(hyades_pres.output[t, shock_index])
-            density.append(hyades_rho.output[0, shock_index])
-
-            left = hyades_Up.output[t, shock_index]
-            right = hyades_Up.output[t, shock_index + 1]
-            if mode.lower() == 'ucm':
-                '''Attempt to load UCM, which is the Zone-indexed particle velocity output by Hyades'''
-                try:
-                    ucm = HyadesOutput(filename, 'UCM')
-                    Up = ucm.output[t, shock_index]
-                except KeyError as e:
-                    run_name = os.path.splitext(os.path.basename(filename))[0]
-                    print(f'UCM was specified, but was not found in {run_name}.cdf\n'
-                          f'Check if ucm is in pparray line in {run_name}.inf')
-                    raise e
-            elif (mode.lower() == 'left') or (mode == 'L'):
-                Up = left
-            elif (mode.lower() == 'right') or (mode == 'R'):
-                Up = right
-            elif (mode.lower() == 'average') or (mode.lower() == 'avg'):
-                Up = (left + right) / 2
-            elif mode.lower() == 'cubic':  # Interpolate Particle Velocity with Cubic Spline
-                x = hyades_Up.x[t, :]
-                y = hyades_Up.output[t, :]
-                cubic_spline = CubicSpline(x, y)
-                zone_x = hyades_pres.x[t, shock_index]
-                Up = cubic_spline(zone_x)
-            else:
-                raise ValueError(f'Shock Velocity Interpolation Mode {mode!r} not recognized. '
-                                 f'Use one of Left, Right, Average, Cubic, Ucm')
-            particle_velocity.append(Up)
-
-            '''Attempting to find the time the shock enters and exits the shock material of interest.'''
-            if self.shock_moi:  # Only True if inf has a shock material of interest specified
-                if self.time_into_moi is None:  # only consider reassigning time_into_moi if it is None
-                    if shock_index >= hyades_Up.layers[hyades_Up.shock_moi]['Mesh Start']:
-                        self.time_into_moi = hyades_Up.time[t]
-                if (self.time_into_moi is not None) and (self.time_out_of_moi is None):
-                    # only True if the shock has entered the shock moi and has not exited
-                    if shock_index >= hyades_Up.layers[hyades_Up.shock_moi]['Mesh Stop']:
-                        self.time_out_of_moi = hyades_Up.time[t]
-
-            if (len(hyades_pres.x[0, :]) - window_stop) <= 2:  # If shock index is too close to the free surface, stop
-                if (self.time_into_moi is not None) and (self.time_out_of_moi is None):
-                    # If we haven't assigned a time_out_of_moi, assign it now
-                    self.time_out_of_moi = hyades_Up.time[t]
-                break
-
-        shock_velocity = np.array(pressure) / (np.array(density) * np.array(particle_velocity))
-        time = hyades_pres.time[min_index:t + 1]
-
-        return time, shock_velocity, WINDOW_START, WINDOW_STOP, SHOCK_INDEX
+                ucm = HyadesOutput(front['run'], 'UCM')
+            except KeyError as e:
+                run_name = front['run'].run_name
+                print(f'UCM was specified, but was not found in {run_name}.cdf\n'
+                      f'Check if ucm is in pparray line in {run_name}.inf')
+                raise e
+            Up = np.asarray(ucm.output[rows, shock_index])
+        elif (mode.lower() == 'left') or (mode == 'L'):
+            Up = np.asarray(hyades_Up.output[rows, shock_index])
+        elif (mode.lower() == 'right') or (mode == 'R'):
+            Up = np.asarray(hyades_Up.output[rows, shock_index + 1])
+        elif (mode.lower() == 'average') or (mode.lower() == 'avg'):
+            left = np.asarray(hyades_Up.output[rows, shock_index])
+            right = np.asarray(hyades_Up.output[rows, shock_index + 1])
+            Up = (left + right) / 2
+        elif mode.lower() == 'cubic':  # Interpolate Particle Velocity with the Cubic Spline through nearby Mesh points
+            time_steps = slice(rows[0], rows[-1] + 1) if len(rows) > 0 else slice(0, 0)
+            x = hyades_Up.eulerian_x[time_steps]
+            y = hyades_Up.output[time_steps]
+            zone_x = np.asarray(front['hyades_pres'].eulerian_x[time_steps])[np.arange(len(rows)), shock_index]
+            Up = local_cubic_spline(x, y, shock_index, zone_x)
+        else:
+            raise ValueError(f'Shock Velocity Interpolation Mode {mode!r} not recognized. '
+                             f'Use one of Left, Right, Average, Cubic, Ucm')
+        return Up
+
+
+def local_cubic_spline(x, y, interval, x_new, num_neighbors=32):
+    """Evaluate the cubic spline through each row of (x, y) at one point per row, using only nearby points
+
+    Gives the same result as CubicSpline(x[i], y[i])(x_new[i]) for every row i, the default not-a-knot spline through
+    the whole row, without building a spline for each row. The influence of a point on the spline decays by at least
+    a factor of two with each point in between, and by about a factor of four on an evenly spaced mesh, so only
+    num_neighbors points on either side of x_new are used. Their slopes are found by solving the spline equations for
+    every row at once, and the spline is then evaluated on the interval containing x_new as a cubic Hermite
+    polynomial. When the neighbors reach the end of a row, the not-a-knot condition at that end is used exactly.
+
+    Args:
+        x (numpy array): Increasing positions with one row per curve and at least four columns
+        y (numpy array): Values at x, the same shape as x
+        interval (numpy array): Index i of the interval x[row, i] <= x_new[row] <= x[row, i + 1] of each row
+        x_new (numpy array): Position to evaluate in each row
+        num_neighbors (int, optional): Number of points used on either side of the interval
+
+    Returns:
+        y_new (numpy array): Value of the spline at x_new in each row
+
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    interval = np.asarray(interval)
+    num_rows, num_points = x.shape
+    if num_points < 4:
+        raise ValueError(f'local_cubic_spline needs at least 4 points per row, not {num_points}')
+    width = min(num_points, 2 * num_neighbors + 2)
+    start = np.clip(interval - num_neighbors, 0, num_points - width)
+    rows = np.arange(num_rows)[:, None]
+    columns = start[:, None] + np.arange(width)
+    # Transposed so each step of the sweeps below works on a contiguous row holding every curve
+    x = x[rows, columns].T
+    y = y[rows, columns].T
+    dx = np.diff(x, axis=0)
+    slope = np.diff(y, axis=0) / dx
+
+    # Tridiagonal system for the first derivative at each point, the same equations used by scipy's CubicSpline
+    lower = np.zeros_like(x)
+    diagonal = np.empty_like(x)
+    upper = np.zeros_like(x)
+    b = np.empty_like(x)
+    diagonal[1:-1] = 2 * (dx[:-1] + dx[1:])
+    upper[1:-1] = dx[:-1]
+    lower[1:-1] = dx[1:]
+    b[1:-1] = 3 * (dx[1:] * slope[:-1] + dx[:-1] * slope[1:])
+    d = x[2] - x[0]  # not-a-knot at the first point
+    diagonal[0] = dx[1]
+    upper[0] = d
+    b[0] = ((dx[0] + 2 * d) * dx[1] * slope[0] + dx[0] ** 2 * slope[1]) / d
+    d = x[-1] - x[-3]  # not-a-knot at the last point
+    diagonal[-1] = dx[-2]
+    lower[-1] = d
+    b[-1] = (dx[-1] ** 2 * slope[-2] + (2 * d + dx[-1]) * dx[-2] * slope[-1]) / d
+
+    for i in range(1, width):  # Thomas algorithm, forward elimination
+        w = lower[i] / diagonal[i - 1]
+        diagonal[i] = diagonal[i] - w * upper[i - 1]
+        b[i] = b[i] - w * b[i - 1]
+    s = np.empty_like(x)
+    s[-1] = b[-1] / diagonal[-1]
+    for i in range(width - 2, -1, -1):  # back substitution
+        s[i] = (b[i] - upper[i] * s[i + 1]) / diagonal[i]
+
+    # Cubic Hermite polynomial on the interval holding x_new, with the same coefficients as a scipy PPoly
+    k = interval - start
+    curves = np.arange(num_rows)
+    h = dx[k, curves]
+    s0 = s[k, curves]
+    t = (s0 + s[k + 1, curves] - 2 * slope[k, curves]) / h
+    c0 = t / h
+    c1 = (slope[k, curves] - s0) / h - t
+    z = np.asarray(x_new, dtype=float) - x[k, curves]
+    return y[k, curves] + s0 * z + c1 * (z * z) + c0 * (z * z * z)
+
+
+class InvalidVariable(Exception):
+    """Custom error raised when a variable is not in the table of Hyades unit conversions"""
+    pass
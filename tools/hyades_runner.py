@@ -3,18 +3,26 @@ import os
 import time
 import shutil
 import logging
+import tempfile
 import subprocess
 
 from tools.excel_writer import write_excel
 
 
-def run_hyades(inf_name, quiet=False):
+def run_hyades(inf_name, quiet=False, snapshot_interval=None, scratch_dir=None):
     """Runs a single Hyades simulation.
 
+    With snapshot_interval, Hyades runs in the background while the output written so far is converted to a snapshot
+    .cdf every snapshot_interval seconds, see snapshot_cdf. The snapshot can be opened with HyadesOutput or
+    view_hyades_GUI.py while the simulation is still running, and HyadesOutput.refresh picks up the newer dumps.
+
     Args:
         inf_name (string): Name of the .inf
         quiet (bool, optional): Toggle to save the terminal output to a text file instead of printing on screen.
                                 This text file is automatically deleted.
+        snapshot_interval (float, optional): Seconds between snapshots of the running simulation.
+                                             Defaults to no snapshots.
+        scratch_dir (string, optional): Directory for the snapshots, see snapshot_cdf
 
     Returns:
         log_string (string): Status and details of Hyades simulation
@@ -27,7 +35,11 @@ def run_hyades(inf_name, quiet=False):
         command = f'hyades {inf_name}'
 
     t0 = time.time()
-    os.system(command)
+    if snapshot_interval is None:
+        os.system(command)
+    else:
+        num_snapshots = monitor_hyades(subprocess.Popen(command, shell=True), inf_name, snapshot_interval,
+                                       scratch_dir=scratch_dir, quiet=quiet)
     t1 = time.time()
 
     if quiet:
@@ -41,10 +53,116 @@ def run_hyades(inf_name, quiet=False):
         log_string = f'Completed Hyades simulation of {os.path.basename(inf_name)} in {t1 - t0:.2f} seconds.'
     else:
         log_string = f'Failed to run Hyades simulation of {os.path.basename(inf_name)}.'
+    if snapshot_interval is not None:
+        log_string += f' Took {num_snapshots} snapshots.'
 
     return log_string
 
 
+def monitor_hyades(process, inf_name, interval, scratch_dir=None, quiet=False):
+    """Take a snapshot of a running Hyades simulation every interval seconds until it finishes
+
+    A snapshot is only taken if the .ppf has grown since the previous one. The staging directory of the snapshots is
+    removed once the simulation finishes.
+
+    Args:
+        process (subprocess.Popen): The running Hyades process
+        inf_name (string): Name of the .inf being run
+        interval (float): Seconds between snapshots
+        scratch_dir (string, optional): Directory for the snapshots, see snapshot_cdf
+        quiet (bool, optional): Toggle to hide the terminal output of PPF2NCDF
+
+    Returns:
+        num_snapshots (int): Number of snapshots taken
+
+    """
+    ppf_name = os.path.splitext(inf_name)[0] + '.ppf'
+    num_snapshots = 0
+    last_stat = None
+    try:
+        while True:
+            try:
+                process.wait(timeout=interval)
+                return num_snapshots
+            except subprocess.TimeoutExpired:
+                pass
+            if not os.path.exists(ppf_name):
+                continue
+            stat = os.stat(ppf_name)
+            if (stat.st_mtime_ns, stat.st_size) == last_stat:
+                continue
+            last_stat = (stat.st_mtime_ns, stat.st_size)
+            snapshot_name = snapshot_cdf(inf_name, scratch_dir=scratch_dir, quiet=quiet)
+            if snapshot_name is not None:
+                num_snapshots += 1
+                logging.info(f'Snapshot {num_snapshots} of {os.path.basename(inf_name)} saved to {snapshot_name}')
+    finally:
+        snapshot_dir, staging_dir = snapshot_paths(inf_name, scratch_dir)
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+
+def snapshot_cdf(inf_name, scratch_dir=None, quiet=True):
+    """Convert the output a running Hyades simulation has written so far into a snapshot .cdf
+
+    Hyades keeps writing to its output files, so they are copied to a staging directory and PPF2NCDF is run on the
+    copies, which are deleted again afterwards. The finished .cdf then replaces the previous snapshot in a single os.replace, so a reader never sees a
+    partially written snapshot. The .inf is copied next to the snapshot so the layers can be read as well.
+    If PPF2NCDF fails, for example because Hyades was in the middle of writing a dump, the previous snapshot is kept.
+
+    Args:
+        inf_name (string): Name of the .inf being run
+        scratch_dir (string, optional): Directory for the snapshots. Each run gets a folder named after it, holding
+                                        the snapshot .cdf and .inf. Defaults to pyhy_snapshots in the temporary
+                                        directory of the system.
+        quiet (bool, optional): Toggle to hide the terminal output of PPF2NCDF
+
+    Returns:
+        snapshot_name (string): Path to the snapshot .cdf, or None if one could not be made
+
+    """
+    inf_dir = os.path.dirname(inf_name)
+    run_name = os.path.basename(os.path.splitext(inf_name)[0])
+    snapshot_dir, staging_dir = snapshot_paths(inf_name, scratch_dir)
+    os.makedirs(staging_dir, exist_ok=True)
+    staged_names = [os.path.join(staging_dir, run_name + ext) for ext in ('.otf', '.ppf', '.tmf', '.cdf')]
+
+    try:
+        copied = False
+        for ext, staged_name in zip(('.otf', '.ppf', '.tmf'), staged_names):
+            source = os.path.join(inf_dir, run_name + ext)
+            if os.path.exists(source):
+                shutil.copyfile(source, staged_name)
+                copied = True
+        if not copied:
+            return None
+        staged_cdf = staged_names[-1]
+        if os.path.exists(staged_cdf):
+            os.remove(staged_cdf)
+        output = subprocess.DEVNULL if quiet else None
+        subprocess.run(f'PPF2NCDF {run_name}', shell=True, cwd=staging_dir, stdout=output, stderr=output)
+        if not os.path.exists(staged_cdf):
+            return None
+
+        shutil.copyfile(os.path.join(inf_dir, run_name + '.inf'), os.path.join(snapshot_dir, run_name + '.inf'))
+        snapshot_name = os.path.join(snapshot_dir, run_name + '.cdf')
+        os.replace(staged_cdf, snapshot_name)
+        return snapshot_name
+    finally:
+        # The staged copies are as large as the run itself, so they are never kept between snapshots
+        for staged_name in staged_names:
+            if os.path.exists(staged_name):
+                os.remove(staged_name)
+
+
+def snapshot_paths(inf_name, scratch_dir=None):
+    """Folder holding the snapshot of a run and the staging folder its output is copied to, see snapshot_cdf"""
+    run_name = os.path.basename(os.path.splitext(inf_name)[0])
+    if scratch_dir is None:
+        scratch_dir = os.path.join(tempfile.gettempdir(), 'pyhy_snapshots')
+    snapshot_dir = os.path.join(scratch_dir, run_name)
+    return snapshot_dir, os.path.join(snapshot_dir, '.staging')
+
+
 def otf2cdf(otf_name, quiet=False):
     """Runs the PPF2NCDF command to convert Hyades output (.otf) to a netcdf (.cdf) file
 
@@ -77,7 +195,7 @@ def otf2cdf(otf_name, quiet=False):
     return log_string
 
 
-def batch_run_hyades(inf_dir, out_dir, excel_variables=[], quiet=False):
+def batch_run_hyades(inf_dir, out_dir, excel_variables=[], quiet=False, snapshot_interval=None, scratch_dir=None):
     """Runs Hyades simulations of many .inf files and packages each output into its own folder.
 
     Note:
@@ -90,6 +208,9 @@ def batch_run_hyades(inf_dir, out_dir, excel_variables=[], quiet=False):
         out_dir (string): Destination directory where all the data will end up
         excel_variables (list, optional): List of abbreviated variable names to copy to excel file
         quiet (bool, optional): Toggle to hide the terminal output during simulation
+        snapshot_interval (float, optional): Seconds between snapshot .cdf files of each running simulation,
+                                             see run_hyades. Defaults to no snapshots.
+        scratch_dir (string, optional): Directory for the snapshots, see snapshot_cdf
 
     Returns:
         None
@@ -108,11 +229,14 @@ def batch_run_hyades(inf_dir, out_dir, excel_variables=[], quiet=False):
     date_format = '%Y-%m-%d %H:%M:%S'
     logging.basicConfig(filename=filename, format=log_format, datefmt=date_format, level=logging.DEBUG)
 
+    if scratch_dir is not None:  # Hyades is run from inf_dir, so a relative scratch_dir would move with it
+        scratch_dir = os.path.abspath(scratch_dir)
     old_directory = os.getcwd()
     for inf in inf_files:
         os.chdir(inf_dir)  # Change to the directory where the file is
         try:
-            log_note = run_hyades(inf, quiet=quiet)  # Run Hyades
+            log_note = run_hyades(inf, quiet=quiet, snapshot_interval=snapshot_interval,
+                                  scratch_dir=scratch_dir)  # Run Hyades
             log_note += ' ' + otf2cdf(inf, quiet=quiet)  # Run PPF2NCDF to create .cdf file and add note to log
         finally:
             os.chdir(old_directory)  # Change back to the original directory
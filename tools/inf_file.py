@@ -0,0 +1,202 @@
+"""Read a Hyades input deck (.inf) once into a structured model
+
+Hyades decks are line based. Every line starts with a keyword, such as mesh, region, EOS, source, tv, pparray, or parm,
+followed by its arguments, and lines starting with c are comments. pyhy also stores its own information in comments,
+for example the materials of each layer with the material of interest marked by ! and the shock material of interest
+marked by $, as in c Simulation of [Diamond] [LiF!$] [Window], and the X-Ray probe times as c xray_probe 3.0 4.0
+
+Example:
+    InfFile.load parses a deck the first time it is requested and returns the same InfFile until the file changes::
+
+        from tools.inf_file import InfFile
+        inf = InfFile.load('./data/diamond_decay/diamond_decay.inf')
+        print(inf.layers, inf.moi, inf.tv, inf.xray_probe, inf.parm['tstop'], inf.pparray)
+
+"""
+import os
+import re
+import threading
+
+
+class InfFile:
+    """Structured model of a Hyades .inf, tokenized in a single pass over the file
+
+    The layers, sources, parm values, and other views of the deck are built from the tokens the first time they are
+    used. InfFile.load memoizes decks by path and modification time, so the same InfFile is shared by every caller.
+    Treat its attributes as read-only.
+
+    Attributes:
+        filename (string): Path to the .inf
+        text (string): Full contents of the .inf
+        cards (list): (keyword, arguments) of every non-comment line, in order. arguments is a list of strings.
+        comments (list): Text of every comment line with the leading c removed
+        materials (list): Bracketed material names, such as '[LiF!$]', in the order they appear in the deck
+        layers (dict): Name, EOS number, mesh properties, and initial positions of each layer
+        moi (string): Material of interest if one is selected, otherwise None
+        shock_moi (string): Shock material of interest if one is selected, otherwise None
+        sources (list): Dictionary of the name, arguments, multiplier, and raw cgs (time, value) pairs of each source
+        tv (dict): All times, in nanoseconds, and values, SI units, for each source input
+        xray_probe (tuple): (xray_start, xray_stop) times in nanoseconds if found, otherwise None
+        parm (dict): Value of every parm line, as a float where possible, keyed by parameter name
+        pparray (list): Names of the variables Hyades was asked to save to the .cdf
+
+    """
+    _memo = {}
+    _memo_lock = threading.Lock()
+
+    def __init__(self, filename):
+        """Read and tokenize a .inf
+
+        Args:
+            filename (string): Name of the .inf (does not require file extension)
+
+        """
+        if filename.endswith('.cdf'):
+            filename = filename[:-4]
+        if not filename.endswith('.inf'):
+            filename += '.inf'
+        self.filename = filename
+        with open(filename) as f:
+            self.text = f.read()
+
+        self.cards = []
+        self.comments = []
+        for line in self.text.splitlines():
+            words = line.split()
+            if not words:
+                continue
+            if words[0] == 'c':
+                self.comments.append(line.strip()[2:])
+            else:
+                self.cards.append((words[0], words[1:]))
+        self.materials = re.findall(r'\[\w+!?\$?\]', self.text)
+        self._layers = None
+        self._sources = None
+
+    @classmethod
+    def load(cls, filename):
+        """Get the InfFile of a .inf, only reading the file if it is new or has changed since it was last read
+
+        Args:
+            filename (string): Name of the .inf (does not require file extension)
+
+        Returns:
+            inf (InfFile)
+
+        """
+        if filename.endswith('.cdf'):
+            filename = filename[:-4]
+        if not filename.endswith('.inf'):
+            filename += '.inf'
+        path = os.path.abspath(filename)
+        stat = os.stat(path)
+        key = (stat.st_mtime_ns, stat.st_size)
+        with cls._memo_lock:
+            if path in cls._memo and cls._memo[path][0] == key:
+                return cls._memo[path][1]
+        inf = cls(filename)
+        with cls._memo_lock:
+            cls._memo[path] = (key, inf)
+        return inf
+
+    def lines(self, keyword):
+        """Arguments of every line starting with keyword, in order"""
+        return [arguments for k, arguments in self.cards if k == keyword]
+
+    @property
+    def layers(self):
+        return self._read_layers()[0]
+
+    @property
+    def moi(self):
+        return self._read_layers()[1]
+
+    @property
+    def shock_moi(self):
+        return self._read_layers()[2]
+
+    def _read_layers(self):
+        """Match the materials to the EOS and mesh lines of each layer"""
+        if self._layers is None:
+            eos_lines = self.lines('EOS')
+            mesh_lines = self.lines('mesh')
+            assert(len(self.materials) == len(eos_lines)), f'Unequal number of material and EOS lines.' \
+                                                           f'\nMaterials: {self.materials}\nEOS: {eos_lines}'
+            assert(len(self.materials) == len(mesh_lines)), f'Unequal number of material and mesh lines' \
+                                                            f'\nMaterials: {self.materials}\nMesh Lines: {mesh_lines}'
+            layers = {}
+            material_of_interest = None
+            shock_material_of_interest = None
+            for i, material in enumerate(self.materials):
+                k = f'layer{i+1}'
+                if '!' in material:
+                    material_of_interest = k
+                if '$' in material:
+                    shock_material_of_interest = k
+                layers[k] = {'Name': material[1:-1].replace('!', '').replace('$', ''),
+                             'EOS': int(eos_lines[i][0]),
+                             'Mesh Start': int(mesh_lines[i][0]),
+                             'Mesh Stop': int(mesh_lines[i][1]),
+                             'X Start': float(mesh_lines[i][2]) * 1e4,  # convert centimeters to microns
+                             'X Stop': float(mesh_lines[i][3]) * 1e4}  # convert centimeters to microns
+            self._layers = (layers, material_of_interest, shock_material_of_interest)
+        return self._layers
+
+    @property
+    def sources(self):
+        """Each source line with its optional sourcem multiplier and tv lines, in the Hyades cgs units"""
+        if self._sources is None:
+            # The format of the .inf files dictates a source line, then an optional sourcem line, then multiple tv lines
+            sources = []
+            sourcem = 1
+            for keyword, arguments in self.cards:
+                if keyword == 'source':
+                    sources.append({'name': arguments[0], 'arguments': arguments[1:], 'multiplier': sourcem, 'tv': []})
+                elif keyword == 'sourcem':
+                    sourcem = float(arguments[0])
+                    if sources:
+                        sources[-1]['multiplier'] = sourcem
+                elif (keyword == 'tv') and sources:
+                    sources[-1]['tv'].append((float(arguments[0]), float(arguments[1])))
+            self._sources = sources
+        return self._sources
+
+    @property
+    def tv(self):
+        tv = {}
+        unit_conversion = 1
+        for source in self.sources:
+            mode = source['name']
+            if mode.lower() == 'pres':
+                unit_conversion = 1e-10
+            elif mode.lower() == 'te':
+                unit_conversion = 11605 * 1000
+            elif mode.lower() == 'laser':  # unsure of laser units, they might depend on Hyades geometry
+                unit_conversion = 1
+            tv[f'{mode}-t'] = [t * 1e9 for t, v in source['tv']]  # convert seconds to nanoseconds
+            # apply source multiplier and convert to SI units
+            tv[f'{mode}-v'] = [v * source['multiplier'] * unit_conversion for t, v in source['tv']]
+        return tv
+
+    @property
+    def xray_probe(self):
+        for comment in self.comments:
+            words = comment.split()
+            if (len(words) >= 3) and (words[0] == 'xray_probe'):
+                return float(words[1]), float(words[2])
+        return None
+
+    @property
+    def parm(self):
+        parm = {}
+        for arguments in self.lines('parm'):
+            value = ' '.join(arguments[1:])
+            try:
+                parm[arguments[0]] = float(value)
+            except ValueError:
+                parm[arguments[0]] = value
+        return parm
+
+    @property
+    def pparray(self):
+        return [variable for arguments in self.lines('pparray') for variable in arguments]
@@ -0,0 +1,192 @@
+"""Per-layer quantities of a Hyades simulation extracted in a single pass over the run
+
+The boundaries of the layers are the left free surface, every interface between two layers, and the right free
+surface. Each one sits on a single Mesh point for the whole simulation, so its Eulerian position and velocity
+history are single columns of R and U. trajectories reads only those columns and caches them on the run, so plots,
+animations, and the optimizer all share one copy.
+
+layer_stats summarizes a variable inside each layer over a window of time, such as the X-Ray probe, reading only the
+block of the variable it needs and memoizing the results on the run.
+
+Example:
+    Plot the velocity of the rear surface of the material of interest::
+
+        from tools.hyades_reader import HyadesRun
+        from tools.layer_analysis import trajectories
+        run = HyadesRun('./data/diamond_decay')
+        paths = trajectories(run)
+        rear = run.layer_table.moi + 1  # the boundary after a layer is its rear surface
+        plt.plot(paths['time'], paths['velocity'][:, rear], label=paths['names'][rear])
+
+    Average pressure and middle 50% of every layer during the X-Ray probe::
+
+        stats = layer_stats(run, 'Pres', time_window='xray', stats=['mean', 'p25', 'p75'])
+        print(dict(zip(run.layer_table['name'], stats['mean'])))
+
+"""
+import hashlib
+import numpy as np
+from tools.hyades_reader import HyadesRun, HyadesOutput
+
+
+def trajectories(run):
+    """Eulerian position and velocity history of both free surfaces and every interface between layers
+
+    Boundary 0 is the left free surface, boundary i is the interface between layer i - 1 and layer i, and the last
+    boundary is the right free surface, so layer i lies between boundaries i and i + 1.
+    Only one column of R and U is read for each boundary, and the result is memoized on the run and in the
+    process-wide variable_cache, so every caller after the first shares the same arrays.
+
+    Args:
+        run (string, HyadesRun, or HyadesOutput): Name of the run, or an existing run or output of it
+
+    Returns:
+        trajectories (dict): With the keys
+            time (numpy array): Times of the simulation in nanoseconds
+            names (list): Name of each boundary, such as 'Left Free Surface', 'Diamond | LiF', 'Right Free Surface'
+            mesh_index (numpy array): 0-indexed Mesh point of each boundary
+            position (numpy array): Eulerian position in microns, with one row per time and one column per boundary
+            velocity (numpy array): Particle velocity in kilometers per second, the same shape as position
+
+    """
+    if isinstance(run, HyadesOutput):
+        run = run.run
+    elif not isinstance(run, HyadesRun):
+        run = HyadesRun(run)
+    layer_table = run.layer_table
+    mesh_index = np.append(layer_table['mesh_start'][:1], layer_table['mesh_stop']) - 1  # Python 0-indexing
+    names = ['Left Free Surface'] + [f'{left} | {right}' for left, right in
+                                     zip(layer_table['name'][:-1], layer_table['name'][1:])] + ['Right Free Surface']
+
+    def read_columns(var):
+        columns = [run.read(var, slice(None), slice(i, i + 1)) for i in mesh_index]
+        return np.hstack([np.asarray(column) for column in columns])
+
+    return {'time': run.time,
+            'names': names,
+            'mesh_index': mesh_index,
+            'position': run._load('Trajectory R', lambda: read_columns('R')),
+            'velocity': run._load('Trajectory U', lambda: read_columns('U'))}
+
+
+def layer_stats(run, var, layers=None, time_window=None, stats=('mean', 'std', 'p25', 'p75', 'max'), per_time=False):
+    """Statistics of a variable inside each layer over a window of time
+
+    Each Mesh point or Zone belongs to the layer given by the LayerTable of the run. Only the rows in the time window
+    and the columns spanning the requested layers are read, and every statistic of a layer is computed from that one
+    block, with all percentiles found by a single np.percentile. Results are memoized on the run and in the
+    process-wide variable_cache, keyed by the variable, layers, time window, and per_time.
+
+    Args:
+        run (string, HyadesRun, or HyadesOutput): Name of the run, or an existing run or output of it
+        var (string): Abbreviated name of a 2D variable on the Mesh or Zone grid, such as Pres, Rho, U, or Te
+        layers (list, optional): Layer indices or keys, such as [1] or ['layer2']. Defaults to every layer.
+        time_window (tuple or string, optional): (start_time, stop_time) in nanoseconds, including both end points,
+                                                 or 'xray' for the X-Ray probe times of the run. Defaults to all times.
+        stats (list, optional): Any of mean, std, min, max, median, and pNN for the NN-th percentile, such as p25
+        per_time (bool, optional): Toggle to compute the statistics across each layer separately at every time in
+                                   the window, instead of over the whole window
+
+    Returns:
+        stats (dict): One array per statistic with one entry per layer, or with one row per time in the window and
+                      one column per layer if per_time
+
+    """
+    if isinstance(run, HyadesOutput):
+        run = run.run
+    elif not isinstance(run, HyadesRun):
+        run = HyadesRun(run)
+    var = var.capitalize()
+    dimensions = run.dimensions(var)
+    if (len(dimensions) != 2) or (dimensions[1] not in ('NumMeshs', 'NumZones')):
+        raise ValueError(f'Layer statistics need a 2D variable on the Mesh or Zone grid. {var} has {dimensions}')
+    if isinstance(stats, str):
+        stats = [stats]
+    parse_percentiles(stats)
+
+    layer_table = run.layer_table
+    if layers is None:
+        layers = range(len(layer_table))
+    elif isinstance(layers, (int, np.integer, str)):
+        layers = [layers]
+    layers = [layer_table.index(layer) if isinstance(layer, str) else int(layer) for layer in layers]
+    if isinstance(time_window, str):
+        if time_window.lower() != 'xray':
+            raise ValueError(f'Unrecognized time window {time_window!r}. Use (start_time, stop_time) or xray')
+        if run.xray_probe is None:
+            raise ValueError(f'{run.run_name} does not have X-Ray probe times in its .inf')
+        time_window = run.xray_probe
+    time_slice = run.time_slice(time_window)
+    zone_centered = dimensions[1] == 'NumZones'
+    layer_slices = [layer_table.slice(layer, zone_centered) for layer in layers]
+
+    key = repr((layers, time_slice.start, time_slice.stop, per_time))
+    digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+    results = {}
+
+    def compute():
+        """Every requested statistic of every layer, from one read of the block spanning the layers"""
+        if results:
+            return results
+        start = min(layer_slice.start for layer_slice in layer_slices)
+        stop = max(layer_slice.stop for layer_slice in layer_slices)
+        block = np.asarray(run.read(var, time_slice, slice(start, stop)))
+        values = {stat: [] for stat in stats}
+        for layer_slice in layer_slices:
+            layer_block = block[:, layer_slice.start - start:layer_slice.stop - start]
+            for stat, value in block_stats(layer_block, stats, per_time).items():
+                values[stat].append(value)
+        for stat in stats:
+            results[stat] = np.stack(values[stat], axis=-1)
+        return results
+
+    return {stat: run._load(f'Layer {stat} {var} {digest}', lambda stat=stat: compute()[stat]) for stat in stats}
+
+
+def block_stats(block, stats=('mean', 'std', 'p25', 'p75', 'max'), per_time=False):
+    """Statistics of a block of a variable that is already in memory, as computed by layer_stats for each layer
+
+    Args:
+        block (numpy array): Values with one row per time, such as the values of one layer read by HyadesRun.read
+        stats (list, optional): Any of mean, std, min, max, median, and pNN for the NN-th percentile, such as p25
+        per_time (bool, optional): Toggle to compute the statistics across each row separately
+
+    Returns:
+        stats (dict): One value per statistic, or one array with a value per row if per_time
+
+    """
+    if isinstance(stats, str):
+        stats = [stats]
+    percentiles = parse_percentiles(stats)
+    block = np.asarray(block)
+    axis = 1 if per_time else None
+    if not per_time:
+        block = block.ravel()
+    values = {}
+    if 'mean' in stats:
+        values['mean'] = block.mean(axis=axis)
+    if 'std' in stats:
+        values['std'] = block.std(axis=axis)
+    if 'min' in stats:
+        values['min'] = block.min(axis=axis)
+    if 'max' in stats:
+        values['max'] = block.max(axis=axis)
+    if 'median' in stats:
+        values['median'] = np.median(block, axis=axis)
+    if percentiles:  # every percentile from a single np.percentile
+        values.update(zip(percentiles, np.percentile(block, list(percentiles.values()), axis=axis)))
+    return {stat: values[stat] for stat in stats}
+
+
+def parse_percentiles(stats):
+    """Percentile of each pNN statistic, such as {'p25': 25.0}. Raises ValueError on unrecognized statistics."""
+    percentiles = {}
+    for stat in stats:
+        if stat.startswith('p'):
+            try:
+                percentiles[stat] = float(stat[1:])
+            except ValueError:
+                raise ValueError(f'Unrecognized statistic {stat!r}. Use mean, std, min, max, median, or pNN')
+        elif stat not in ('mean', 'std', 'min', 'max', 'median'):
+            raise ValueError(f'Unrecognized statistic {stat!r}. Use mean, std, min, max, median, or pNN')
+    return percentiles
@@ -0,0 +1,322 @@
+"""Compressed, time-chunked archive of a Hyades .cdf
+
+A pyhy store is a directory next to the run, named after it with a .pyhy extension, that holds every variable of the
+.cdf split into blocks of consecutive dumps. Each block is byte-shuffled and compressed with zlib or lzma, and a small
+index.json describes the dimensions, shape, dtype, units, and blocks of every variable::
+
+    data/diamond_decay/
+        diamond_decay.inf
+        diamond_decay.pyhy/
+            index.json
+            Pres/000000.zlib
+            Pres/000001.zlib
+            ...
+
+HyadesRun reads a pyhy store transparently when the .cdf of a run is missing, so runs can be archived with
+convert_run(..., delete_cdf=True) and still be plotted and analyzed with HyadesOutput.
+Reading a window of dumps only decompresses the blocks that overlap the window.
+
+Example:
+    Convert a run from the command line, verify the store, and delete the .cdf::
+
+        $ python tools/pyhy_store.py data/diamond_decay --compression lzma --delete-cdf
+
+    Or from python::
+
+        from tools.pyhy_store import convert_run
+        store_name = convert_run('./data/diamond_decay', compression='lzma', delete_cdf=True)
+
+"""
+import os
+import json
+import lzma
+import zlib
+import shutil
+import argparse
+import numpy as np
+from scipy.io import netcdf
+
+FORMAT_VERSION = 1
+COMPRESSORS = {'zlib': (lambda buffer, level: zlib.compress(buffer, 6 if level is None else level),
+                        zlib.decompress),
+               'lzma': (lambda buffer, level: lzma.compress(buffer, preset=6 if level is None else level),
+                        lzma.decompress)}
+
+
+def shuffle(array):
+    """Group the bytes of every element by significance, which makes floating point data far more compressible"""
+    array = np.ascontiguousarray(array)
+    return array.view(np.uint8).reshape(-1, array.dtype.itemsize).T.tobytes()
+
+
+def unshuffle(buffer, dtype, shape):
+    """Inverse of shuffle, converted to the native byte order"""
+    dtype = np.dtype(dtype)
+    raw = np.frombuffer(buffer, dtype=np.uint8).reshape(dtype.itemsize, -1).T
+    return np.ascontiguousarray(raw).view(dtype).reshape(shape).astype(dtype.newbyteorder('='), copy=False)
+
+
+def store_path(filename):
+    """Path to the pyhy store of a run, given the run directory or the name of its .inf, .cdf, or .pyhy"""
+    if filename.endswith('.pyhy') or os.path.isfile(os.path.join(filename, 'index.json')):
+        return filename
+    if os.path.isdir(filename):
+        dir_name = filename
+        run_name = os.path.basename(os.path.normpath(filename))
+    else:
+        dir_name = os.path.dirname(filename)
+        run_name = os.path.splitext(os.path.basename(filename))[0]
+    return os.path.join(dir_name, run_name + '.pyhy')
+
+
+def convert_run(filename, compression='zlib', level=None, chunk_bytes=2 ** 20, verify=True, delete_cdf=False):
+    """Convert the .cdf of a Hyades run into a pyhy store
+
+    The store is written to a temporary directory and only moved into place once it is complete, replacing any
+    existing store of the run.
+
+    Args:
+        filename (string): Name of the run directory, or of its .inf or .cdf
+        compression (string, optional): Either 'zlib' or 'lzma'. lzma is smaller and slower to read.
+        level (int, optional): Compression level passed to zlib (0-9) or lzma (preset 0-9). Defaults to 6.
+        chunk_bytes (int, optional): Approximate uncompressed size of each block. Smaller blocks make reads of short
+                                     time windows cheaper at the cost of a slightly worse compression ratio.
+        verify (bool, optional): Toggle to read the store back and compare every variable to the .cdf
+        delete_cdf (bool, optional): Toggle to delete the .cdf once the store is written and verified
+
+    Returns:
+        store_name (string): Path to the new .pyhy directory
+
+    """
+    if compression not in COMPRESSORS:
+        raise ValueError(f'Unknown compression {compression!r}. Options are {list(COMPRESSORS)}')
+    if delete_cdf and not verify:
+        raise ValueError('Refusing to delete the .cdf without verifying the pyhy store')
+    store_name = store_path(filename)
+    cdf_name = os.path.splitext(store_name)[0] + '.cdf'
+    if not os.path.isfile(cdf_name):
+        raise Exception(f'Could not find {cdf_name}')
+    compress = COMPRESSORS[compression][0]
+
+    temporary_name = f'{store_name}.{os.getpid()}.tmp'
+    shutil.rmtree(temporary_name, ignore_errors=True)
+    os.makedirs(temporary_name)
+    index = {'format': 'pyhy', 'version': FORMAT_VERSION, 'run_name': os.path.basename(os.path.splitext(cdf_name)[0]),
+             'compression': compression, 'shuffle': True, 'variables': {}}
+    cdf = netcdf.netcdf_file(cdf_name, 'r', mmap=True)
+    try:
+        for name, variable in cdf.variables.items():
+            data = variable.data
+            info = {'dimensions': list(variable.dimensions),
+                    'shape': list(data.shape),
+                    'dtype': data.dtype.str,
+                    'long_name': variable.long_name.decode('utf-8') if hasattr(variable, 'long_name') else '',
+                    'units': variable.units.decode('utf-8') if hasattr(variable, 'units') else '',
+                    'chunk_size': None,
+                    'chunks': []}
+            if data.ndim > 0 and variable.dimensions[0] == 'NumDumps':  # Only the time dimension is split into blocks
+                row_bytes = max(1, data[:1].nbytes)
+                info['chunk_size'] = max(1, int(chunk_bytes // row_bytes))
+                starts = range(0, len(data), info['chunk_size'])
+            else:
+                starts = [None]
+            os.makedirs(os.path.join(temporary_name, name))
+            for i, start in enumerate(starts):
+                chunk_name = os.path.join(name, f'{i:06d}.{compression}')
+                block = data if start is None else data[start:start + info['chunk_size']]
+                with open(os.path.join(temporary_name, chunk_name), 'wb') as f:
+                    f.write(compress(shuffle(block), level))
+                info['chunks'].append(chunk_name)
+            variable = data = block = None  # the .cdf cannot be closed cleanly while views of it exist
+            index['variables'][name] = info
+    finally:
+        cdf.close()
+    with open(os.path.join(temporary_name, 'index.json'), 'w') as f:
+        json.dump(index, f, indent=1)
+
+    if verify:
+        verify_store(temporary_name, cdf_name)
+    shutil.rmtree(store_name, ignore_errors=True)
+    os.replace(temporary_name, store_name)
+    if delete_cdf:
+        os.remove(cdf_name)
+    return store_name
+
+
+def verify_store(store_name, cdf_name):
+    """Raise a StoreMismatch if any variable in the pyhy store differs from the .cdf"""
+    store = PyhyStore(store_name)
+    cdf = netcdf.netcdf_file(cdf_name, 'r', mmap=False)
+    try:
+        if set(store.variables) != set(cdf.variables):
+            raise StoreMismatch(f'{store_name} and {cdf_name} do not have the same variables')
+        for name, variable in cdf.variables.items():
+            stored = store.variables[name].data
+            if (stored.shape != variable.data.shape) or \
+                    (stored.astype(variable.data.dtype).tobytes() != variable.data.tobytes()):
+                raise StoreMismatch(f'{name!r} in {store_name} does not match {cdf_name}')
+    finally:
+        cdf.close()
+
+
+def size_on_disk(path):
+    """Total size in bytes of a file, or of every file inside a directory"""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, f)) for root, dirs, files in os.walk(path) for f in files)
+
+
+class StoreVariable:
+    """A variable in a pyhy store that decompresses blocks of dumps on demand
+
+    Indexing a StoreVariable works like indexing a numpy array. Only the blocks containing the requested dumps are
+    decompressed, and the most recently used block is kept so consecutive lineouts do not decompress it again.
+    Mirrors the parts of scipy.io.netcdf.netcdf_variable used by HyadesRun.
+
+    Attributes:
+        name (string): Abbreviated name of the variable
+        dimensions (tuple): Names of the netcdf dimensions, such as ('NumDumps', 'NumZones')
+        shape (tuple): Shape of the full variable
+        dtype (numpy dtype): Data type of the variable in native byte order. The .cdf is always big-endian.
+        long_name (bytes): Full name of the variable according to Hyades
+        units (bytes): cgs units of the variable according to Hyades
+        chunk_size (int): Number of dumps per block, or None if the variable is stored as a single block
+
+    """
+    def __init__(self, store, name, info):
+        self.store = store
+        self.name = name
+        self.dimensions = tuple(info['dimensions'])
+        self.shape = tuple(info['shape'])
+        self.stored_dtype = np.dtype(info['dtype'])
+        self.dtype = self.stored_dtype.newbyteorder('=')
+        self.long_name = info['long_name'].encode('utf-8')
+        self.units = info['units'].encode('utf-8')
+        self.chunk_size = info['chunk_size']
+        self.chunks = info['chunks']
+        self._last_chunk = (None, None)
+
+    def __len__(self):
+        return self.shape[0]
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    def typecode(self):
+        """Character code of the data type, like netcdf_variable.typecode"""
+        return self.stored_dtype.char
+
+    @property
+    def data(self):
+        """The entire variable decompressed into memory"""
+        if self.chunk_size is None:
+            return self.read_chunk(0)
+        return self[:]
+
+    def read_chunk(self, i):
+        """Decompress the i-th block of dumps of the variable"""
+        if self._last_chunk[0] == i:
+            return self._last_chunk[1]
+        with open(os.path.join(self.store.store_name, self.chunks[i]), 'rb') as f:
+            buffer = self.store.decompress(f.read())
+        if self.chunk_size is None:
+            shape = self.shape
+        else:
+            shape = (min(self.chunk_size, self.shape[0] - i * self.chunk_size),) + self.shape[1:]
+        block = unshuffle(buffer, self.stored_dtype, shape)
+        block.flags.writeable = False
+        self._last_chunk = (i, block)
+        return block
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key,)
+        if (self.chunk_size is None) or (len(key) == 0) or not isinstance(key[0], (int, np.integer, slice)):
+            return self.data[key]
+        rows = np.arange(self.shape[0])[key[0]]
+        scalar = rows.ndim == 0
+        rows = np.atleast_1d(rows)
+        if len(rows) == 0:
+            return np.empty((0,) + self.shape[1:], dtype=self.dtype)[(slice(None),) + key[1:]]
+        # Rows are sorted, so the rows in each block are contiguous and blocks are visited in order
+        chunk_ids = rows // self.chunk_size
+        breaks = np.flatnonzero(np.diff(chunk_ids)) + 1
+        pieces = [self.read_chunk(int(chunk_ids[group[0]]))[rows[group] % self.chunk_size]
+                  for group in np.split(np.arange(len(rows)), breaks)]
+        output = np.concatenate(pieces)
+        if scalar:
+            return output[0][key[1:]]
+        return output[(slice(None),) + key[1:]]
+
+
+class PyhyStore:
+    """Read-only access to a pyhy store with the same interface HyadesRun uses on an open .cdf
+
+    Args:
+        store_name (string): Path to the .pyhy directory, or to the run it belongs to
+
+    Attributes:
+        store_name (string): Path to the .pyhy directory
+        index_name (string): Path to the index.json describing the store
+        compression (string): Compression used for every block, either 'zlib' or 'lzma'
+        variables (dict): StoreVariable of every variable in the original .cdf, keyed by name
+
+    """
+    def __init__(self, store_name):
+        self.store_name = store_path(store_name)
+        self.index_name = os.path.join(self.store_name, 'index.json')
+        if not os.path.isfile(self.index_name):
+            raise Exception(f'Could not find a pyhy store at {self.store_name}')
+        with open(self.index_name) as f:
+            index = json.load(f)
+        if index.get('format') != 'pyhy' or index.get('version', 0) > FORMAT_VERSION:
+            raise Exception(f'{self.index_name} is not a pyhy store this version of pyhy can read')
+        self.compression = index['compression']
+        self.decompress = COMPRESSORS[self.compression][1]
+        self.variables = {name: StoreVariable(self, name, info) for name, info in index['variables'].items()}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Nothing is held open between reads. Present so a PyhyStore can be used wherever a netcdf_file is."""
+        pass
+
+
+class StoreMismatch(Exception):
+    """Raised when a pyhy store does not reproduce the .cdf it was converted from"""
+    pass
+
+
+if __name__ == '__main__':
+    description = '''Convert the .cdf of Hyades runs into compressed, time-chunked pyhy stores.
+
+Examples:
+    Convert a run and report the size of the .cdf and the new store:
+        $ python tools/pyhy_store.py data/diamond_decay
+    Use the smaller lzma compression and delete the .cdf once the store has been verified:
+        $ python tools/pyhy_store.py data/diamond_decay data/diamond_ramp --compression lzma --delete-cdf
+'''
+    parser = argparse.ArgumentParser(prog='pyhy_store.py', description=description,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('runs', nargs='+', help='Run directories, or the .inf or .cdf of each run')
+    parser.add_argument('-c', '--compression', choices=list(COMPRESSORS), default='zlib',
+                        help='Compression applied to each block (default zlib)')
+    parser.add_argument('-l', '--level', type=int, help='Compression level, 0-9 (default 6)')
+    parser.add_argument('--chunk_bytes', type=int, default=2 ** 20,
+                        help='Approximate uncompressed size of each block in bytes (default 1 MiB)')
+    parser.add_argument('--delete-cdf', action='store_true', help='Delete each .cdf after its store is verified')
+    args = parser.parse_args()
+
+    for run in args.runs:
+        cdf_name = os.path.splitext(store_path(run))[0] + '.cdf'
+        cdf_size = size_on_disk(cdf_name) if os.path.isfile(cdf_name) else 0
+        store_name = convert_run(run, compression=args.compression, level=args.level, chunk_bytes=args.chunk_bytes,
+                                 delete_cdf=args.delete_cdf)
+        store_size = size_on_disk(store_name)
+        print(f'{cdf_name} ({cdf_size / 1e6:.1f} MB) -> {store_name} ({store_size / 1e6:.1f} MB, '
+              f'{cdf_size / max(store_size, 1):.1f}x smaller)')
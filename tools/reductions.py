@@ -0,0 +1,314 @@
+"""Reduce variables of Hyades runs too large to load, such as peak Pressure per Zone or total energy versus time
+
+reduce_variable walks a variable through its .cdf in blocks of dumps and keeps only running results, like the
+highest value each Zone reached and the dump where it happened, or the integral over the grid at each dump.
+The blocks are sized to a memory budget and read from a memory map whose pages are released after each block,
+so a 20 GB variable is reduced in the same amount of memory as a 20 MB one. reduce_runs does the same for many
+runs in parallel threads, sharing one memory budget between them.
+
+Example:
+    Peak Pressure of every Zone and when it was reached, and the total energy in the run versus time::
+
+        from tools.reductions import reduce_variable, reduce_runs
+        peak = reduce_variable('./data/diamond_decay', 'Pres', ['max', 'time_of_max'])
+        plt.plot(peak['x'], peak['max'])
+
+        ion = reduce_variable('./data/diamond_decay', 'Eion', 'integral')
+        electron = reduce_variable('./data/diamond_decay', 'Eelc', 'integral')
+        plt.plot(ion['time'], ion['integral'] + electron['integral'])
+
+    Peak Pressure of every run in a parameter sweep, using at most 1 GB::
+
+        paths = [os.path.join('./data/sweep', d) for d in sorted(os.listdir('./data/sweep'))]
+        results, errors = reduce_runs(paths, 'Pres', 'max', memory_budget=2 ** 30)
+        print([result['max'].max() for result in results if result])
+
+"""
+import os
+import mmap
+import hashlib
+import concurrent.futures
+import numpy as np
+from tools.hyades_reader import HyadesRun, HyadesOutput, derived_variables
+
+MEMORY_BUDGET = 2 ** 28  # bytes of temporaries used while reducing one variable, 256 MB
+TIME_REDUCTIONS = ('max', 'min', 'argmax', 'argmin', 'time_of_max', 'time_of_min', 'sum', 'mean', 'time_integral')
+SPACE_REDUCTIONS = ('integral',)
+
+
+def reduce_variable(run, var, reductions=('max', 'time_of_max'), weights=None, time_range=None, x_range=None,
+                    time_stride=1, memory_budget=MEMORY_BUDGET):
+    """Reduce a variable over time or over the grid in a single streaming pass with bounded memory
+
+    Reductions over time have one value per Mesh point or Zone:
+        max, min: Highest and lowest value reached
+        argmax, argmin: Index of the first dump reaching the max or min, into run.time
+        time_of_max, time_of_min: Time of that dump in nanoseconds
+        sum, mean: Sum and mean over the dumps
+        time_integral: Trapezoidal integral over time, in the units of var times nanoseconds, such as an impulse
+    Reductions over the grid have one value per dump:
+        integral: Sum over the Mesh points or Zones of the variable times the weights
+
+    Every reduction is computed from the same pass over the variable, and each result is memoized on the run and in
+    the process-wide variable_cache, keyed by the variable, reductions, weights, and slices.
+
+    Args:
+        run (string, HyadesRun, or HyadesOutput): Name of the run, or an existing run or output of it
+        var (string): Abbreviated name of a 2D variable on the Mesh or Zone grid saved by Hyades, such as Pres or Eion
+        reductions (string or list, optional): Any of the reductions above
+        weights (string or numpy array, optional): Weights of the integral. 'mass' for the areal mass of each Zone in
+                                                   g/cm^2, which stays constant in a Lagrangian run, the abbreviated
+                                                   name of a variable with the same dimensions as var, read alongside
+                                                   it, or an array with one weight per Mesh point or Zone.
+                                                   Defaults to 1 for every Mesh point or Zone.
+        time_range (tuple or slice, optional): Times or dumps to reduce over, see HyadesRun.time_slice
+        x_range (tuple or slice, optional): Lagrangian positions or indices to reduce over, see HyadesRun.x_slice
+        time_stride (int, optional): Only use every time_stride-th dump
+        memory_budget (int, optional): Approximate number of bytes of temporaries used at once
+
+    Returns:
+        reduced (dict): One array per reduction, along with the keys
+            time (numpy array): Times of the dumps reduced over in nanoseconds
+            x (numpy array): Lagrangian positions of the Mesh points or Zones reduced over in microns
+            long_name (string), units (string): Full name and SI units of var
+
+    """
+    if isinstance(run, HyadesOutput):
+        run = run.run
+    elif not isinstance(run, HyadesRun):
+        run = HyadesRun(run, mmap=True)
+    var = var.capitalize()
+    if var in derived_variables:
+        raise ValueError(f'{var} is a derived variable, which cannot be streamed. Reduce its inputs '
+                         f'{derived_variables[var].inputs} instead')
+    dimensions = run.dimensions(var)
+    if (len(dimensions) != 2) or (dimensions[1] not in ('NumMeshs', 'NumZones')):
+        raise ValueError(f'Only 2D variables on the Mesh or Zone grid can be reduced. {var} has {dimensions}')
+    if isinstance(reductions, str):
+        reductions = [reductions]
+    for reduction in reductions:
+        if reduction not in TIME_REDUCTIONS + SPACE_REDUCTIONS:
+            raise ValueError(f'Unrecognized reduction {reduction!r}. Use any of '
+                             f'{", ".join(TIME_REDUCTIONS + SPACE_REDUCTIONS)}')
+
+    time_slice = run.time_slice(time_range, time_stride)
+    x_slice = run.x_slice(var, x_range)
+    rows = np.arange(run.header[var]['shape'][0])[time_slice]
+    columns = np.arange(run.header[var]['shape'][1])[x_slice]
+    if len(rows) == 0:
+        raise ValueError(f'There are no dumps of {run.run_name} in the time range {time_range}')
+    if isinstance(weights, str) and (weights.lower() == 'mass'):
+        if dimensions[1] != 'NumZones':
+            raise ValueError(f'Mass weights need a variable on the Zone grid. {var} has {dimensions}')
+        weights = zone_mass(run)[x_slice]
+    elif isinstance(weights, str):
+        weights = weights.capitalize()
+        if run.dimensions(weights) != dimensions:
+            raise ValueError(f'The weights {weights} have dimensions {run.dimensions(weights)}, '
+                             f'but {var} has {dimensions}')
+    elif weights is not None:
+        weights = np.asarray(weights, dtype=float)
+        if weights.shape != columns.shape:
+            raise ValueError(f'Expected one weight per Mesh point or Zone, {columns.shape}, '
+                             f'but the weights have shape {weights.shape}')
+
+    weights_key = weights if isinstance(weights, (str, type(None))) else hashlib.sha1(weights.tobytes()).hexdigest()
+    key = repr((sorted(reductions), weights_key, time_slice.start, time_slice.stop, time_slice.step,
+                x_slice.start, x_slice.stop, x_slice.step))
+    digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+    results = {}
+
+    def compute():
+        """Every requested reduction, from one pass over the variable in blocks of dumps"""
+        if results:
+            return results
+        results.update(stream(run, var, reductions, rows, x_slice, len(columns), weights, memory_budget))
+        return results
+
+    reduced = {reduction: run._load(f'Reduction {reduction} {var} {digest}', lambda reduction=reduction:
+                                    compute()[reduction]) for reduction in reductions}
+    long_name, units, unit_conversion = run.variable_info(var)
+    reduced.update({'time': run.time[rows],
+                    'x': np.asarray(run.read_coordinates(var, slice(0, 1), x_slice)[0]),
+                    'long_name': long_name,
+                    'units': units})
+    return reduced
+
+
+def reduce_runs(paths, var, reductions=('max', 'time_of_max'), max_workers=None, memory_budget=MEMORY_BUDGET,
+                **kwargs):
+    """Reduce the same variable of many Hyades runs concurrently with a pool of threads
+
+    The memory budget is shared by the workers, so the whole batch uses about memory_budget bytes of temporaries no
+    matter how many runs are reduced at once. A run that fails is reported in errors and does not stop the batch.
+
+    Args:
+        paths (list): Names of the runs, or HyadesRuns
+        var (string): Abbreviated name of a 2D variable on the Mesh or Zone grid saved by Hyades
+        reductions (string or list, optional): Any of the reductions of reduce_variable
+        max_workers (int, optional): Maximum number of runs reduced at once. Defaults to the ThreadPoolExecutor
+                                     default.
+        memory_budget (int, optional): Approximate number of bytes of temporaries used by all the workers together
+        **kwargs: weights, time_range, x_range, and time_stride are passed on to every reduce_variable
+
+    Returns:
+        results (list): The dictionary returned by reduce_variable for each run, in the same order as paths.
+                        Runs that failed have an empty dictionary.
+        errors (list): (path, exception) of every run that failed, in the same order as paths
+
+    """
+    paths = list(paths)
+    num_workers = max_workers or min(32, (os.cpu_count() or 1) + 4)  # the ThreadPoolExecutor default
+    worker_budget = memory_budget // max(1, min(num_workers, len(paths)))
+
+    def reduce_run(path):
+        run = None
+        try:
+            run = path if isinstance(path, HyadesRun) else HyadesRun(path, mmap=True)
+            return reduce_variable(run, var, reductions, memory_budget=worker_budget, **kwargs), None
+        except Exception as e:
+            return {}, (path, e)
+        finally:
+            if run is not None:
+                run.close()  # also when the reduction failed, so no .cdf stays open until garbage collection
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        outcomes = list(executor.map(reduce_run, paths))
+    results = [result for result, error in outcomes]
+    errors = [error for result, error in outcomes if error is not None]
+    return results, errors
+
+
+def stream(run, var, reductions, rows, x_slice, num_columns, weights, memory_budget):
+    """Accumulate the reductions over blocks of the rows of var, see reduce_variable"""
+    var_blocks = blocks(run, var, rows, x_slice, num_columns, memory_budget)
+    weight_blocks = blocks(run, weights, rows, x_slice, num_columns, memory_budget) \
+        if isinstance(weights, str) else None
+    try:
+        return accumulate(run, reductions, rows, num_columns, weights, var_blocks, weight_blocks)
+    finally:
+        # Closing the generators unmaps the .cdf right away, even if a reduction raised part way through
+        var_blocks.close()
+        if weight_blocks is not None:
+            weight_blocks.close()
+
+
+def accumulate(run, reductions, rows, num_columns, weights, var_blocks, weight_blocks):
+    """Running reductions over the blocks of var, and of the weights if they are a variable, see stream"""
+    num_rows = len(rows)
+    need_max = {'max', 'argmax', 'time_of_max'} & set(reductions)
+    need_min = {'min', 'argmin', 'time_of_min'} & set(reductions)
+    need_sum = {'sum', 'mean'} & set(reductions)
+    highest = np.full(num_columns, -np.inf)
+    lowest = np.full(num_columns, np.inf)
+    argmax = np.zeros(num_columns, dtype=int)
+    argmin = np.zeros(num_columns, dtype=int)
+    total = np.zeros(num_columns)
+    time_integral = np.zeros(num_columns)
+    integral = np.zeros(num_rows)
+    time = run.time[rows]
+    previous = None  # last dump of the previous block, for the trapezoid spanning two blocks
+    column_index = np.arange(num_columns)
+
+    for start, block in var_blocks:
+        stop = start + len(block)
+        if need_max:
+            block_argmax = block.argmax(axis=0)
+            block_max = block[block_argmax, column_index]
+            higher = block_max > highest  # strictly higher, so the first dump reaching the max is kept
+            highest[higher] = block_max[higher]
+            argmax[higher] = block_argmax[higher] + start
+        if need_min:
+            block_argmin = block.argmin(axis=0)
+            block_min = block[block_argmin, column_index]
+            lower = block_min < lowest
+            lowest[lower] = block_min[lower]
+            argmin[lower] = block_argmin[lower] + start
+        if need_sum:
+            total += block.sum(axis=0)
+        if 'time_integral' in reductions:
+            if previous is not None:
+                time_integral += (time[start] - time[start - 1]) * (previous + block[0]) / 2
+            if len(block) > 1:
+                time_integral += np.diff(time[start:stop]) @ (block[1:] + block[:-1]) / 2
+            previous = block[-1].copy()
+        if 'integral' in reductions:
+            if weight_blocks is not None:
+                integral[start:stop] = np.einsum('ij,ij->i', block, next(weight_blocks)[1])
+            elif weights is not None:
+                integral[start:stop] = block @ weights
+            else:
+                integral[start:stop] = block.sum(axis=1)
+
+    reduced = {'max': highest, 'min': lowest, 'argmax': rows[argmax], 'argmin': rows[argmin],
+               'time_of_max': run.time[rows[argmax]], 'time_of_min': run.time[rows[argmin]],
+               'sum': total, 'mean': total / max(num_rows, 1), 'time_integral': time_integral, 'integral': integral}
+    return {reduction: reduced[reduction] for reduction in reductions}
+
+
+def blocks(run, var, rows, x_slice, num_columns, memory_budget):
+    """Consecutive blocks of the rows of var converted to SI units, with the position of each block in rows
+
+    Each block holds as many rows as fit in a quarter of the memory budget, leaving room for the temporaries of the
+    reductions. The .cdf is read through a memory map private to this generator, and the pages under each block are
+    released once it has been reduced, so the memory used stays bounded however large the variable is. The map is
+    closed when the generator finishes or is closed. A pyhy store only decompresses the blocks of dumps it needs.
+    """
+    long_name, units, unit_conversion = run.variable_info(var)
+    data, memory_map, offset = private_map(run, var)
+    try:
+        rows_per_block = max(1, memory_budget // 4 // (max(num_columns, 1) * 8))
+        step = int(rows[1] - rows[0]) if len(rows) > 1 else 1
+        row_stride = data.strides[0] if memory_map is not None else 0
+        for start in range(0, len(rows), rows_per_block):
+            first, last = int(rows[start]), int(rows[min(start + rows_per_block, len(rows)) - 1])
+            yield start, np.multiply(data[first:last + 1:step, x_slice], unit_conversion, dtype=float)
+            if memory_map is not None:
+                release(memory_map, offset + first * row_stride, offset + (last + 1) * row_stride)
+    finally:
+        del data  # the view must be gone before its memory map can be closed
+        if memory_map is not None:
+            memory_map.close()
+
+
+def private_map(run, var):
+    """View of var in cgs units on a memory map of the .cdf owned by the caller, so its pages can be released
+
+    Returns:
+        data (numpy array or StoreVariable), memory_map (mmap or None), offset (int): The view, the map it is built
+        on, and the position of the variable in the file. memory_map is None for pyhy stores, or when the operating
+        system cannot release pages.
+    """
+    data = run.map_variable(var)
+    if (not isinstance(data, np.ndarray)) or (not hasattr(mmap, 'MADV_DONTNEED')) or (data.size == 0):
+        return data, None, 0
+    root = data
+    while isinstance(root.base, np.ndarray):  # Walk back to the array spanning the entire file
+        root = root.base
+    offset = data.__array_interface__['data'][0] - root.__array_interface__['data'][0]
+    with open(run.cdf_name, 'rb') as f:
+        memory_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        data = np.ndarray(data.shape, dtype=data.dtype, buffer=memory_map, offset=offset, strides=data.strides)
+    except Exception:
+        memory_map.close()
+        raise
+    return data, memory_map, offset
+
+
+def release(memory_map, start, stop):
+    """Drop the pages of a read-only memory map between two byte offsets. They are read from disk again if needed."""
+    start = start // mmap.PAGESIZE * mmap.PAGESIZE
+    stop = min(stop, len(memory_map))
+    if stop > start:
+        memory_map.madvise(mmap.MADV_DONTNEED, start, stop - start)
+
+
+def zone_mass(run):
+    """Areal mass of each Zone in g/cm^2, density times Zone width at the first dump
+
+    Zones in Hyades are Lagrangian, so their mass is constant and only the first dump is read.
+    """
+    density = np.asarray(run.read('Rho', slice(0, 1)))[0]
+    width = np.diff(np.asarray(run.read('R', slice(0, 1)))[0]) * 1e-4  # convert microns to centimeters
+    return density * width
@@ -0,0 +1,131 @@
+"""Resample Lagrangian Hyades output onto a fixed Eulerian (time, x) grid
+
+Hyades moves its mesh with the material, so every dump of a variable sits on different Eulerian positions. Drawing
+that directly takes a pcolormesh with a quadrilateral per zone per dump, which is slow to draw and cannot be reused.
+to_eulerian_grid resamples every dump onto the same Eulerian positions instead, giving a plain 2D image that can be
+cached and drawn with imshow. Positions outside the material at a given time are NaN.
+
+Example:
+    Draw the Eulerian XT diagram of the pressure as an image::
+
+        from tools.regrid import to_eulerian_grid
+        x_grid, time_grid, image = to_eulerian_grid('./data/diamond_decay', 'Pres', x_grid=1000, time_grid=500)
+        plt.imshow(image, origin='lower', aspect='auto', extent=(x_grid[0], x_grid[-1], time_grid[0], time_grid[-1]))
+
+"""
+import hashlib
+import numpy as np
+from tools.hyades_reader import HyadesRun, HyadesOutput, TimeIndex
+
+MAX_BLOCK_SIZE = 2 ** 22  # number of grid points resampled at once, which bounds the memory used by the temporaries
+
+
+def to_eulerian_grid(run, var, x_grid=None, time_grid=None):
+    """Resample a variable onto fixed Eulerian positions and times in one vectorized pass
+
+    Zone variables, such as Pres and Rho, are constant across each zone, matching how pcolormesh draws them. Mesh
+    variables, such as U, are linearly interpolated between neighboring Mesh points. When time_grid is not the dump
+    times of the run, the Mesh positions and the variable are first linearly interpolated between dumps.
+
+    Every dump is resampled at once with a single np.searchsorted: each row of Mesh positions is shifted by a
+    different offset so that the rows, laid end to end, form one sorted array. This requires the Mesh positions to
+    increase along each row, which holds unless the mesh has tangled.
+
+    The image is memoized on the HyadesRun and in the process-wide variable_cache, keyed by the variable and grids.
+
+    Args:
+        run (string, HyadesRun, or HyadesOutput): Name of the run, or an existing run or output of it
+        var (string): Abbreviated name of a 2D variable on the Mesh or Zone grid, such as Pres, Rho, U, or Rho0
+        x_grid (int or array, optional): Eulerian positions in microns, or the number of evenly spaced positions
+                                         spanning every position the mesh reaches. Defaults to 1000 positions.
+        time_grid (int or array, optional): Times in nanoseconds, or the number of evenly spaced times spanning the
+                                            simulation. Defaults to the dump times of the run.
+
+    Returns:
+        x_grid (numpy array), time_grid (numpy array), image (numpy array): image has len(time_grid) rows and
+        len(x_grid) columns, and is NaN wherever there is no material
+
+    """
+    if isinstance(run, HyadesOutput):
+        run = run.run
+    elif not isinstance(run, HyadesRun):
+        run = HyadesRun(run)
+    var = var.capitalize()
+    dimensions = run.dimensions(var)
+    if (len(dimensions) != 2) or (dimensions[1] not in ('NumMeshs', 'NumZones')):
+        raise ValueError(f'Only 2D variables on the Mesh or Zone grid can be resampled. {var} has {dimensions}')
+
+    time = run.time
+    if time_grid is None:
+        time_grid = time
+    elif np.ndim(time_grid) == 0:
+        time_grid = np.linspace(time[0], time[-1], int(time_grid))
+    time_grid = np.asarray(time_grid, dtype=float)
+    if x_grid is None:
+        x_grid = 1000
+    if np.ndim(x_grid) == 0:
+        x_grid = np.linspace(np.min(run.mesh_x), np.max(run.mesh_x), int(x_grid))
+    x_grid = np.asarray(x_grid, dtype=float)
+
+    digest = hashlib.sha1(x_grid.tobytes() + time_grid.tobytes()).hexdigest()[:16]
+
+    def regrid():
+        at_dumps = (time_grid.shape == time.shape) and np.array_equal(time_grid, time)
+        time_index = TimeIndex(time)
+        image = np.empty((len(time_grid), len(x_grid)))
+        block_size = max(1, MAX_BLOCK_SIZE // max(1, len(x_grid)))
+        for start in range(0, len(time_grid), block_size):
+            stop = start + block_size
+            if at_dumps:
+                mesh_x = run.mesh_x[start:stop]
+                values = run[var][start:stop]
+            else:
+                mesh_x = time_index.interp(time_grid[start:stop], run.mesh_x)
+                values = time_index.interp(time_grid[start:stop], run[var])
+            image[start:stop] = regrid_rows(mesh_x, values, x_grid, zone_centered=dimensions[1] == 'NumZones')
+        return image
+
+    return x_grid, time_grid, run._load(f'Eulerian {var} {digest}', regrid)
+
+
+def regrid_rows(mesh_x, values, x_grid, zone_centered=True):
+    """Resample each row of values, located on the matching row of mesh_x, onto the same positions x_grid
+
+    Args:
+        mesh_x (numpy array): Increasing Mesh positions with one row per dump
+        values (numpy array): Variable with one row per dump, on the Zones between the Mesh points if zone_centered,
+                              otherwise on the Mesh points
+        x_grid (numpy array): Increasing positions to resample every row onto
+        zone_centered (bool, optional): Whether values are on the Zone grid instead of the Mesh grid
+
+    Returns:
+        image (numpy array): One resampled row per row of values, NaN outside the mesh of that row
+
+    """
+    mesh_x = np.asarray(mesh_x, dtype=float)
+    values = np.asarray(values, dtype=float)
+    num_rows, num_mesh = mesh_x.shape
+    rows = np.arange(num_rows)[:, None]
+
+    # Shift every row by more than the range of all positions so the rows laid end to end are sorted
+    low = min(mesh_x.min(), x_grid.min())
+    span = max(mesh_x.max(), x_grid.max()) - low + 1
+    offsets = rows * span
+    flat_mesh = (mesh_x - low + offsets).ravel()
+    queries = (x_grid - low)[None, :] + offsets
+    # Number of Mesh points in the same row at or left of each position, so each position lies in the Zone right of it
+    count = np.searchsorted(flat_mesh, queries.ravel(), side='right').reshape(queries.shape) - rows * num_mesh
+    right = np.clip(count, 1, num_mesh - 1)
+    left = right - 1
+
+    if zone_centered:
+        image = values[rows, left]
+    else:
+        x_left = mesh_x[rows, left]
+        x_right = mesh_x[rows, right]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            fraction = np.where(x_right > x_left, (x_grid[None, :] - x_left) / (x_right - x_left), 0.0)
+        image = values[rows, left] * (1 - fraction) + values[rows, right] * fraction
+    outside = (x_grid[None, :] < mesh_x[:, :1]) | (x_grid[None, :] > mesh_x[:, -1:])
+    image[outside] = np.nan
+    return image
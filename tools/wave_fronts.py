@@ -0,0 +1,299 @@
+"""Detect and track every shock, compression, and release front of a Hyades simulation
+
+ShockVelocity only follows the leading shock. Ramp compression and multi-layer targets also have release fans,
+reverberations between interfaces, and secondary shocks, which are all fronts where the pressure changes steeply
+along the Lagrangian grid. wave_fronts finds them in a single pass over the whole XT array of Pres and U, links them
+from dump to dump into trajectories, and caches the result on the run so the shock overlays, debugging plots, and
+material of interest timing all share one copy.
+
+A front is a stretch of neighboring Zones where the pressure keeps changing in the same direction. Its strength is the
+total pressure jump across it, and it sits on the Mesh point with the steepest pressure gradient. The change in
+particle velocity across the front decides its kind and direction, from the characteristic relation dP = ±ρc dU:
+
+    * the particle velocity falls from left to right across compression fronts (dU < 0), so the material converges,
+      and rises across release fronts (dU > 0)
+    * right-going fronts have dP and dU of the same sign, and left-going fronts have opposite signs
+
+Example:
+    Plot every compression front with a jump over 5 GPa, and the time the leading shock crosses a layer::
+
+        from tools.wave_fronts import wave_fronts
+        fronts = wave_fronts('./data/diamond_decay', min_strength=5)
+        for track in fronts.tracks(kind='compression'):
+            plt.plot(track['x'], track['time'])
+        time_in, time_out = fronts.layer_crossing('layer2')
+
+"""
+import hashlib
+import numpy as np
+from tools.hyades_reader import HyadesRun, HyadesOutput
+
+
+def wave_fronts(run, min_strength=1, min_gradient=None, max_step=5, min_length=3):
+    """Detect the wave fronts of a run and track them through time, memoized per run
+
+    The detections are memoized on the run, in the process-wide variable_cache, and in the .pyhy_cache if the run
+    uses one, keyed by the options, so later calls with the same options only wrap the cached array.
+
+    Args:
+        run (string, HyadesRun, or HyadesOutput): Name of the run, or an existing run or output of it
+        min_strength (float, optional): Smallest pressure jump across a front, in GPa
+        min_gradient (float, optional): Smallest pressure change between neighboring Zones inside a front, in GPa.
+                                        Flatter stretches separate fronts. Defaults to a tenth of min_strength.
+        max_step (int, optional): Farthest a front can move between two dumps, in Zones, and still be the same front
+        min_length (int, optional): Fewest dumps a front must be tracked over. Shorter tracks are discarded as noise.
+
+    Returns:
+        fronts (WaveFronts)
+
+    """
+    if isinstance(run, HyadesOutput):
+        run = run.run
+    elif not isinstance(run, HyadesRun):
+        run = HyadesRun(run)
+    if min_gradient is None:
+        min_gradient = min_strength / 10
+    key = repr((float(min_strength), float(min_gradient), int(max_step), int(min_length)))
+    digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+    fronts = run._load(f'Wave Fronts {digest}',
+                       lambda: track_fronts(detect_fronts(run, min_strength, min_gradient), max_step, min_length))
+    return WaveFronts(run, fronts)
+
+
+def detect_fronts(run, min_strength=1, min_gradient=0.1):
+    """Find the fronts in every dump of a run at once
+
+    The pressure and zone-centered particle velocity gradients are computed for the whole XT array, then split into
+    runs of neighboring Zones with the same sign of pressure gradient, where gradients flatter than min_gradient
+    count as a sign of their own. The runs are found on the flattened array, so the jumps across all of them come from
+    one np.add.reduceat.
+
+    Args:
+        run (HyadesRun): Run to search
+        min_strength (float, optional): Smallest pressure jump across a front, in GPa
+        min_gradient (float, optional): Smallest pressure change between neighboring Zones inside a front, in GPa
+
+    Returns:
+        fronts (numpy structured array): One record per front with the fields of WaveFronts.fields, and track -1
+
+    """
+    pressure = np.asarray(run['Pres'], dtype=float)
+    velocity = np.asarray(run['U'], dtype=float)
+    mesh_x = np.asarray(run['R'])
+    num_dumps, num_zones = pressure.shape
+    if num_zones < 2:
+        return np.zeros(0, dtype=WaveFronts.fields)
+
+    # Gradient between Zone i and Zone i + 1, which sits on Mesh point i + 1
+    pressure_gradient = np.diff(pressure, axis=1)
+    velocity_gradient = np.diff((velocity[:, 1:] + velocity[:, :-1]) / 2, axis=1)
+    num_gradients = num_zones - 1
+    sign = np.where(np.abs(pressure_gradient) >= min_gradient, np.sign(pressure_gradient), 0).ravel()
+    # A new stretch starts wherever the sign changes, and at the start of every dump
+    boundary = np.ones(sign.size, dtype=bool)
+    boundary[1:] = sign[1:] != sign[:-1]
+    boundary[::num_gradients] = True
+    starts = np.flatnonzero(boundary)
+    pressure_jump = np.add.reduceat(pressure_gradient.ravel(), starts)
+    velocity_jump = np.add.reduceat(velocity_gradient.ravel(), starts)
+    widths = np.diff(np.append(starts, sign.size))
+
+    # The steepest gradient of each stretch, taking the first if several are equally steep
+    steepness = np.abs(pressure_gradient).ravel()
+    stretch = np.cumsum(boundary) - 1
+    steepest = steepness == np.maximum.reduceat(steepness, starts)[stretch]
+    _, first = np.unique(stretch[steepest], return_index=True)
+    peaks = np.flatnonzero(steepest)[first]
+
+    found = (np.abs(pressure_jump) >= min_strength) & (sign[starts] != 0)
+    dumps = starts[found] // num_gradients
+    mesh_index = peaks[found] % num_gradients + 1
+    fronts = np.zeros(found.sum(), dtype=WaveFronts.fields)
+    fronts['dump'] = dumps
+    fronts['time'] = run.time[dumps]
+    fronts['mesh_index'] = mesh_index
+    fronts['x'] = mesh_x[0, mesh_index]
+    fronts['eulerian_x'] = mesh_x[dumps, mesh_index]
+    fronts['strength'] = np.abs(pressure_jump[found])
+    fronts['velocity_jump'] = velocity_jump[found]
+    fronts['width'] = widths[found]
+    fronts['kind'] = np.where(velocity_jump[found] < 0, 'compression', 'release')
+    fronts['direction'] = np.where(pressure_jump[found] * velocity_jump[found] >= 0, 1, -1)
+    fronts['track'] = -1
+    return fronts
+
+
+def track_fronts(fronts, max_step=5, min_length=3):
+    """Link fronts of the same kind and direction in consecutive dumps into tracks
+
+    Each track of the previous dump is moved ahead by its last step. A front continues a track when each is the
+    nearest to the other and they are within max_step Zones, and fronts that continue no track start a new one.
+    Fronts of different kinds or directions are kept apart by offsetting their positions, so every dump is matched with
+    two np.searchsorted calls.
+
+    Args:
+        fronts (numpy structured array): Fronts from detect_fronts, sorted by dump
+        max_step (int, optional): Farthest a front can move between two dumps, in Zones, and still be the same front
+        min_length (int, optional): Fewest dumps a track must last. Fronts on shorter tracks are dropped.
+
+    Returns:
+        fronts (numpy structured array): The fronts on tracks long enough to keep, with the track field set
+
+    """
+    fronts = fronts.copy()
+    if len(fronts) == 0:
+        return fronts
+    # Fronts of each kind and direction are moved to their own stretch of positions, far from the others
+    separation = fronts['mesh_index'].max() + 4 * max_step + 4
+    group = 2 * (fronts['kind'] == 'compression') + (fronts['direction'] > 0)
+    position = fronts['mesh_index'] + group * separation
+    num_tracks = 0
+    boundaries = np.flatnonzero(np.diff(fronts['dump'])) + 1
+    previous = np.zeros(0, dtype=int)
+    step = np.zeros(0)  # Last move of the track of each front in previous, in Zones
+    for current in np.split(np.arange(len(fronts)), boundaries):
+        tracks = np.full(len(current), -1)
+        current_step = np.zeros(len(current))
+        if len(previous) > 0:
+            predicted = position[previous] + step
+            closest_track, distance = nearest(predicted, position[current])
+            closest_front, _ = nearest(position[current], predicted)
+            matched = (closest_front[closest_track] == np.arange(len(current))) & (distance <= max_step)
+            tracks[matched] = fronts['track'][previous[closest_track[matched]]]
+            current_step[matched] = position[current[matched]] - position[previous[closest_track[matched]]]
+        new = tracks < 0
+        tracks[new] = num_tracks + np.arange(new.sum())
+        num_tracks += new.sum()
+        fronts['track'][current] = tracks
+        previous, step = current, current_step
+
+    lengths = np.bincount(fronts['track'], minlength=num_tracks)
+    kept = lengths[fronts['track']] >= min_length
+    fronts = fronts[kept]
+    # Number the remaining tracks from 0 in the order they start
+    fronts['track'] = np.unique(fronts['track'], return_inverse=True)[1]
+    return fronts
+
+
+def nearest(candidates, values):
+    """Index of the nearest candidate to each value and the distance to it"""
+    order = np.argsort(candidates, kind='stable')
+    sorted_candidates = candidates[order]
+    right = np.clip(np.searchsorted(sorted_candidates, values), 0, len(candidates) - 1)
+    left = np.clip(right - 1, 0, len(candidates) - 1)
+    use_left = np.abs(values - sorted_candidates[left]) <= np.abs(sorted_candidates[right] - values)
+    closest = np.where(use_left, left, right)
+    return order[closest], np.abs(values - sorted_candidates[closest])
+
+
+class WaveFronts:
+    """Fronts detected by wave_fronts, with their tracks through time
+
+    Attributes:
+        run (HyadesRun): Run the fronts were detected in
+        fronts (numpy structured array): One record per front per dump, sorted by dump, with the fields
+            dump (int): Index of the dump
+            time (float): Time of the dump in nanoseconds
+            mesh_index (int): 0-indexed Mesh point of the steepest pressure gradient across the front
+            x (float): Lagrangian position of that Mesh point in microns
+            eulerian_x (float): Eulerian position of that Mesh point in microns
+            strength (float): Pressure jump across the front in GPa
+            velocity_jump (float): Change in particle velocity, left to right, across the front in km/s
+            width (int): Number of Zones the front is spread over
+            kind (string): compression or release
+            direction (int): 1 for a front moving right through the material, -1 for left
+            track (int): Index of the track the front belongs to
+        num_tracks (int): Number of tracks
+
+    """
+    fields = [('dump', int), ('time', float), ('mesh_index', int), ('x', float), ('eulerian_x', float),
+              ('strength', float), ('velocity_jump', float), ('width', int), ('kind', 'U16'), ('direction', int),
+              ('track', int)]
+
+    def __init__(self, run, fronts):
+        self.run = run
+        self.fronts = fronts
+        self.num_tracks = int(fronts['track'].max()) + 1 if len(fronts) > 0 else 0
+
+    def __len__(self):
+        return len(self.fronts)
+
+    def track(self, i):
+        """Fronts of track i, one per dump it was found in"""
+        return self.fronts[self.fronts['track'] == i]
+
+    def tracks(self, kind=None, direction=None):
+        """Every track, optionally only those of one kind and direction
+
+        Args:
+            kind (string, optional): compression or release
+            direction (int, optional): 1 for right-going or -1 for left-going
+
+        Returns:
+            tracks (list): Fronts of each track, see track
+
+        """
+        order = np.argsort(self.fronts['track'], kind='stable')
+        sorted_fronts = self.fronts[order]
+        split = np.flatnonzero(np.diff(sorted_fronts['track'])) + 1
+        tracks = np.split(sorted_fronts, split) if len(sorted_fronts) > 0 else []
+        if kind is not None:
+            tracks = [track for track in tracks if track['kind'][0] == kind]
+        if direction is not None:
+            tracks = [track for track in tracks if track['direction'][0] == direction]
+        return tracks
+
+    def leading(self, kind='compression', direction=1, min_strength=None):
+        """The front furthest along in its direction of travel at every dump it is found in
+
+        With the defaults, this is the leading shock driven into the target from the left.
+
+        Args:
+            kind (string, optional): compression or release
+            direction (int, optional): 1 for right-going or -1 for left-going
+            min_strength (float, optional): Smallest pressure jump in GPa. Defaults to every front.
+
+        Returns:
+            fronts (numpy structured array): At most one front per dump
+
+        """
+        selected = self.fronts[(self.fronts['kind'] == kind) & (self.fronts['direction'] == direction)]
+        if min_strength is not None:
+            selected = selected[selected['strength'] >= min_strength]
+        # Sort so the leading front of each dump comes first, then keep the first front of each dump
+        order = np.lexsort((-direction * selected['mesh_index'], selected['dump']))
+        selected = selected[order]
+        first = np.ones(len(selected), dtype=bool)
+        first[1:] = selected['dump'][1:] != selected['dump'][:-1]
+        return selected[first]
+
+    def layer_crossing(self, layer, min_strength=None):
+        """Times the leading shock enters and leaves a layer
+
+        The shock enters when it first reaches the first Mesh point of the layer, and leaves when it first reaches the
+        last, or the last Mesh point a front can be found on for a layer at the free surface. If it enters but is lost
+        before leaving, it leaves at the last time it was found.
+
+        Args:
+            layer (int or string): Index or key of the layer, such as 1 or 'layer2'
+            min_strength (float, optional): Smallest pressure jump of the shock in GPa, see leading
+
+        Returns:
+            time_in (float), time_out (float): In nanoseconds, each None if the shock never gets that far
+
+        """
+        layer_table = self.run.layer_table
+        record = layer_table[layer]
+        shock = self.leading('compression', 1, min_strength)
+        entered = shock['mesh_index'] >= record['mesh_start'] - 1
+        if not entered.any():
+            return None, None
+        first_in = int(np.argmax(entered))
+        time_in = float(shock['time'][first_in])
+        # Fronts sit between two Zones, so the last Mesh point of the run is never a front. A layer at the free surface
+        # is left when the shock reaches the last Mesh point a front can have.
+        last_mesh = min(int(record['mesh_stop']) - 1, self.run.header['Pres']['shape'][1] - 1)
+        exited = shock['mesh_index'][first_in:] >= last_mesh
+        if exited.any():
+            return time_in, float(shock['time'][first_in + int(np.argmax(exited))])
+        return time_in, float(shock['time'][-1])
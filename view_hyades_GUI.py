@@ -15,7 +15,8 @@ import matplotlib.pyplot as plt
 import matplotlib.animation as animation
 from matplotlib.figure import Figure
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from tools.hyades_reader import HyadesOutput, ShockVelocity
+from tools.hyades_reader import HyadesOutput, HyadesRun, ShockVelocity
+from tools.describe import describe
 matplotlib.use("TkAgg")
 plt.style.use('ggplot')
 
@@ -64,11 +65,13 @@ class App:
         Label(root, text='Select X-axis Variable').grid(row=row, column=2, sticky='NW', pady=(10, 0), padx=(0, 0))
         row += 1
 
-        y_var_options = ['Pressure', 'Density', 'Particle Velocity', 'Shock Velocity',
-                         'Temperature', 'Radiation Temperature', 'Ion Temperature']
-        y_var_cb = ttk.Combobox(root, textvariable=self.var, values=y_var_options, state="readonly")
-        y_var_cb.grid(row=row, column=1, sticky='NW', padx=(left_pad, 0))
-        y_var_cb.bind('<<ComboboxSelected>>', self.update_variable)
+        # Each option and the variables it needs, so select_dir can hide options the selected run does not have
+        self.y_var_options = {'Pressure': ['Pres'], 'Density': ['Rho'], 'Particle Velocity': ['U'],
+                              'Shock Velocity': ['Pres', 'U', 'R', 'Rho'], 'Temperature': ['Te'],
+                              'Radiation Temperature': ['Tr'], 'Ion Temperature': ['Ti']}
+        self.y_var_cb = ttk.Combobox(root, textvariable=self.var, values=list(self.y_var_options), state="readonly")
+        self.y_var_cb.grid(row=row, column=1, sticky='NW', padx=(left_pad, 0))
+        self.y_var_cb.bind('<<ComboboxSelected>>', self.update_variable)
 
         x_mode_options = ['Distance', 'Time']
         x_var_cb = ttk.Combobox(root, textvariable=self.x_mode, values=x_mode_options, state='readonly')
@@ -93,6 +96,7 @@ class App:
         # Initial plotting and labels
         self.fig = Figure(figsize=(6, 4))
         self.ax = self.fig.add_subplot(111)
+        self.shock = None  # ShockVelocity of the selected file, only computed once per file
         self.df = pd.read_csv('graphics/DatasaurusDozen.csv')
         self.datasaur = self.ax.scatter([], [])
         self.ax.set(title='Select a file to begin',
@@ -121,6 +125,11 @@ class App:
         file_menu = tkinter.Menu(root_menu)  # it initializes a new su menu in the root menu
         root_menu.add_cascade(label='File', menu=file_menu)  # it creates the name of the sub menu
         file_menu.add_command(label='Open file', command=self.select_dir)
+        # Snapshots of running simulations, see run_hyades.py --snapshot, gain new dumps while they are open
+        file_menu.add_command(label='Refresh', command=self.refresh)
+        self.auto_refresh_on = BooleanVar()
+        self.refresh_job = None
+        file_menu.add_checkbutton(label='Auto Refresh', variable=self.auto_refresh_on, command=self.auto_refresh)
         file_menu.add_separator()  # it adds a horizontal line to separate options
         file_menu.add_command(label='Exit', command=root.quit)
 
@@ -156,7 +165,7 @@ class App:
             if self.x_mode.get() == 'Distance':
                 maximum = len(self.hyades.time)
             else:
-                maximum = len(self. hyades.x[0, :])
+                maximum = len(self. hyades.lagrangian_x)
             while (0 <= index) and (index < maximum - 1):
                 index += anim.direction
                 yield index
@@ -195,7 +204,7 @@ class App:
         if self.x_mode.get() == 'Distance':
             frame_num = len(self.hyades.time)
         else:
-            frame_num = len(self. hyades.x[0, :])
+            frame_num = len(self. hyades.lagrangian_x)
         anim = animation.FuncAnimation(self.fig, self.animate,
                                        frames=frame_num,
                                        interval=10, blit=False, repeat=False)
@@ -259,7 +268,7 @@ class App:
         if self.x_mode.get() == 'Distance':
             suffix = f'{self.hyades.time[self.ix_scale.get()]:.1f}ns'
         else:
-            suffix = f'{self. hyades.x[0, self.ix_scale.get()]:.1f}um'
+            suffix = f'{self. hyades.lagrangian_x[self.ix_scale.get()]:.1f}um'
 
         if selection == 'Shock Velocity':
             basename = f'{os.path.basename(self.filename)}_{var}'
@@ -282,7 +291,7 @@ class App:
             index = f'{self.hyades.time[self.ix_scale.get()]:.1f}ns'
         else:
             x_title = 'Time (ns)'
-            index = f'{self.hyades.x[0, self.ix_scale.get()]:.1f}um'
+            index = f'{self.hyades.lagrangian_x[self.ix_scale.get()]:.1f}um'
         var = self.var.get()
         if var == 'Pressure':
             y_title = 'Pressure (GPa)'
@@ -331,6 +340,14 @@ class App:
         end_dir = os.path.basename(os.path.normpath(fname))
         self.file_label.set(end_dir)
         self.filename = os.path.join(fname, end_dir)
+        self.run = HyadesRun(self.filename)  # shared by every variable, and extended in place by refresh
+        self.shock = None
+        # Only offer the variables in the run, found from the header of the .cdf without loading any of them
+        names = {variable['name'] for variable in describe(self.run, derived=False)['variables']}
+        options = [option for option, needed in self.y_var_options.items() if set(needed) <= names]
+        self.y_var_cb.configure(values=options)
+        if options and (self.var.get() not in options):
+            self.var.set(options[0])
 
         self.update_variable()
         self.update_x_mode()
@@ -357,13 +374,32 @@ class App:
             old_x = x
         self.canvas.draw()
 
+    def refresh(self):
+        """Redraw the selected file if dumps were added to it, only reading the new dumps"""
+        if ('run' not in vars(self)) or not self.run.refresh():
+            return
+        self.shock = None
+        self.update_variable()
+        if self.var.get() != 'Shock Velocity':
+            num_indices = len(self.hyades.time) if self.x_mode.get() == 'Distance' else len(self.hyades.lagrangian_x)
+            self.ix_scale.configure(to=num_indices - 1)
+
+    def auto_refresh(self):
+        """Refresh every few seconds while Auto Refresh is checked"""
+        if self.refresh_job is not None:
+            root.after_cancel(self.refresh_job)
+            self.refresh_job = None
+        if self.auto_refresh_on.get():
+            self.refresh()
+            self.refresh_job = root.after(5000, self.auto_refresh)
+
     def update_x_mode(self, *args):
         """Update plot, x limits, text._x"""
         self.ix_scale.set(0)
         ix = self.ix_scale.get()
         if self.x_mode.get() == 'Distance':
-            self.line.set_data(self.hyades.x[0, :], self.hyades.output[ix, :])
-            self.ax.set(xlim=(0, self.hyades.x[0, :].max()),
+            self.line.set_data(self.hyades.lagrangian_x, self.hyades.output[ix, :])
+            self.ax.set(xlim=(0, self.hyades.lagrangian_x.max()),
                         xlabel='Lagrangian Distance (um)')
 
             self.txt._text = f'{self.hyades.time[ix]} ns'
@@ -379,10 +415,10 @@ class App:
             self.ax.set(xlim=(0, self.hyades.time.max()),
                         xlabel='Time (ns)')
 
-            self.txt._text = f'{self.hyades.x[0, ix]} um'
+            self.txt._text = f'{self.hyades.lagrangian_x[ix]} um'
             self.txt._x = self.ax.get_xlim()[1] * 0.95
 
-            self.ix_scale.configure(to=len(self.hyades.x[0, :]) - 1)
+            self.ix_scale.configure(to=len(self.hyades.lagrangian_x) - 1)
             for L, T in zip(self.label_lines, self.label_text):
                 L.set_visible(False)
                 T.set_visible(False)
@@ -428,8 +464,10 @@ class App:
         if selection == 'Shock Velocity':
             # Turn off the slider bc there is no index on the shock velocity
             self.ix_scale.config(state="disabled")
-            # plot the shock velocity
-            shock = ShockVelocity(self.filename, 'Cubic')
+            # plot the shock velocity, which is reused if Shock Velocity is selected again for the same file
+            if self.shock is None:
+                self.shock = ShockVelocity(self.run, 'Cubic')
+            shock = self.shock
             self.line, = self.ax.plot(shock.time, shock.Us, color=color)
             y_max = shock.Us.max() * 1.05
             y_min = shock.Us.min()
@@ -446,11 +484,11 @@ class App:
             # turn the slider back on
             self.ix_scale.config(state="normal")
             # create hyades and update the line
-            self.hyades = HyadesOutput(self.filename, var)
-            self.line, = self.ax.plot(self.hyades.x[0, :], self.hyades.output[0, :], color=color)  # create a new line
+            self.hyades = HyadesOutput(self.run, var)
+            self.line, = self.ax.plot(self.hyades.lagrangian_x, self.hyades.output[0, :], color=color)  # create a new line
             ix = self.ix.get()
             if self.x_mode.get() == 'Time':
-                if ix > len(self.hyades.x[0, :]) - 1:
+                if ix > len(self.hyades.lagrangian_x) - 1:
                     self.ix.set(0)
                 print(self.hyades.time.shape, self.hyades.output[:, self.ix.get()].shape)
                 self.line.set_data(self.hyades.time, self.hyades.output[:, self.ix.get()])
@@ -460,8 +498,8 @@ class App:
             elif self.x_mode.get() == 'Distance':
                 if ix > len(self.hyades.time) - 1:
                     self.ix.set(0)
-                self.line.set_data(self.hyades.x[0, :], self.hyades.output[self.ix.get(), :])
-                x_min, x_max = self.hyades.x[0,:].min(), self.hyades.x[0, :].max()
+                self.line.set_data(self.hyades.lagrangian_x, self.hyades.output[self.ix.get(), :])
+                x_min, x_max = self.hyades.lagrangian_x.min(), self.hyades.lagrangian_x.max()
                 xlabel = 'Lagrangian Distance (um)'
             # format the plot
             y_max = self.hyades.output[11:, :].max() * 1.05
@@ -504,18 +542,15 @@ class App:
         else:
             ix = self.ix.get()
             if self.x_mode.get() == 'Time':
-                self.txt._text = f'{self.hyades.x[0, ix]:.1f} um'
+                self.txt._text = f'{self.hyades.lagrangian_x[ix]:.1f} um'
                 self.line.set_data(self.hyades.time, self.hyades.output[:, ix])
-                for mat in self.hyades.layers:
-                    self.hyades.layers[mat]['Mesh Start']
-                    greater_than = ix >= self.hyades.layers[mat]['Mesh Start'] - 1
-                    less_than = ix < self.hyades.layers[mat]['Mesh Stop'] - 1
-                    if less_than and greater_than:
-                        self.label_text_time._text = self.hyades.layers[mat]['Name']
-                        break
+                layer_table = self.hyades.layer_table
+                layer = layer_table.grid_to_layer(self.hyades.data_dimensions[1] == 'NumZones')[ix]
+                if layer >= 0:
+                    self.label_text_time._text = layer_table['name'][layer]
             elif self.x_mode.get() == 'Distance':
                 self.txt._text = f'{self.hyades.time[ix]:.1f} ns'
-                self.line.set_data(self.hyades.x[0, :], self.hyades.output[ix, :])
+                self.line.set_data(self.hyades.lagrangian_x, self.hyades.output[ix, :])
         self.canvas.draw()
 
 